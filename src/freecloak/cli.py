@@ -18,9 +18,13 @@
 
 import argparse
 import importlib
+import keyword
 import logging
+import sys
+from types import ModuleType
 
 from freecloak import __version__
+from freecloak.plugins.daemon.client import default_socket_path, forward_command
 from freecloak.plugins.logging import configure_logging, TemplateStringAdapter
 from freecloak.plugins.plugins import PluginInfo
 from freecloak.plugins.plugins.loader import discover_plugins
@@ -49,7 +53,12 @@ def add_logging_arguments(parser: argparse.ArgumentParser) -> None:
     file_logging_group.add_argument('--output-log-file', help='main log file to use', metavar='FILE')
     file_logging_group.add_argument('--output-log-level', help='file logging level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'])
 
-def main() -> int:
+def add_daemon_arguments(parser: argparse.ArgumentParser) -> None:
+    daemon_group = parser.add_argument_group('daemon options')
+    daemon_group.add_argument('--no-daemon', help='always run in this process instead of a running daemon', action='store_true')
+    daemon_group.add_argument('--daemon-socket', help='daemon socket to forward commands to', metavar='PATH', default=default_socket_path())
+
+def build_parser() -> tuple[argparse.ArgumentParser, dict[str, ModuleType]]:
     root_parser = argparse.ArgumentParser(
         prog="freecloak",
         description="FreeIPA and Keycloak integration tool",
@@ -57,10 +66,8 @@ def main() -> int:
         add_help=False,
     )
 
-    # Configure logging first so we can use it when discovering plugins if necessary
     add_logging_arguments(root_parser)
-    logging_args, cli_args = root_parser.parse_known_args()
-    configure_logging(**vars(logging_args))
+    add_daemon_arguments(root_parser)
 
     discovered_plugins = discover_plugins()
 
@@ -101,14 +108,45 @@ def main() -> int:
 
     add_miscellaneous_arguments(root_parser)
 
-    args = vars(root_parser.parse_args())
+    return root_parser, discovered_plugins
+
+def run_command(args: dict, discovered_plugins: dict[str, ModuleType]) -> int:
+    # Parsers may register slow setup (e.g. connecting to a server) to overlap with loading the command
+    if (prepare_command := args.pop('prepare_command', None)) is not None:
+        prepare_command(args)
 
     try:
         plugin_commands_module = importlib.import_module(f"{discovered_plugins[args['plugin']].__name__}.commands")
-        return getattr(plugin_commands_module, args['command'])(**args)
+
+        # Commands named after keywords (e.g. import) are implemented with a trailing underscore
+        command_name = args['command'].replace('-', '_')
+        if keyword.iskeyword(command_name):
+            command_name += '_'
+
+        return getattr(plugin_commands_module, command_name)(**args)
     except AttributeError:
         logger.error(t'Plugin "{args["plugin"]}" has no command "{args["command"]}"')
         return 2
     except ImportError:
         logger.error(t'Plugin "{args["plugin"]}" does not properly implement the plugin specification; exiting')
         return 1
+
+
+def main() -> int:
+    early_parser = argparse.ArgumentParser(add_help=False)
+
+    # Configure logging first so we can use it when discovering plugins if necessary
+    add_logging_arguments(early_parser)
+    add_daemon_arguments(early_parser)
+    early_args, cli_args = early_parser.parse_known_args()
+    configure_logging(**vars(early_args))
+
+    # Hand the whole command line to a warm daemon when one is listening, skipping all local setup
+    if not early_args.no_daemon and cli_args[:1] != ['daemon']:
+        if (return_code := forward_command(sys.argv[1:], early_args.daemon_socket)) is not None:
+            return return_code
+
+    root_parser, discovered_plugins = build_parser()
+    args = vars(root_parser.parse_args())
+
+    return run_command(args, discovered_plugins)
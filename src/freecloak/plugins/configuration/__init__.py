@@ -19,8 +19,15 @@
 from freecloak import __version__
 from freecloak.plugins.plugins import PluginInfo
 
+from freecloak.plugins.configuration.plan import ConfigChange, load_config, RealmConfigurator, RealmState
 
-__all__ = []
+
+__all__ = [
+    'ConfigChange',
+    'load_config',
+    'RealmConfigurator',
+    'RealmState',
+]
 
 __plugin_info__ = PluginInfo(
     plugin_name='configuration',
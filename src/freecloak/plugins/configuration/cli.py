@@ -19,25 +19,26 @@
 import argparse
 import logging
 
+from freecloak.plugins.keycloak.cli import add_connection_arguments
 from freecloak.plugins.logging import TemplateStringAdapter
 
 
 logger = TemplateStringAdapter(logging.getLogger(__name__))
 
 
-def add_connection_arguments(parser: argparse.ArgumentParser) -> None:
-    keycloak_connection_group = parser.add_argument_group('keycloak connection')
-    keycloak_connection_group.add_argument('-d', '--domain', help='keycloak domain', required=True)
-    keycloak_connection_group.add_argument('-p', '--port', help='keycloak port', type=int)
-    keycloak_connection_group.add_argument('-r', '--realm', help='keycloak realm', required=True)
-
-    keycloak_connection_group.add_argument('-cid', '--client-id', help='keycloak client id', required=True)
-    keycloak_connection_group.add_argument('-csf', '--client-secret-file', help='keycloak client secret file path', required=True)
-
-    keycloak_connection_group.add_argument('--insecure', help='use HTTP to connect', action="store_true")
-
-    pass
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    config_group = parser.add_argument_group('configuration options')
+    config_group.add_argument('config', help='JSON configuration file, or a directory of them', metavar='PATH')
+    config_group.add_argument('--workers', help='concurrent requests', type=int, default=8)
 
 def add_plugin_parser(subparsers: argparse._SubParsersAction) -> None:
     dev_parser = subparsers.add_parser('dev')
     add_connection_arguments(dev_parser)
+
+    plan_parser = subparsers.add_parser('plan', description='show the writes needed to converge a realm to a configuration')
+    add_connection_arguments(plan_parser)
+    add_config_arguments(plan_parser)
+
+    apply_parser = subparsers.add_parser('apply', description='converge a realm to a configuration with the minimal set of writes')
+    add_connection_arguments(apply_parser)
+    add_config_arguments(apply_parser)
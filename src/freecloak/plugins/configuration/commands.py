@@ -16,12 +16,16 @@
 ##############################################################################
 
 
+import dataclasses
+import json
 import logging
 
 from freecloak.plugins.keycloak import KeycloakClient
 from freecloak.plugins.keycloak.exceptions import KeycloakClientError
 from freecloak.plugins.logging import TemplateStringAdapter
 
+from freecloak.plugins.configuration.plan import ConfigChange, load_config, RealmConfigurator
+
 
 logger = TemplateStringAdapter(logging.getLogger(__name__))
 
@@ -38,4 +42,62 @@ def dev(
     except KeycloakClientError:
         return 1
 
-    return 0
\ No newline at end of file
+    return 0
+
+
+def print_change(change: ConfigChange) -> None:
+    print(json.dumps({
+        key: value
+        for key, value
+        in dataclasses.asdict(change).items()
+        if key not in ['payload', 'stage']
+    }))
+
+
+def plan(
+    realm: str,
+    config: str,
+    workers: int,
+    **kwargs
+) -> int:
+    try:
+        desired = load_config(config)
+
+        with KeycloakClient(realm=realm, **kwargs) as client:
+            changes = RealmConfigurator(client, max_workers=workers).plan(desired)
+    except KeycloakClientError:
+        return 1
+
+    for change in changes:
+        print_change(change)
+
+    logger.info(t'{len(changes)} changes planned')
+    return 0
+
+
+def apply(
+    realm: str,
+    config: str,
+    workers: int,
+    **kwargs
+) -> int:
+    try:
+        desired = load_config(config)
+
+        with KeycloakClient(realm=realm, **kwargs) as client:
+            configurator = RealmConfigurator(client, max_workers=workers)
+            changes = configurator.apply(configurator.plan(desired))
+    except KeycloakClientError:
+        return 1
+
+    failed = 0
+    for change in changes:
+        if change.error:
+            failed += 1
+
+        print_change(change)
+
+    if not changes:
+        logger.info('Realm already matches the configuration')
+
+    return 1 if failed else 0
@@ -0,0 +1,368 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import dataclasses
+import json
+import logging
+import os
+from typing import Any, Iterator, Optional
+
+import requests
+
+from freecloak.plugins.keycloak import KeycloakClient
+from freecloak.plugins.keycloak.deadline import DeadlineExecutor
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+from freecloak.plugins.keycloak.groups import load_group_tree
+from freecloak.plugins.keycloak.roles import REALM_CONTAINER, RoleMappingReconciler
+from freecloak.plugins.logging import TemplateStringAdapter
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+CONFIG_SECTIONS = ['realm', 'roles', 'clients', 'groups']
+
+REALM_REF = '#/components/schemas/RealmRepresentation'
+
+# Per resource type: model, identifying field, create and update actions and the update action's id parameter
+CONFIG_RESOURCES = {
+    'client': {
+        'ref': '#/components/schemas/ClientRepresentation',
+        'name': 'client_id',
+        'create': 'action_105',
+        'update': ('action_110', 'client_uuid', 'id'),
+    },
+    'group': {
+        'ref': '#/components/schemas/GroupRepresentation',
+        'name': 'path',
+        'create': 'action_232',
+        'update': ('action_235', 'group_id', 'id'),
+    },
+    'role': {
+        'ref': '#/components/schemas/RoleRepresentation',
+        'name': 'name',
+        'create': 'action_302',
+        'update': ('action_314', 'role_name', 'name'),
+    },
+}
+
+# Field naming each resource in the configuration files
+CONFIG_IDENTITY_FIELDS = {'client': 'client_id', 'group': 'name', 'role': 'name'}
+
+# Group fields that are managed through role mappings rather than the group itself
+GROUP_MAPPING_FIELDS = ['realm_roles', 'client_roles']
+
+# Keycloak masks credentials on read, so they can never be compared and are never printed
+CREDENTIAL_FIELDS = ['password', 'secret']
+MASKED_VALUE = '**********'
+
+# Writes are issued stage by stage; everything within a stage is independent
+REALM_STAGE = 0
+ROLE_STAGE = 1
+CLIENT_STAGE = 2
+GROUP_STAGE = 3
+MAPPING_STAGE = 1000
+
+
+@dataclasses.dataclass
+class ConfigChange:
+    resource_type: str
+    name: str
+    action: str
+    stage: int
+    fields: dict[str, dict] = dataclasses.field(default_factory=dict)
+    payload: dict = dataclasses.field(default_factory=dict, repr=False)
+    resource_id: Optional[str] = None
+    parent: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclasses.dataclass
+class RealmState:
+    realm: dict
+    roles: dict[str, dict]
+    clients: dict[str, dict]
+    groups: dict[str, dict]
+
+
+def load_config(path: str) -> dict:
+    paths = [path]
+    if os.path.isdir(path):
+        paths = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.json'))
+
+    # A directory of files is merged so each section can live in its own file
+    config = {'realm': dict(), 'roles': [], 'clients': [], 'groups': []}
+    for config_path in paths:
+        try:
+            with open(config_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            logger.error(t'Could not read configuration file {config_path}; exiting')
+            raise KeycloakClientError
+
+        if not isinstance(data, dict):
+            logger.error(t'Configuration file {config_path} does not contain an object; exiting')
+            raise KeycloakClientError
+
+        for section, value in data.items():
+            if section not in CONFIG_SECTIONS:
+                logger.error(t'Unknown configuration section {section} in {config_path}; exiting')
+                raise KeycloakClientError
+
+            if not isinstance(value, dict if section == 'realm' else list):
+                logger.error(t'Configuration section {section} in {config_path} has the wrong type; exiting')
+                raise KeycloakClientError
+
+            if section == 'realm':
+                config['realm'].update(value)
+            else:
+                config[section].extend(value)
+
+    return config
+
+def normalize(value: Any) -> Any:
+    # List order is not significant for the scalar lists Keycloak stores (redirect URIs, attribute values, ...)
+    if isinstance(value, list) and all(isinstance(item, (str, int, float, bool)) for item in value):
+        return sorted(value, key=str)
+
+    return value
+
+def diff_fields(desired: dict, current: dict, prefix: str = '') -> dict[str, dict]:
+    differences = dict()
+    for key, desired_value in desired.items():
+        if key in CREDENTIAL_FIELDS:
+            continue
+
+        current_value = current.get(key)
+
+        # Only declared keys are compared, so unmanaged settings keep their server values
+        if isinstance(desired_value, dict) and isinstance(current_value, dict):
+            differences.update(diff_fields(desired_value, current_value, f'{prefix}{key}.'))
+        elif normalize(desired_value) != normalize(current_value):
+            differences[f'{prefix}{key}'] = {'current': current_value, 'desired': desired_value}
+
+    return differences
+
+def flatten_groups(groups: list[dict], parent_path: str = '', depth: int = 0) -> Iterator[tuple[str, dict, int]]:
+    for group in groups:
+        path = f'{parent_path}/{group["name"]}'
+        yield path, {key: value for key, value in group.items() if key != 'sub_groups'}, depth
+        yield from flatten_groups(group.get('sub_groups', []), path, depth + 1)
+
+
+class RealmConfigurator:
+    __slots__ = ['client', 'group_ids', 'max_workers']
+
+    def __init__(self, client: KeycloakClient, *, max_workers: int = 8) -> None:
+        self.client = client
+        self.group_ids: dict[str, str] = dict()
+        self.max_workers = max_workers
+
+    def fetch_groups(self) -> dict[str, dict]:
+        tree = load_group_tree(self.client, representations=True, max_workers=self.max_workers)
+
+        groups = dict()
+        for node in tree:
+            # Subgroups are entries of their own, a nested copy would be sent back with every group update
+            node.representation.pop('sub_groups', None)
+            groups[node.path] = node.representation
+
+        return groups
+
+    def fetch(self) -> RealmState:
+        with DeadlineExecutor(max_workers=self.max_workers) as executor:
+            realm = executor.submit(self.client.get_realm, realm=self.client.realm)
+            roles = executor.submit(lambda: list(self.client.paginate('action_301', realm=self.client.realm, brief_representation=False)))
+            clients = executor.submit(lambda: list(self.client.paginate('action_104', realm=self.client.realm)))
+            groups = executor.submit(self.fetch_groups)
+
+            state = RealmState(
+                realm=realm.result(),
+                roles={role['name']: role for role in roles.result()},
+                clients={client['client_id']: client for client in clients.result()},
+                groups=groups.result(),
+            )
+
+        self.group_ids = {path: group['id'] for path, group in state.groups.items()}
+        return state
+
+    def writable(self, resource_type: str, data: dict) -> dict:
+        # Masked credentials read back from the server must never be written over the real ones
+        model = self.client.load_model(CONFIG_RESOURCES[resource_type]['ref'])
+        return {
+            key: value
+            for key, value
+            in data.items()
+            if key in model and not model[key].get('read_only') and value != MASKED_VALUE
+        }
+
+    def validate_resource(self, resource_type: str, data: Any) -> None:
+        if not isinstance(data, dict):
+            logger.error(t'Configured {resource_type} is not an object; exiting')
+            raise KeycloakClientError
+
+        identity_field = CONFIG_IDENTITY_FIELDS[resource_type]
+        if not isinstance(data.get(identity_field), str) or not data[identity_field]:
+            logger.error(t'Configured {resource_type} is missing {identity_field}; exiting')
+            raise KeycloakClientError
+
+        self.client.validate_model(self.client.load_model(CONFIG_RESOURCES[resource_type]['ref']), data)
+
+    def validate(self, desired: dict) -> None:
+        # Keys must use the model's names, or they would never match the fetched state and be dropped from every write
+        self.client.validate_model(self.client.load_model(REALM_REF), desired['realm'])
+
+        for role in desired['roles']:
+            self.validate_resource('role', role)
+
+        for client in desired['clients']:
+            self.validate_resource('client', client)
+
+        groups = list(desired['groups'])
+        while groups:
+            group = groups.pop()
+            self.validate_resource('group', group)
+            groups.extend(group.get('sub_groups') or [])
+
+    def plan_resource(self, resource_type: str, name: str, desired: dict, current: Optional[dict], stage: int) -> Optional[ConfigChange]:
+        if current is None:
+            return ConfigChange(resource_type=resource_type, name=name, action='create', stage=stage, payload=desired)
+
+        if not (fields := diff_fields(desired, current)):
+            return None
+
+        # Updates send the full representation since some endpoints reset omitted fields
+        return ConfigChange(
+            resource_type=resource_type,
+            name=name,
+            action='update',
+            stage=stage,
+            fields=fields,
+            payload=self.writable(resource_type, current | desired),
+            resource_id=current[CONFIG_RESOURCES[resource_type]['update'][2]],
+        )
+
+    def plan(self, desired: dict, state: Optional[RealmState] = None) -> list[ConfigChange]:
+        self.validate(desired)
+
+        if state is None:
+            state = self.fetch()
+
+        changes = list()
+
+        realm_settings = {key: value for key, value in desired['realm'].items() if key != 'realm'}
+        if realm_fields := diff_fields(realm_settings, state.realm):
+            changes.append(ConfigChange(
+                resource_type='realm',
+                name=self.client.realm,
+                action='update',
+                stage=REALM_STAGE,
+                fields=realm_fields,
+                payload=realm_settings,
+            ))
+
+        for role in desired['roles']:
+            changes.append(self.plan_resource('role', role['name'], role, state.roles.get(role['name']), ROLE_STAGE))
+
+        for client in desired['clients']:
+            changes.append(self.plan_resource('client', client['client_id'], client, state.clients.get(client['client_id']), CLIENT_STAGE))
+
+        for path, group, depth in flatten_groups(desired['groups']):
+            group_settings = {key: value for key, value in group.items() if key not in GROUP_MAPPING_FIELDS}
+            current = state.groups.get(path)
+
+            if (change := self.plan_resource('group', path, group_settings, current, GROUP_STAGE + depth)) is not None:
+                change.parent = path.rsplit('/', 1)[0] or None
+                changes.append(change)
+
+            if (mapping_change := self.plan_group_roles(path, group, current)) is not None:
+                changes.append(mapping_change)
+
+        return sorted((change for change in changes if change is not None), key=lambda change: change.stage)
+
+    def plan_group_roles(self, path: str, group: dict, current: Optional[dict]) -> Optional[ConfigChange]:
+        current = current or dict()
+
+        # Each role container is compared separately; containers the group does not declare are left alone
+        desired_roles = dict()
+        current_roles = dict()
+        if (realm_roles := group.get('realm_roles')) is not None:
+            desired_roles[REALM_CONTAINER] = set(realm_roles)
+            current_roles[REALM_CONTAINER] = set(current.get('realm_roles') or [])
+
+        current_client_roles = current.get('client_roles') or dict()
+        for client_id, client_roles in (group.get('client_roles') or dict()).items():
+            desired_roles[client_id] = set(client_roles)
+            current_roles[client_id] = set(current_client_roles.get(client_id) or [])
+
+        fields = {
+            'realm_roles' if container == REALM_CONTAINER else f'client_roles.{container}': {
+                'current': sorted(current_roles[container]),
+                'desired': sorted(roles),
+            }
+            for container, roles
+            in desired_roles.items()
+            if roles != current_roles[container]
+        }
+        if not fields:
+            return None
+
+        return ConfigChange(
+            resource_type='group_roles',
+            name=path,
+            action='map',
+            stage=MAPPING_STAGE,
+            fields=fields,
+            payload=desired_roles,
+        )
+
+    def apply_change(self, change: ConfigChange) -> ConfigChange:
+        try:
+            match change.resource_type, change.action:
+                case 'realm', _:
+                    self.client.update_realm(realm=self.client.realm, **change.payload)
+                case 'group_roles', _:
+                    reconciler = RoleMappingReconciler(self.client, max_workers=1)
+                    for mapping_change in reconciler.apply(reconciler.plan_principal(('group', self.group_ids[change.name]), change.payload)):
+                        change.error = change.error or mapping_change.error
+                case 'group', 'create' if change.parent:
+                    response = self.client.action_238(realm=self.client.realm, group_id=self.group_ids[change.parent], **change.payload)
+                    self.group_ids[change.name] = response.get('id')
+                case resource_type, 'create':
+                    response = getattr(self.client, CONFIG_RESOURCES[resource_type]['create'])(realm=self.client.realm, **change.payload)
+                    if resource_type == 'group':
+                        self.group_ids[change.name] = response.get('id')
+                case resource_type, _:
+                    action, id_param, _ = CONFIG_RESOURCES[resource_type]['update']
+                    getattr(self.client, action)(realm=self.client.realm, **{id_param: change.resource_id}, **change.payload)
+        except (KeycloakClientError, KeyError, requests.RequestException) as e:
+            change.error = type(e).__name__
+
+        return change
+
+    def apply(self, changes: list[ConfigChange]) -> list[ConfigChange]:
+        results = list()
+
+        with DeadlineExecutor(max_workers=self.max_workers) as executor:
+            for stage in sorted({change.stage for change in changes}):
+                stage_changes = [change for change in changes if change.stage == stage]
+                logger.debug(t'Applying {len(stage_changes)} changes in stage {stage}')
+
+                results.extend(executor.map(self.apply_change, stage_changes))
+
+        return results
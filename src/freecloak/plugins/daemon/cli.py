@@ -0,0 +1,33 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import argparse
+import logging
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.daemon.client import default_socket_path
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+def add_plugin_parser(subparsers: argparse._SubParsersAction) -> None:
+    serve_parser = subparsers.add_parser('serve', description='keep plugins, specifications and sessions warm for forwarded commands, which run one at a time')
+    serve_parser.add_argument('--socket', help='unix socket to listen on', metavar='PATH', default=default_socket_path())
+    serve_parser.add_argument('--idle-timeout', help='seconds an unused Keycloak session stays open', type=float, default=900.0)
@@ -0,0 +1,99 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import json
+import logging
+import os
+import socket
+import stat
+import sys
+import tempfile
+from typing import Iterator, Optional
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+SOCKET_ENVIRONMENT_VARIABLE = 'FREECLOAK_SOCKET'
+
+
+def default_socket_path() -> str:
+    if socket_path := os.environ.get(SOCKET_ENVIRONMENT_VARIABLE):
+        return socket_path
+
+    runtime_directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    return os.path.join(runtime_directory, f'freecloak-{os.getuid()}.sock')
+
+def read_messages(stream) -> Iterator[dict]:
+    for line in stream:
+        yield json.loads(line)
+
+def write_message(stream, message: dict) -> None:
+    stream.write(json.dumps(message).encode('utf-8') + b'\n')
+    stream.flush()
+
+def trusted_socket(socket_path: str) -> bool:
+    try:
+        socket_stat = os.lstat(socket_path)
+    except FileNotFoundError:
+        return False
+
+    # The command line carries credentials, so only talk to a socket nobody else could have created or opened
+    if not stat.S_ISSOCK(socket_stat.st_mode) or socket_stat.st_uid != os.getuid() or socket_stat.st_mode & 0o077:
+        logger.warning(t'Daemon socket {socket_path} is not a private socket owned by this user; running locally')
+        return False
+
+    return True
+
+def forward_command(argv: list[str], socket_path: str) -> Optional[int]:
+    # Standard input and binary output are not relayed, so commands streaming through - run here
+    if '-' in argv:
+        return None
+
+    if not trusted_socket(socket_path):
+        return None
+
+    try:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(socket_path)
+    except OSError as e:
+        logger.debug(t'Could not connect to daemon at {socket_path} ({e}); running locally')
+        return None
+
+    logger.debug(t'Forwarding command to daemon at {socket_path}')
+
+    with connection, connection.makefile('rwb') as stream:
+        try:
+            write_message(stream, {'argv': argv, 'cwd': os.getcwd()})
+
+            # Output is relayed as the daemon produces it, the final message carries the exit code
+            for message in read_messages(stream):
+                if 'code' in message:
+                    return message['code']
+
+                output = sys.stdout if message['stream'] == 'stdout' else sys.stderr
+                output.write(message['data'])
+                output.flush()
+        except (OSError, ValueError) as e:
+            logger.error(t'Lost connection to daemon ({e}); exiting')
+            return 1
+
+    logger.error('Daemon closed the connection before the command finished')
+    return 1
@@ -0,0 +1,36 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import logging
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.daemon.server import FreecloakDaemon
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+def serve(socket: str, idle_timeout: float, **kwargs) -> int:
+    try:
+        FreecloakDaemon(socket, idle_timeout=idle_timeout, **kwargs).serve()
+    except OSError as e:
+        logger.error(t'Could not serve on {socket} ({e}); exiting')
+        return 1
+
+    return 0
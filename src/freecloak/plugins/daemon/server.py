@@ -0,0 +1,167 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import socket
+import socketserver
+import stat
+import threading
+
+import freecloak.cli
+from freecloak.plugins.keycloak.client import load_specification
+from freecloak.plugins.keycloak.registry import SESSION_REGISTRY
+from freecloak.plugins.logging import configure_logging, TemplateStringAdapter
+
+from freecloak.plugins.daemon.client import read_messages, write_message
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+class CommandOutput(io.TextIOBase):
+    def __init__(self, stream, stream_name: str) -> None:
+        super().__init__()
+        self.stream = stream
+        self.stream_name = stream_name
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: str) -> int:
+        if data:
+            write_message(self.stream, {'stream': self.stream_name, 'data': data})
+
+        return len(data)
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        try:
+            request = next(read_messages(self.rfile))
+        except (StopIteration, ValueError):
+            logger.warning('Received malformed daemon request; ignoring')
+            return
+
+        try:
+            return_code = self.server.daemon.execute(
+                request['argv'],
+                request.get('cwd', os.getcwd()),
+                CommandOutput(self.wfile, 'stdout'),
+                CommandOutput(self.wfile, 'stderr'),
+            )
+
+            write_message(self.wfile, {'code': return_code})
+        except OSError:
+            logger.warning('Client disconnected before the command finished')
+
+class FreecloakDaemon:
+    __slots__ = [
+        'lock',
+        'logging_args',
+        'parser',
+        'plugins',
+        'socket_path',
+    ]
+
+    lock: threading.Lock
+    logging_args: dict
+    parser: argparse.ArgumentParser
+    plugins: dict
+    socket_path: str
+
+    def __init__(self, socket_path: str, *, idle_timeout: float = 900.0, **logging_args) -> None:
+        self.lock = threading.Lock()
+        self.logging_args = logging_args
+        self.socket_path = socket_path
+
+        # Sessions borrowed by commands stay authenticated in the registry between requests
+        SESSION_REGISTRY.idle_timeout = idle_timeout
+
+        # Plugin discovery, parser construction and specification parsing happen once instead of on every command
+        self.parser, self.plugins = freecloak.cli.build_parser()
+        load_specification()
+
+    def remove_stale_socket(self) -> None:
+        try:
+            socket_stat = os.lstat(self.socket_path)
+        except FileNotFoundError:
+            return
+
+        # Only a socket nobody answers on is left over from a daemon that died; anything else is not ours to remove
+        if not stat.S_ISSOCK(socket_stat.st_mode):
+            raise FileExistsError(f'{self.socket_path} exists and is not a socket')
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            try:
+                connection.connect(self.socket_path)
+            except ConnectionRefusedError:
+                logger.info(t'Removing stale daemon socket {self.socket_path}')
+                os.unlink(self.socket_path)
+                return
+
+        raise FileExistsError(f'another daemon is already listening on {self.socket_path}')
+
+    def serve(self) -> None:
+        self.remove_stale_socket()
+
+        # The socket must never be reachable by other users, not even between binding and a chmod
+        umask = os.umask(0o077)
+        try:
+            server = socketserver.ThreadingUnixStreamServer(self.socket_path, CommandHandler)
+        finally:
+            os.umask(umask)
+
+        with server:
+            server.daemon = self
+
+            logger.info(t'Daemon listening on {self.socket_path}')
+
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                logger.info('Daemon interrupted; shutting down')
+            finally:
+                os.unlink(self.socket_path)
+                SESSION_REGISTRY.close()
+
+    def execute(self, argv: list[str], cwd: str, stdout: io.TextIOBase, stderr: io.TextIOBase) -> int:
+        # Working directory, standard streams and logging are process-wide, so commands run one at a time:
+        # concurrent requests are accepted, but each waits here until the command before it has finished
+        with self.lock:
+            try:
+                with contextlib.chdir(cwd), contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                    return self.run_command(argv)
+            finally:
+                configure_logging(**self.logging_args)
+
+    def run_command(self, argv: list[str]) -> int:
+        try:
+            args = vars(self.parser.parse_args(argv))
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 0 if e.code is None else 1
+
+        configure_logging(**args)
+
+        try:
+            return freecloak.cli.run_command(args, self.plugins)
+        except Exception as e:
+            logger.error(t'Command failed ({e.__class__.__name__}: {e})')
+            return 1
@@ -0,0 +1,33 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+from freecloak import __version__
+from freecloak.plugins.plugins import PluginInfo
+
+from freecloak.plugins.freeipa.client import FreeIPAClient
+
+
+__all__ = [
+    'FreeIPAClient',
+]
+
+__plugin_info__ = PluginInfo(
+    plugin_name='freeipa',
+    plugin_description='freeipa interface plugin',
+    plugin_version=__version__,
+)
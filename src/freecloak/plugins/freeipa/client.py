@@ -0,0 +1,216 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import itertools
+import logging
+from typing import Any, Iterable, Iterator, Optional, Self
+
+import requests
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.freeipa.exceptions import *
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+# FreeIPA error code for missing entries
+NOT_FOUND_ERROR_CODE = 4001
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+
+
+class FreeIPAClient:
+    __slots__ = [
+        'api_version',
+        'base_url',
+        'batch_size',
+        'password',
+        'session',
+        'timeout',
+        'username',
+    ]
+
+    def __init__(
+        self,
+        *,
+        server: str,
+        username: str,
+        password: Optional[str] = None,
+        password_file: Optional[str] = None,
+        port: Optional[int] = None,
+        ca_cert: Optional[str] = None,
+        allow_insecure: Optional[bool] = None,
+        api_version: Optional[str] = None,
+        batch_size: int = 100,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        session: Optional[requests.Session] = None,
+        **_,
+    ):
+        schema = 'https'
+        if allow_insecure:
+            logger.warning('You are connecting to FreeIPA using an insecure connection!')
+            schema = 'http'
+
+        if port is not None:
+            if port == 0 or port > 65535:
+                logger.error('Invalid port number specified; exiting')
+                raise FreeIPAClientError
+
+        self.base_url = f'{schema}://{server}{f':{port}' if port else ''}/ipa/'
+        self.username = username
+        self.api_version = api_version
+        self.batch_size = batch_size
+        self.timeout = (connect_timeout, read_timeout)
+
+        if password:
+            self.password = password
+        elif password_file:
+            try:
+                with open(password_file) as f:
+                    self.password = f.read().strip()
+            except FileNotFoundError:
+                logger.error('FreeIPA password file not found; exiting')
+                raise FreeIPAClientError
+        else:
+            logger.error('No FreeIPA password specified; exiting')
+            raise FreeIPAClientError
+
+        self.session = session or requests.Session()
+        self.session.headers['Referer'] = self.base_url
+        if ca_cert:
+            self.session.verify = ca_cert
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.session.close()
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        try:
+            return self.session.post(f'{self.base_url}{path}', timeout=self.timeout, **kwargs)
+        except requests.Timeout:
+            logger.error(t'FreeIPA did not answer {path} in time; exiting')
+            raise FreeIPAClientTimeoutError
+        except requests.RequestException as e:
+            logger.error(t'Could not reach FreeIPA ({e.__class__.__name__}); exiting')
+            raise FreeIPAClientError
+
+    def login(self) -> None:
+        logger.debug('Logging in to FreeIPA')
+
+        response = self.post(
+            'session/login_password',
+            data={'user': self.username, 'password': self.password},
+            headers={'Accept': 'text/plain'},
+        )
+
+        if response.status_code != 200:
+            logger.error(t'FreeIPA login failed with status {response.status_code}; exiting')
+            raise FreeIPAClientAuthenticationError
+
+    def call(self, method: str, *args: Any, **options: Any) -> Any:
+        # Without a version FreeIPA assumes its own, while a newer one than the server's is rejected
+        if self.api_version:
+            options['version'] = self.api_version
+
+        payload = {
+            'method': method,
+            'params': [list(args), options],
+            'id': 0,
+        }
+
+        # The session cookie is reused until FreeIPA rejects it, then we log in again once
+        response = self.post('session/json', json=payload)
+        if response.status_code == 401:
+            self.login()
+            response = self.post('session/json', json=payload)
+
+        if response.status_code != 200:
+            logger.error(t'FreeIPA call {method} failed with status {response.status_code}; exiting')
+            raise FreeIPAClientError
+
+        response_data = response.json()
+        if error := response_data.get('error'):
+            raise_call_error(method, error.get('code'), error.get('message'))
+
+        return response_data['result']
+
+    def batch(self, calls: Iterable[tuple[str, list, dict]]) -> Iterator[dict]:
+        calls = iter(calls)
+
+        while chunk := list(itertools.islice(calls, self.batch_size)):
+            batch_result = self.call(
+                'batch',
+                *[{'method': method, 'params': [list(args), options]} for method, args, options in chunk],
+            )
+
+            yield from batch_result['results']
+
+    def show_many(self, method: str, keys: Iterable[str], **options: Any) -> Iterator[dict]:
+        for key, result in zip(keys, self.batch((method, [key], options) for key in keys)):
+            if error := result.get('error'):
+                if result.get('error_code') == NOT_FOUND_ERROR_CODE:
+                    logger.warning(t'FreeIPA entry {key} not found; skipping')
+                    continue
+
+                raise_call_error(method, result.get('error_code'), error)
+
+            yield result['result']
+
+    def user_show_many(self, uids: Iterable[str], **options: Any) -> Iterator[dict]:
+        yield from self.show_many('user_show', list(uids), **{'all': True, **options})
+
+    def group_show_many(self, cns: Iterable[str], **options: Any) -> Iterator[dict]:
+        yield from self.show_many('group_show', list(cns), **{'all': True, **options})
+
+    def find_users(self, *criteria: str, page_size: Optional[int] = None, **options: Any) -> Iterator[dict]:
+        # user_find cannot page server side, so list the keys once and fetch full entries in batches
+        uids = [
+            entry['uid'][0]
+            for entry
+            in self.call('user_find', *criteria, pkey_only=True, sizelimit=0, **options)['result']
+        ]
+
+        page_size = page_size or self.batch_size
+        for i in range(0, len(uids), page_size):
+            yield from self.user_show_many(uids[i:i + page_size])
+
+    def find_groups(self, *criteria: str, page_size: Optional[int] = None, **options: Any) -> Iterator[dict]:
+        cns = [
+            entry['cn'][0]
+            for entry
+            in self.call('group_find', *criteria, pkey_only=True, sizelimit=0, **options)['result']
+        ]
+
+        page_size = page_size or self.batch_size
+        for i in range(0, len(cns), page_size):
+            yield from self.group_show_many(cns[i:i + page_size])
+
+
+def raise_call_error(method: str, code: Optional[int], message: Optional[str]) -> None:
+    if code == NOT_FOUND_ERROR_CODE:
+        logger.error(t'FreeIPA call {method} found no entry: {message}; exiting')
+        raise FreeIPAClientNotFoundError(message)
+
+    logger.error(t'FreeIPA call {method} failed: {message}; exiting')
+    raise FreeIPAClientError(message)
@@ -19,12 +19,43 @@
 from freecloak import __version__
 from freecloak.plugins.plugins import PluginInfo
 
+from freecloak.plugins.keycloak.analytics import LoginEventAnalyzer, SpaceSaving
+from freecloak.plugins.keycloak.buffer import UpdateBuffer
 from freecloak.plugins.keycloak.client import KeycloakClient, KeycloakSession
+from freecloak.plugins.keycloak.groups import GroupNode, GroupTree, load_group_tree
+from freecloak.plugins.keycloak.parallel import ModelProcessPool
+from freecloak.plugins.keycloak.realms import MultiRealmExecutor, RealmResult
+from freecloak.plugins.keycloak.registry import SESSION_REGISTRY, SessionRegistry
+from freecloak.plugins.keycloak.resolver import KeycloakResolver
+from freecloak.plugins.keycloak.snapshot import compare_snapshots, RealmSnapshot, SnapshotChange, take_snapshot
+from freecloak.plugins.keycloak.tokens import create_verifier, JWKSCache, TokenVerifier
+from freecloak.plugins.keycloak.views import KeycloakListView, KeycloakModelView
 
 
 __all__ = [
+    'compare_snapshots',
+    'create_verifier',
+    'GroupNode',
+    'GroupTree',
+    'JWKSCache',
     'KeycloakClient',
+    'KeycloakListView',
+    'KeycloakModelView',
+    'KeycloakResolver',
     'KeycloakSession',
+    'load_group_tree',
+    'LoginEventAnalyzer',
+    'ModelProcessPool',
+    'MultiRealmExecutor',
+    'RealmResult',
+    'RealmSnapshot',
+    'SESSION_REGISTRY',
+    'SessionRegistry',
+    'SnapshotChange',
+    'SpaceSaving',
+    'take_snapshot',
+    'TokenVerifier',
+    'UpdateBuffer',
 ]
 
 __plugin_info__ = PluginInfo(
@@ -0,0 +1,273 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import dataclasses
+import heapq
+import logging
+import sqlite3
+import time
+from typing import Any, Callable, Iterator, Optional
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.client import KeycloakClient
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+LOGIN_EVENT_TYPES = {'LOGIN', 'CLIENT_LOGIN'}
+FAILED_LOGIN_EVENT_TYPES = {'LOGIN_ERROR', 'CLIENT_LOGIN_ERROR'}
+
+EVENT_FIELDS = ['time', 'type', 'client_id', 'user_id', 'ip_address']
+
+LAST_LOGIN_SCHEMA = """
+CREATE TABLE IF NOT EXISTS last_logins (
+    user_id TEXT PRIMARY KEY,
+    time INTEGER NOT NULL
+);
+"""
+
+
+@dataclasses.dataclass
+class EventBucket:
+    start: int
+    end: int
+    events: int = 0
+    logins: int = 0
+    failed_logins: int = 0
+    spike: bool = False
+    types: dict[str, int] = dataclasses.field(default_factory=dict)
+    client_logins: dict[str, int] = dataclasses.field(default_factory=dict)
+
+
+@dataclasses.dataclass
+class HeavyHitter:
+    kind: str
+    key: str
+    count: int
+    error: int
+
+
+@dataclasses.dataclass
+class DormantUser:
+    id: str
+    username: str
+    last_login: Optional[int]
+
+
+class SpaceSaving:
+    __slots__ = ['capacity', 'counts', 'errors', 'heap']
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.counts: dict[str, int] = dict()
+        self.errors: dict[str, int] = dict()
+        self.heap: list[tuple[int, str]] = list()
+
+    def add(self, key: str, count: int = 1) -> None:
+        if key in self.counts:
+            self.counts[key] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+        else:
+            # The newcomer inherits the evicted minimum, which bounds how far its count can overestimate
+            minimum = self.pop_minimum()
+            self.counts[key] = minimum + count
+            self.errors[key] = minimum
+
+        heapq.heappush(self.heap, (self.counts[key], key))
+
+        # Increments leave stale heap entries behind, so rebuild before they outgrow the counters
+        if len(self.heap) > 4 * self.capacity:
+            self.heap = [(key_count, heap_key) for heap_key, key_count in self.counts.items()]
+            heapq.heapify(self.heap)
+
+    def pop_minimum(self) -> int:
+        while True:
+            count, key = heapq.heappop(self.heap)
+            if self.counts.get(key) == count:
+                del self.counts[key]
+                del self.errors[key]
+                return count
+
+    def top(self, n: int) -> list[tuple[str, int, int]]:
+        return [(key, count, self.errors[key]) for key, count in heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])]
+
+
+class LoginEventAnalyzer:
+    __slots__ = [
+        'bucket',
+        'bucket_size',
+        'callback',
+        'client',
+        'failed_average',
+        'failed_ips',
+        'failed_users',
+        'last_logins',
+        'page_size',
+        'spike_factor',
+    ]
+
+    def __init__(
+        self,
+        client: KeycloakClient,
+        callback: Callable[[Any], None],
+        *,
+        last_logins: sqlite3.Connection,
+        bucket_size: int = 3600,
+        capacity: int = 10000,
+        page_size: int = 500,
+        spike_factor: float = 3.0,
+    ) -> None:
+        self.client = client
+        self.callback = callback
+        self.bucket_size = bucket_size
+        self.page_size = page_size
+        self.spike_factor = spike_factor
+
+        self.bucket: Optional[EventBucket] = None
+        self.failed_average: Optional[float] = None
+        self.failed_ips = SpaceSaving(capacity)
+        self.failed_users = SpaceSaving(capacity)
+
+        self.last_logins = last_logins
+        self.last_logins.executescript(LAST_LOGIN_SCHEMA)
+
+    def analyze(self, *, date_from: Optional[str] = None, date_to: Optional[str] = None, types: Optional[list[str]] = None) -> int:
+        query = {'direction': 'asc'}
+        if date_from:
+            query['date_from'] = date_from
+        if date_to:
+            query['date_to'] = date_to
+        if types:
+            query['type'] = types
+
+        analyzed = 0
+        page_logins = dict()
+        for event in self.events(query):
+            self.add(event)
+            analyzed += 1
+
+            if event.get('type') in LOGIN_EVENT_TYPES and (user_id := event.get('user_id')):
+                page_logins[user_id] = max(event['time'], page_logins.get(user_id, 0))
+
+            # Last logins go to disk a page at a time so memory stays flat however many users log in
+            if analyzed % self.page_size == 0:
+                self.save_logins(page_logins)
+                page_logins.clear()
+
+        self.save_logins(page_logins)
+        self.close_bucket()
+
+        return analyzed
+
+    def events(self, query: dict) -> Iterator[dict]:
+        # Each page starts at the time of the last event seen rather than at a growing offset, which the server
+        # would have to skip over on every request; only events sharing that exact time are skipped by offset
+        boundary_time = None
+        boundary_count = 0
+        while True:
+            page = self.client.action_226(
+                realm=self.client.realm,
+                first=boundary_count,
+                max=self.page_size,
+                fields=EVENT_FIELDS,
+                **query,
+            )
+
+            for event in page:
+                if event['time'] == boundary_time:
+                    boundary_count += 1
+                else:
+                    boundary_time = event['time']
+                    boundary_count = 1
+
+                yield event
+
+            if len(page) < self.page_size:
+                return
+
+            query['date_from'] = str(boundary_time)
+
+    def add(self, event: dict) -> None:
+        event_time = event['time']
+        if self.bucket is None or event_time >= self.bucket.end:
+            self.close_bucket()
+
+            start = event_time - event_time % (self.bucket_size * 1000)
+            self.bucket = EventBucket(start=start, end=start + self.bucket_size * 1000)
+
+        bucket = self.bucket
+        event_type = event.get('type') or 'UNKNOWN'
+
+        bucket.events += 1
+        bucket.types[event_type] = bucket.types.get(event_type, 0) + 1
+
+        if event_type in LOGIN_EVENT_TYPES:
+            bucket.logins += 1
+            if client_id := event.get('client_id'):
+                bucket.client_logins[client_id] = bucket.client_logins.get(client_id, 0) + 1
+        elif event_type in FAILED_LOGIN_EVENT_TYPES:
+            bucket.failed_logins += 1
+            if user_id := event.get('user_id'):
+                self.failed_users.add(user_id)
+            if ip_address := event.get('ip_address'):
+                self.failed_ips.add(ip_address)
+
+    def close_bucket(self) -> None:
+        if (bucket := self.bucket) is None:
+            return
+
+        # Spikes are measured against a moving average of the buckets before this one
+        if self.failed_average is not None:
+            bucket.spike = bucket.failed_logins > max(self.failed_average * self.spike_factor, 1)
+            self.failed_average = 0.7 * self.failed_average + 0.3 * bucket.failed_logins
+        else:
+            self.failed_average = float(bucket.failed_logins)
+
+        self.bucket = None
+        self.callback(bucket)
+
+    def save_logins(self, logins: dict[str, int]) -> None:
+        if not logins:
+            return
+
+        with self.last_logins:
+            self.last_logins.executemany(
+                'INSERT INTO last_logins (user_id, time) VALUES (?, ?) ON CONFLICT (user_id) DO UPDATE SET time = max(time, excluded.time)',
+                logins.items(),
+            )
+
+    def heavy_hitters(self, n: int) -> Iterator[HeavyHitter]:
+        for kind, counter in [('failed_login_user', self.failed_users), ('failed_login_ip', self.failed_ips)]:
+            for key, count, error in counter.top(n):
+                yield HeavyHitter(kind=kind, key=key, count=count, error=error)
+
+    def dormant_users(self, days: float) -> Iterator[DormantUser]:
+        cutoff = int((time.time() - days * 86400) * 1000)
+
+        for user in self.client.paginate('action_327', page_size=self.page_size, realm=self.client.realm, fields=['id', 'username', 'created_timestamp']):
+            # Accounts younger than the window have not had the chance to go dormant
+            if (user.get('created_timestamp') or 0) > cutoff:
+                continue
+
+            row = self.last_logins.execute('SELECT time FROM last_logins WHERE user_id = ?', (user['id'],)).fetchone()
+            if row is None or row[0] < cutoff:
+                yield DormantUser(id=user['id'], username=user['username'], last_login=row[0] if row else None)
@@ -25,6 +25,8 @@ import requests.auth
 
 from freecloak.plugins.logging import TemplateStringAdapter
 
+from freecloak.plugins.keycloak.deadline import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, request_timeout
+
 
 logger = TemplateStringAdapter(logging.getLogger(__name__))
 
@@ -38,7 +40,12 @@ class KeycloakAuthToken:
         self.token_type: str = token_type
 
     def __get__(self, obj: KeycloakAuth, obj_type=None) -> Self:
-        if not self.token_expires or self.token_expires < datetime.datetime.now():
+        if obj is None:
+            return self
+
+        # The descriptor is shared by every auth instance, so each one keeps its own token
+        token = obj.__dict__.setdefault('_token', KeycloakAuthToken())
+        if not token.token_expires or token.token_expires < datetime.datetime.now():
             logger.debug('Keycloak auth token expired; fetching new token')
 
             authentication_data = requests.post(
@@ -47,22 +54,30 @@ class KeycloakAuthToken:
                     'client_id': obj.client_id,
                     'client_secret': obj.client_secret,
                     'grant_type': 'client_credentials',
-                }
+                },
+                timeout=request_timeout(*obj.timeout),
             ).json()
 
-            self.token = authentication_data['access_token']
-            self.token_type = authentication_data['token_type']
-            self.token_expires = datetime.datetime.now() + datetime.timedelta(seconds=authentication_data['expires_in'])
+            token.token = authentication_data['access_token']
+            token.token_type = authentication_data['token_type']
+            token.token_expires = datetime.datetime.now() + datetime.timedelta(seconds=authentication_data['expires_in'])
 
-        return self
+        return token
 
 class KeycloakAuth(requests.auth.AuthBase):
     token = KeycloakAuthToken()
 
-    def __init__(self, client_id: str, client_secret: str, token_endpoint: str) -> None:
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        token_endpoint: str,
+        timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+    ) -> None:
         self.client_id: str = client_id
         self.client_secret: str = client_secret
         self.token_endpoint: str = token_endpoint
+        self.timeout: tuple[float, float] = timeout
 
     def __call__(self, r):
         r.headers['Authorization'] = f'{self.token.token_type} {self.token.token}'
@@ -0,0 +1,216 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import collections
+import copy
+import dataclasses
+import logging
+import threading
+import time
+from typing import Any, Optional, Self, TYPE_CHECKING
+
+import requests
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.deadline import DeadlineExecutor
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+
+if TYPE_CHECKING:
+    from freecloak.plugins.keycloak.client import KeycloakClient
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+# Resources whose update action accepts a partial representation, with the actions that read and delete them
+# Groups and roles are left out since their updates replace the whole representation
+BUFFERED_RESOURCES = {
+    'client': {'update': 'action_110', 'read': 'action_109', 'delete': 'action_111', 'id_param': 'client_uuid', 'path_param': 'client-uuid'},
+    'user': {'update': 'action_336', 'read': 'action_335', 'delete': 'action_337', 'id_param': 'user_id', 'path_param': 'user-id'},
+}
+
+# Keyed by action: the resource kind it touches and whether it updates, reads or deletes it
+BUFFERED_ACTIONS = {
+    resource[operation]: (kind, operation)
+    for kind, resource in BUFFERED_RESOURCES.items()
+    for operation in ['update', 'read', 'delete']
+}
+
+_MISSING = object()
+
+
+@dataclasses.dataclass
+class BufferedUpdate:
+    kind: str
+    realm: str
+    resource_id: str
+    changes: dict[str, Any] = dataclasses.field(default_factory=dict)
+    created: float = dataclasses.field(default_factory=time.monotonic)
+    error: Optional[str] = None
+
+
+class UpdateBuffer:
+    __slots__ = [
+        'client',
+        'failures',
+        'known',
+        'lock',
+        'max_age',
+        'max_pending',
+        'max_workers',
+        'merged',
+        'pending',
+        'skipped',
+        'written',
+    ]
+
+    def __init__(self, client: KeycloakClient, *, max_pending: int = 500, max_age: float = 5.0, max_workers: int = 8) -> None:
+        self.client = client
+        self.max_pending = max_pending
+        self.max_age = max_age
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+
+        self.pending: collections.OrderedDict[tuple[str, str, str], BufferedUpdate] = collections.OrderedDict()
+        self.known: dict[tuple[str, str, str], dict[str, Any]] = dict()
+        self.failures: list[BufferedUpdate] = list()
+
+        self.merged = 0
+        self.skipped = 0
+        self.written = 0
+
+    def __enter__(self) -> Self:
+        if self.client.update_buffer is not None:
+            logger.error('This client is already buffering updates; exiting')
+            raise KeycloakClientError
+
+        self.client.update_buffer = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.flush()
+        finally:
+            self.client.update_buffer = None
+
+        logger.debug(t'Update buffer wrote {self.written} updates, merged {self.merged} and skipped {self.skipped} no-ops')
+
+    def update(self, action: str, /, *, realm: str, **kwargs) -> dict:
+        kind, _ = BUFFERED_ACTIONS[action]
+        id_param = BUFFERED_RESOURCES[kind]['id_param']
+
+        if (resource_id := kwargs.pop(id_param, None)) is None:
+            logger.error(t'Required parameter {id_param} not found; exiting')
+            raise KeycloakClientError
+
+        key = (kind, realm, resource_id)
+        with self.lock:
+            if (pending := self.pending.get(key)) is None:
+                pending = self.pending[key] = BufferedUpdate(kind=kind, realm=realm, resource_id=resource_id)
+            else:
+                self.merged += 1
+
+            # The caller may keep changing its own objects after handing them over
+            pending.changes |= copy.deepcopy(kwargs)
+            due = len(self.pending) >= self.max_pending or self.expired()
+
+        if due:
+            self.flush()
+
+        return {'return': True}
+
+    def expired(self) -> bool:
+        return bool(self.pending) and time.monotonic() - next(iter(self.pending.values())).created >= self.max_age
+
+    def before_request(self, action: str, path_params: dict[str, str]) -> None:
+        # Every request checks the age limit, so pending writes are not held back while the caller only reads
+        with self.lock:
+            due = self.expired()
+
+        if due:
+            self.flush()
+            return
+
+        # A read of a resource with pending changes must see them, so those are written first
+        if BUFFERED_ACTIONS.get(action, (None, None))[1] == 'read':
+            kind, _ = BUFFERED_ACTIONS[action]
+            self.flush((kind, path_params['realm'], path_params[BUFFERED_RESOURCES[kind]['path_param']]))
+
+    def observe(self, action: str, path_params: dict[str, str], state: Any = None) -> None:
+        if (buffered_action := BUFFERED_ACTIONS.get(action)) is None:
+            return
+
+        kind, operation = buffered_action
+        key = (kind, path_params['realm'], path_params[BUFFERED_RESOURCES[kind]['path_param']])
+
+        with self.lock:
+            if operation == 'read' and isinstance(state, dict):
+                # Callers are free to modify what they read, which must not move the no-op baseline
+                self.known[key] = copy.deepcopy(state)
+            elif operation == 'delete':
+                # Writing pending changes to a deleted resource could only fail
+                self.pending.pop(key, None)
+                self.known.pop(key, None)
+
+    def flush(self, key: Optional[tuple[str, str, str]] = None) -> list[BufferedUpdate]:
+        with self.lock:
+            if key is None:
+                batch = list(self.pending.values())
+                self.pending.clear()
+            else:
+                batch = [pending] if (pending := self.pending.pop(key, None)) is not None else []
+
+        if not batch:
+            return batch
+
+        with DeadlineExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.write, batch))
+
+    def write(self, update: BufferedUpdate) -> BufferedUpdate:
+        resource = BUFFERED_RESOURCES[update.kind]
+        key = (update.kind, update.realm, update.resource_id)
+
+        with self.lock:
+            known = self.known.get(key, dict())
+
+        changes = {field: value for field, value in update.changes.items() if known.get(field, _MISSING) != value}
+        if not changes:
+            with self.lock:
+                self.skipped += 1
+
+            return update
+
+        # The merged changes are validated once here, as a single request
+        # Connection errors are recorded too, so the caller learns about every update that was never written
+        try:
+            self.client.api_callable(resource['update'])(realm=update.realm, **{resource['id_param']: update.resource_id}, **changes)
+        except (KeycloakClientError, requests.RequestException) as e:
+            logger.warning(t'Buffered update of {update.kind} {update.resource_id} failed')
+            update.error = e.__class__.__name__
+
+            with self.lock:
+                self.failures.append(update)
+
+            return update
+
+        with self.lock:
+            self.known[key] = known | changes
+            self.written += 1
+
+        return update
@@ -0,0 +1,268 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import concurrent.futures
+import dataclasses
+import json
+import logging
+from typing import Iterable, Iterator, Optional
+
+import requests
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.client import convert_snake_case, KeycloakClient
+from freecloak.plugins.keycloak.deadline import DeadlineExecutor
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+from freecloak.plugins.keycloak.journal import BulkJournal, journal_key
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+IMPORT_POLICIES = {
+    'fail': 'FAIL',
+    'overwrite': 'OVERWRITE',
+    'skip': 'SKIP',
+}
+
+IMPORT_RESOURCES = {
+    'client': {
+        'api_name': 'clients',
+        'name': 'clientId',
+        'ref': '#/components/schemas/ClientRepresentation',
+        'result_type': 'CLIENT',
+    },
+    'group': {
+        'api_name': 'groups',
+        'name': 'name',
+        'ref': '#/components/schemas/GroupRepresentation',
+        'result_type': 'GROUP',
+    },
+    'role': {
+        'api_name': 'roles',
+        'container': 'realm',
+        'name': 'name',
+        'ref': '#/components/schemas/RoleRepresentation',
+        'result_type': 'REALM_ROLE',
+    },
+    'user': {
+        'api_name': 'users',
+        'name': 'username',
+        'ref': '#/components/schemas/UserRepresentation',
+        'result_type': 'USER',
+    },
+}
+
+
+@dataclasses.dataclass
+class BulkImportRecord:
+    resource_type: str
+    data: dict
+
+
+@dataclasses.dataclass
+class BulkImportResult:
+    resource_type: str
+    resource_name: str
+    action: str
+    resource_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+def chunk_records(
+    client: KeycloakClient,
+    records: Iterable[BulkImportRecord],
+    *,
+    max_records: int = 500,
+    max_bytes: int = 4 * 1024 * 1024,
+) -> Iterator[list[tuple[BulkImportRecord, dict]]]:
+    chunk = []
+    chunk_bytes = 0
+
+    for record in records:
+        if not (resource := IMPORT_RESOURCES.get(record.resource_type)):
+            logger.error(t'Unsupported bulk import resource type {record.resource_type}; exiting')
+            raise KeycloakClientError
+
+        payload = client.validate_model(client.load_model(resource['ref']), record.data)
+        if not payload.get(resource['name']):
+            logger.error(t'Bulk import {record.resource_type} record is missing {resource["name"]}; exiting')
+            raise KeycloakClientError
+
+        payload_bytes = len(json.dumps(payload))
+        if chunk and (len(chunk) >= max_records or chunk_bytes + payload_bytes > max_bytes):
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+
+        chunk.append((record, payload))
+        chunk_bytes += payload_bytes
+
+    if chunk:
+        yield chunk
+
+
+def import_chunk(client: KeycloakClient, chunk: list[tuple[BulkImportRecord, dict]], policy: str) -> list[BulkImportResult]:
+    request_data = {'ifResourceExists': IMPORT_POLICIES[policy]}
+    for record, payload in chunk:
+        resource = IMPORT_RESOURCES[record.resource_type]
+
+        # Roles are nested under their container, e.g. {"roles": {"realm": [...]}}
+        resource_data = request_data
+        if container := resource.get('container'):
+            resource_data = request_data.setdefault(resource['api_name'], dict())
+
+        resource_data.setdefault(container or resource['api_name'], []).append(payload)
+
+    try:
+        response = client.action_299(realm=client.realm, **request_data)
+    except (KeycloakClientError, requests.RequestException) as e:
+        return [
+            BulkImportResult(
+                resource_type=record.resource_type,
+                resource_name=payload[IMPORT_RESOURCES[record.resource_type]['name']],
+                action='FAILED',
+                error=type(e).__name__,
+            )
+            for record, payload
+            in chunk
+        ]
+
+    outcomes = {
+        (result.get('resourceType'), result.get('resourceName')): result
+        for result
+        in response.get('results', [])
+    }
+
+    results = []
+    for record, payload in chunk:
+        resource = IMPORT_RESOURCES[record.resource_type]
+        resource_name = payload[resource['name']]
+
+        # Keycloak lowercases usernames, so fall back to the normalized name
+        outcome = outcomes.get((resource['result_type'], resource_name))
+        if outcome is None:
+            outcome = outcomes.get((resource['result_type'], resource_name.lower()))
+
+        if outcome is None:
+            results.append(BulkImportResult(
+                resource_type=record.resource_type,
+                resource_name=resource_name,
+                action='FAILED',
+                error='not reported by server',
+            ))
+            continue
+
+        results.append(BulkImportResult(
+            resource_type=record.resource_type,
+            resource_name=resource_name,
+            action=outcome['action'],
+            resource_id=outcome.get('id'),
+        ))
+
+    return results
+
+
+def record_key(record: BulkImportRecord) -> str:
+    return journal_key('import', record.resource_type, record.data.get(convert_snake_case(IMPORT_RESOURCES[record.resource_type]['name']), ''))
+
+
+def result_key(result: BulkImportResult) -> str:
+    return journal_key('import', result.resource_type, result.resource_name)
+
+
+def journal_records(
+    journal: BulkJournal,
+    records: Iterable[BulkImportRecord],
+    interrupted_keys: set[str],
+    interrupted_records: list[BulkImportRecord],
+) -> Iterator[BulkImportRecord]:
+    for record in records:
+        if record.resource_type not in IMPORT_RESOURCES:
+            yield record
+            continue
+
+        key = record_key(record)
+        if key in interrupted_keys:
+            interrupted_records.append(record)
+        elif not journal.is_completed(key):
+            yield record
+
+
+def import_chunks(
+    client: KeycloakClient,
+    chunks: Iterable[list[tuple[BulkImportRecord, dict]]],
+    policy: str,
+    max_workers: int,
+    journal: Optional[BulkJournal],
+) -> Iterator[BulkImportResult]:
+    def _record_results(results: list[BulkImportResult]) -> list[BulkImportResult]:
+        if journal:
+            journal.complete((result_key(r), dataclasses.asdict(r)) for r in results if r.action != 'FAILED')
+            journal.fail((result_key(r), dataclasses.asdict(r)) for r in results if r.action == 'FAILED')
+
+        return results
+
+    # Keep a bounded number of chunks in flight so arbitrarily long record streams use constant memory
+    with DeadlineExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for chunk in chunks:
+            if len(pending) >= max_workers * 2:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield from _record_results(future.result())
+
+            if journal:
+                journal.begin('import', (record_key(record) for record, _ in chunk))
+
+            pending.add(executor.submit(import_chunk, client, chunk, policy))
+
+        for future in concurrent.futures.as_completed(pending):
+            yield from _record_results(future.result())
+
+
+def bulk_import(
+    client: KeycloakClient,
+    records: Iterable[BulkImportRecord],
+    *,
+    policy: str = 'fail',
+    max_records: int = 500,
+    max_bytes: int = 4 * 1024 * 1024,
+    max_workers: int = 4,
+    journal: Optional[BulkJournal] = None,
+) -> Iterator[BulkImportResult]:
+    if policy not in IMPORT_POLICIES:
+        logger.error(t'Invalid bulk import policy {policy}; exiting')
+        raise KeycloakClientError
+
+    interrupted_keys = journal.keys('pending') if journal else set()
+    interrupted_records = []
+
+    if journal:
+        records = journal_records(journal, records, interrupted_keys, interrupted_records)
+
+    chunks = chunk_records(client, records, max_records=max_records, max_bytes=max_bytes)
+    yield from import_chunks(client, chunks, policy, max_workers, journal)
+
+    if interrupted_records:
+        # These were in flight when the previous run stopped and may already exist, so never fail on them
+        logger.info(t'Retrying {len(interrupted_records)} records interrupted by a previous run')
+
+        chunks = chunk_records(client, interrupted_records, max_records=max_records, max_bytes=max_bytes)
+        yield from import_chunks(client, chunks, 'skip' if policy == 'fail' else policy, max_workers, journal)
@@ -0,0 +1,180 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import argparse
+import logging
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.deadline import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+def add_connection_arguments(parser: argparse.ArgumentParser) -> None:
+    keycloak_connection_group = parser.add_argument_group('keycloak connection')
+    keycloak_connection_group.add_argument('-d', '--domain', help='keycloak domain', required=True)
+    keycloak_connection_group.add_argument('-p', '--port', help='keycloak port', type=int)
+    keycloak_connection_group.add_argument('-r', '--realm', help='keycloak realm', required=True)
+
+    keycloak_connection_group.add_argument('-cid', '--client-id', help='keycloak client id', required=True)
+    keycloak_connection_group.add_argument('-csf', '--client-secret-file', help='keycloak client secret file path', required=True)
+
+    keycloak_connection_group.add_argument('--insecure', help='use HTTP to connect', action="store_true", dest='allow_insecure')
+
+    add_timeout_arguments(keycloak_connection_group)
+
+    # Connect and authenticate in the background while the command is still being loaded
+    parser.set_defaults(prepare_command=prefetch_connection)
+
+def add_timeout_arguments(group: argparse._ArgumentGroup) -> None:
+    group.add_argument('--connect-timeout', help='seconds to wait for a connection', type=float, default=DEFAULT_CONNECT_TIMEOUT)
+    group.add_argument('--read-timeout', help='seconds to wait for a response', type=float, default=DEFAULT_READ_TIMEOUT)
+    group.add_argument('--deadline', help='total seconds the command may spend talking to keycloak', type=float)
+
+def prefetch_connection(args: dict) -> None:
+    # Imported on use so building the parser does not load the whole client stack
+    from freecloak.plugins.keycloak.prefetch import prefetch_session
+
+    prefetch_session(args)
+
+def add_plugin_parser(subparsers: argparse._SubParsersAction) -> None:
+    bulk_import_parser = subparsers.add_parser('bulk-import', description='bulk import users and groups with partialImport')
+    add_connection_arguments(bulk_import_parser)
+
+    bulk_import_group = bulk_import_parser.add_argument_group('bulk import options')
+    bulk_import_group.add_argument('input_file', help='NDJSON file of {"type": ..., "data": ...} records, or - for stdin', metavar='FILE')
+    bulk_import_group.add_argument('--policy', help='behaviour when a resource already exists', choices=['fail', 'overwrite', 'skip'], default='fail')
+    bulk_import_group.add_argument('--chunk-size', help='maximum records per request', type=int, default=500)
+    bulk_import_group.add_argument('--chunk-bytes', help='maximum request body size in bytes', type=int, default=4 * 1024 * 1024)
+    bulk_import_group.add_argument('--workers', help='concurrent requests', type=int, default=4)
+    bulk_import_group.add_argument('--journal', help='journal file used to checkpoint progress', metavar='FILE')
+    bulk_import_group.add_argument('--resume', help='skip records completed in the journal', action='store_true')
+
+    mirror_parser = subparsers.add_parser('mirror', description='snapshot realm users, groups and role mappings into a local database')
+    add_connection_arguments(mirror_parser)
+
+    mirror_group = mirror_parser.add_argument_group('mirror options')
+    mirror_group.add_argument('--database', help='mirror database file', metavar='FILE', required=True)
+    mirror_group.add_argument('--page-size', help='records requested per page', type=int, default=500)
+    mirror_group.add_argument('--workers', help='concurrent requests', type=int, default=8)
+
+    query_parser = subparsers.add_parser('query', description='query users in a local realm mirror')
+
+    query_group = query_parser.add_argument_group('query options')
+    query_group.add_argument('--database', help='mirror database file', metavar='FILE', required=True)
+    query_group.add_argument('--attribute', help='users with an attribute, optionally with a value', metavar='NAME[=VALUE]')
+    query_group.add_argument('--group', help='users in a group or its subgroups', metavar='PATH')
+    query_group.add_argument('--direct', help='only match direct group members', action='store_true')
+    query_group.add_argument('--role', help='users granted a role directly or through a group', metavar='ROLE')
+    query_group.add_argument('--role-client', help='client id owning the role; realm role if omitted', metavar='CLIENT_ID')
+    query_group.add_argument('--sql', help='run a raw SQL query against the mirror instead')
+
+    follow_parser = subparsers.add_parser('follow', description='stream realm changes from admin events as NDJSON')
+    add_connection_arguments(follow_parser)
+
+    follow_group = follow_parser.add_argument_group('follow options')
+    follow_group.add_argument('--checkpoint', help='checkpoint file recording the last emitted event', metavar='FILE', required=True)
+    follow_group.add_argument('--output', help='append change records to a file instead of stdout', metavar='FILE')
+    follow_group.add_argument('--since', help='epoch milliseconds to start from when there is no checkpoint', type=int)
+    follow_group.add_argument('--page-size', help='events requested per page', type=int, default=100)
+    follow_group.add_argument('--min-interval', help='polling interval in seconds while events are arriving', type=float, default=1.0)
+    follow_group.add_argument('--max-interval', help='longest polling interval in seconds while idle', type=float, default=60.0)
+    follow_group.add_argument('--once', help='poll once and exit', action='store_true')
+
+    login_stats_parser = subparsers.add_parser('login-stats', description='summarize login events into time buckets, top failed logins and dormant users')
+    add_connection_arguments(login_stats_parser)
+
+    login_stats_group = login_stats_parser.add_argument_group('login stats options')
+    login_stats_group.add_argument('--output', help='write summary records to a file instead of stdout', metavar='FILE')
+    login_stats_group.add_argument('--since', help='first day to analyze', metavar='YYYY-MM-DD')
+    login_stats_group.add_argument('--until', help='last day to analyze', metavar='YYYY-MM-DD')
+    login_stats_group.add_argument('--event-types', help='only analyze these event types', nargs='+', metavar='TYPE')
+    login_stats_group.add_argument('--bucket', help='bucket width in seconds', type=int, default=3600)
+    login_stats_group.add_argument('--counters', help='users and addresses tracked for failed logins; bounds memory', type=int, default=10000)
+    login_stats_group.add_argument('--top', help='failed login users and addresses reported', type=int, default=20)
+    login_stats_group.add_argument('--spike-factor', help='failed logins over this multiple of the moving average mark a spike', type=float, default=3.0)
+    login_stats_group.add_argument('--dormant-days', help='report users without a login in this many days', type=float)
+    login_stats_group.add_argument('--database', help='file keeping last logins between runs', metavar='FILE')
+    login_stats_group.add_argument('--page-size', help='events requested per page', type=int, default=500)
+
+    reconcile_roles_parser = subparsers.add_parser('reconcile-roles', description='converge user and group role mappings to a desired state')
+    add_connection_arguments(reconcile_roles_parser)
+
+    reconcile_roles_group = reconcile_roles_parser.add_argument_group('reconcile options')
+    reconcile_roles_group.add_argument('spec_file', help='JSON file of desired role mappings for users and groups', metavar='FILE')
+    reconcile_roles_group.add_argument('--workers', help='concurrent requests', type=int, default=8)
+    reconcile_roles_group.add_argument('--dry-run', help='print the planned changes without applying them', action='store_true')
+
+    multi_realm_parser = subparsers.add_parser('multi-realm', description='run an action across many realms concurrently')
+    add_connection_arguments(multi_realm_parser)
+
+    multi_realm_group = multi_realm_parser.add_argument_group('multi-realm options')
+    multi_realm_group.add_argument('action', help='client action to run in every realm, e.g. get_users')
+    multi_realm_group.add_argument('--realms', help='realm names or glob patterns to run in', metavar='REALM', nargs='+', required=True)
+    multi_realm_group.add_argument('--param', help='action parameter; values are parsed as JSON when possible', metavar='NAME=VALUE', action='append', default=[])
+    multi_realm_group.add_argument('--workers', help='realms processed concurrently', type=int, default=8)
+    multi_realm_group.add_argument('--per-realm-auth', help='authenticate against each target realm instead of the connection realm', action='store_true')
+
+    export_parser = subparsers.add_parser('export', description='stream realm roles, clients, groups and users to NDJSON; user group memberships, role mappings and credentials are not included')
+    add_connection_arguments(export_parser)
+
+    export_group = export_parser.add_argument_group('export options')
+    export_group.add_argument('output_file', help='NDJSON file to write, or - for stdout; .gz files are compressed', metavar='FILE')
+    export_group.add_argument('--types', help='resource types to export', nargs='+', choices=['role', 'client', 'group', 'user'], default=['role', 'client', 'group', 'user'])
+    export_group.add_argument('--page-size', help='records requested per page', type=int, default=100)
+    export_group.add_argument('--compress', help='gzip the output', action='store_true')
+
+    import_parser = subparsers.add_parser('import', description='stream an NDJSON export back into a realm with partialImport')
+    add_connection_arguments(import_parser)
+
+    import_group = import_parser.add_argument_group('import options')
+    import_group.add_argument('input_file', help='NDJSON export, optionally gzipped, or - for stdin', metavar='FILE')
+    import_group.add_argument('--policy', help='behaviour when a resource already exists', choices=['fail', 'overwrite', 'skip'], default='fail')
+    import_group.add_argument('--chunk-size', help='maximum records per request', type=int, default=500)
+    import_group.add_argument('--chunk-bytes', help='maximum request body size in bytes', type=int, default=4 * 1024 * 1024)
+    import_group.add_argument('--workers', help='concurrent requests', type=int, default=4)
+    import_group.add_argument('--journal', help='journal file used to checkpoint progress', metavar='FILE')
+    import_group.add_argument('--resume', help='skip records completed in the journal', action='store_true')
+
+    verify_token_parser = subparsers.add_parser('verify-token', description='verify an access token locally against the realm signing keys')
+
+    verify_token_connection_group = verify_token_parser.add_argument_group('keycloak connection')
+    verify_token_connection_group.add_argument('-d', '--domain', help='keycloak domain', required=True)
+    verify_token_connection_group.add_argument('-p', '--port', help='keycloak port', type=int)
+    verify_token_connection_group.add_argument('-r', '--realm', help='keycloak realm that issued the token', required=True)
+    verify_token_connection_group.add_argument('--insecure', help='use HTTP to connect', action="store_true", dest='allow_insecure')
+    add_timeout_arguments(verify_token_connection_group)
+
+    verify_token_group = verify_token_parser.add_argument_group('verify options')
+    verify_token_group.add_argument('token', help='access token, or - to read it from stdin')
+    verify_token_group.add_argument('--audience', help='client the token must be issued for')
+    verify_token_group.add_argument('--jwks-cache', help='file caching the realm signing keys between runs', metavar='FILE')
+    verify_token_group.add_argument('--leeway', help='clock skew allowed in seconds', type=float, default=30.0)
+    verify_token_group.add_argument('--token-type', help='typ claim the token must carry', default='Bearer')
+
+    snapshot_parser = subparsers.add_parser('snapshot', description='record a hash tree of the realm configuration and report drift against an earlier one')
+    add_connection_arguments(snapshot_parser)
+
+    snapshot_group = snapshot_parser.add_argument_group('snapshot options')
+    snapshot_group.add_argument('snapshot_file', help='snapshot file to compare against and update', metavar='FILE')
+    snapshot_group.add_argument('--compare-only', help='report drift without updating the snapshot file', action='store_true')
+    snapshot_group.add_argument('--depth', help='levels of the realm document hashed individually', type=int, default=3)
+    snapshot_group.add_argument('--no-clients', help='leave clients out of the export', action='store_false', dest='export_clients')
+    snapshot_group.add_argument('--no-groups-and-roles', help='leave groups and roles out of the export', action='store_false', dest='export_groups_and_roles')
@@ -16,19 +16,32 @@
 ##############################################################################
 
 
+import contextlib
 import datetime
+import functools
 from importlib.resources import files
 import itertools
 import json
 import logging
-from typing import Any, Callable, Iterable, Self
+import threading
+from typing import Any, Callable, Iterable, Iterator, Self, TYPE_CHECKING
 
+import requests
 import requests_toolbelt.sessions
 
 from freecloak.plugins.logging import TemplateStringAdapter
 
 from freecloak.plugins.keycloak.auth import KeycloakAuth
+from freecloak.plugins.keycloak.buffer import BUFFERED_ACTIONS, UpdateBuffer
+from freecloak.plugins.keycloak.codec import decode_json, encode_json, JSON_LIBRARY
+from freecloak.plugins.keycloak.deadline import deadline, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, request_timeout
 from freecloak.plugins.keycloak.exceptions import *
+from freecloak.plugins.keycloak.registry import SESSION_REGISTRY
+from freecloak.plugins.keycloak.resolver import KeycloakResolver, RESOLVED_PATH_PARAMETERS
+from freecloak.plugins.keycloak.views import view_model
+
+if TYPE_CHECKING:
+    from freecloak.plugins.keycloak.parallel import ModelProcessPool
 
 
 logger = TemplateStringAdapter(logging.getLogger(__name__))
@@ -43,6 +56,35 @@ MODEL_DATA_TYPES = {
     'string': str,
 }
 
+# Fields returned by the server when briefRepresentation is requested, keyed by response model reference
+BRIEF_REPRESENTATION_FIELDS = {
+    '#/components/schemas/GroupRepresentation': {'id', 'name', 'path', 'parentId', 'subGroupCount'},
+    '#/components/schemas/RealmRepresentation': {'id', 'realm', 'displayName', 'displayNameHtml'},
+    '#/components/schemas/RoleRepresentation': {'id', 'name', 'description', 'composite', 'clientRole', 'containerId'},
+    '#/components/schemas/UserRepresentation': {
+        'id',
+        'username',
+        'firstName',
+        'lastName',
+        'email',
+        'emailVerified',
+        'enabled',
+        'createdTimestamp',
+        'federationLink',
+    },
+}
+
+RESULT_MODES = [
+    'convert',
+    'view',
+]
+
+# Connect and read timeouts for actions that routinely outlast the defaults
+ACTION_TIMEOUTS = {
+    'action_298': (DEFAULT_CONNECT_TIMEOUT, 300.0),
+    'action_299': (DEFAULT_CONNECT_TIMEOUT, 300.0),
+}
+
 
 class KeycloakSession:
     __slots__ = [
@@ -50,7 +92,11 @@ class KeycloakSession:
         'realm',
         'client_id',
         'client_secret',
+        'lock',
+        'openid_configuration',
+        'registry_key',
         'session',
+        'timeout',
     ]
 
     def __init__(
@@ -64,19 +110,15 @@ class KeycloakSession:
         client_secret_file: Optional[str] = None,
         session: Optional[requests_toolbelt.sessions.BaseUrlSession] = None,
         allow_insecure: Optional[bool] = None,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
         **_,
     ):
-        schema = 'https'
-        if allow_insecure:
-            logger.warning('You are connecting to Keycloak using an insecure connection!')
-            schema = 'http'
-
-        if port is not None:
-            if port == 0 or port > 65535:
-                logger.error('Invalid port number specified; exiting')
-                raise KeycloakClientError
-
-        self.base_url = f'{schema}://{domain}{f':{port}' if port else ''}/'
+        self.base_url = keycloak_base_url(domain, port, allow_insecure)
+        self.timeout = (connect_timeout, read_timeout)
+        self.lock = threading.Lock()
+        self.openid_configuration = None
+        self.registry_key = None
         self.realm = realm
         self.client_id = client_id
 
@@ -96,84 +138,196 @@ class KeycloakSession:
         self.session = session
 
     def __enter__(self):
-        if not self.session:
-            self.create_session()
+        self.acquire()
 
         return self.session
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.session.close()
-        self.session = None
+        self.release()
 
     def __get__(self, instance: KeycloakClient, owner=None):
-        if not self.session:
-            self.create_session()
+        self.acquire()
 
         return self.session
 
     def __set__(self, instance: KeycloakClient, value: Optional[KeycloakSession]):
         if not value and self.session:
-            self.session.close()
-            self.session = None
+            self.release()
             return
 
         self.base_url = value.base_url
         self.realm = value.realm
         self.client_id = value.client_id
         self.client_secret = value.client_secret
+        self.openid_configuration = value.openid_configuration
         self.session = value.session
+        self.timeout = value.timeout
 
     def __getattr__(self, item):
         if item == 'close':
-            close_func = self.session.close
-            self.session = None
-            return close_func
+            return self.release
 
-        if not self.session:
-            self.create_session()
+        self.acquire()
 
         return getattr(self.session, item)
 
+    def request(self, method: str, url: str, *, json: Any = None, timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT), **kwargs) -> requests.Response:
+        self.acquire()
+
+        # Bodies are encoded here rather than by requests so every payload goes through the same codec
+        if json is not None:
+            kwargs['data'] = encode_json(json)
+            kwargs['headers'] = {'Content-Type': 'application/json'} | kwargs.get('headers', dict())
+
+        try:
+            return self.session.request(method, url, timeout=request_timeout(*timeout), **kwargs)
+        except requests.Timeout:
+            logger.error(t'Keycloak did not answer {method} {url} in time; exiting')
+            raise KeycloakClientTimeoutError
+
+    @staticmethod
+    def decode(response: requests.Response) -> Any:
+        if not response.content:
+            return None
+
+        return decode_json(response.content)
+
+    def discover(self) -> dict:
+        # Sessions handed in from elsewhere skipped discovery, so fetch the document on first use
+        self.acquire()
+
+        if self.openid_configuration is None:
+            self.openid_configuration = self.session.get(f'realms/{self.realm}/.well-known/openid-configuration', timeout=request_timeout(*self.timeout)).json()
+
+        return self.openid_configuration
+
+    def acquire(self) -> None:
+        if self.session:
+            return
+
+        # Sessions are borrowed from the process-wide registry so clients of the same server share connections and tokens
+        with self.lock:
+            if self.session:
+                return
+
+            entry = SESSION_REGISTRY.acquire(self)
+            self.registry_key = SESSION_REGISTRY.session_key(self)
+            self.openid_configuration = entry.openid_configuration
+            self.session = entry.session
+
+    def release(self) -> None:
+        with self.lock:
+            if self.registry_key is not None:
+                SESSION_REGISTRY.release(self.registry_key)
+                self.registry_key = None
+
+            self.session = None
+
     def create_session(self):
         logger.debug('Creating new Keycloak session')
 
-        self.session = requests_toolbelt.sessions.BaseUrlSession(self.base_url)
-        openid_configuration = self.session.get(f'realms/{self.realm}/.well-known/openid-configuration').json()
-        token_endpoint = openid_configuration['token_endpoint']
+        # Warned once per connection rather than per client, as clients may be built before anything connects
+        if self.base_url.startswith('http://'):
+            logger.warning('You are connecting to Keycloak using an insecure connection!')
+
+        # Only publish the session once it is authenticated so concurrent callers never see a half-built one
+        session = requests_toolbelt.sessions.BaseUrlSession(self.base_url)
+        session.headers['Accept'] = 'application/json'
+
+        try:
+            self.openid_configuration = session.get(f'realms/{self.realm}/.well-known/openid-configuration', timeout=request_timeout(*self.timeout)).json()
+            token_endpoint = self.openid_configuration['token_endpoint']
 
-        self.session.auth = KeycloakAuth(self.client_id, self.client_secret, token_endpoint)
+            session.auth = KeycloakAuth(self.client_id, self.client_secret, token_endpoint, self.timeout)
+
+            # Fetch the first token while the registry entry is still locked so borrowers never race for it
+            session.auth.token
+        except requests.Timeout:
+            logger.error('Keycloak discovery or authentication timed out; exiting')
+            raise KeycloakClientTimeoutError
+
+        self.session = session
 
-        logger.debug('Keycloak session created')
+        logger.debug(t'Keycloak session created; using {JSON_LIBRARY} for JSON')
 
 
 class KeycloakClient:
     __slots__ = [
         'action_map',
+        'deadline',
+        'exit_stack',
         'model',
+        'models',
+        'process_pool',
         'realm',
+        'resolver',
+        'result_mode',
         'session',
+        'timeouts',
+        'update_buffer',
     ]
 
     action_map: dict
+    deadline: Optional[float]
+    exit_stack: contextlib.ExitStack
     model: dict
+    models: dict[str, dict]
+    process_pool: Optional[ModelProcessPool]
     realm: str
+    resolver: KeycloakResolver
+    result_mode: str
     session: KeycloakSession
+    timeouts: dict[str, tuple[float, float]]
+    update_buffer: Optional[UpdateBuffer]
+
+    def __init__(
+        self,
+        realm: str,
+        result_mode: str = 'convert',
+        *,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: float = DEFAULT_READ_TIMEOUT,
+        action_timeouts: Optional[dict[str, tuple[float, float]]] = None,
+        deadline: Optional[float] = None,
+        **kwargs
+    ):
+        if result_mode not in RESULT_MODES:
+            logger.error(t'Invalid result mode {result_mode}; exiting')
+            raise KeycloakClientError
 
-    def __init__(self, realm: str, **kwargs):
-        data_files = files('freecloak.plugins.keycloak.data')
-        self.action_map = json.loads(data_files.joinpath('action_map.json').read_text('utf-8'))
-        self.model = json.loads(data_files.joinpath('keycloak-openapi-1.0.json').read_text('utf-8'))
+        self.action_map, self.model, self.models = load_specification()
+        self.deadline = deadline
+        self.exit_stack = contextlib.ExitStack()
+        self.process_pool = None
+        self.timeouts = {'': (connect_timeout, read_timeout)} | ACTION_TIMEOUTS | (action_timeouts or dict())
+        self.update_buffer = None
 
         self.realm = realm
-        self.session = KeycloakSession(realm=realm, **kwargs)
+        self.resolver = KeycloakResolver(self)
+        self.result_mode = result_mode
+        self.session = KeycloakSession(realm=realm, connect_timeout=connect_timeout, read_timeout=read_timeout, **kwargs)
 
     def __enter__(self) -> Self:
+        # Everything done with the client, including work fanned out to other threads, shares one time budget
+        self.exit_stack.enter_context(deadline(self.deadline))
+
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.session = None
+        self.exit_stack.close()
+        self.session.release()
 
     def __getattr__(self, item) -> Callable:
+        # While buffering, partial updates are merged per resource and written later
+        if self.update_buffer is not None and BUFFERED_ACTIONS.get(item, (None, None))[1] == 'update':
+            return functools.partial(self.update_buffer.update, item)
+
+        return self.api_callable(item)
+
+    def buffered(self, **kwargs) -> UpdateBuffer:
+        return UpdateBuffer(self, **kwargs)
+
+    def api_callable(self, item: str) -> Callable:
         try:
             action = self.action_map[item]
         except KeyError:
@@ -186,9 +340,20 @@ class KeycloakClient:
         path_method_info = self.model['paths'][path][method]
 
         request_model = dict()
+        request_reference = None
+        request_array = False
         if path_method_info.get('requestBody'):
-            reference = path_method_info['requestBody']['content']['application/json']['schema']['$ref']
-            request_model = self.load_model(reference)
+            request_schema = path_method_info['requestBody']['content']['application/json']['schema']
+            if reference := request_schema.get('$ref'):
+                request_model = self.load_model(reference)
+            elif request_schema.get('type') == 'array' and (item_reference := request_schema['items'].get('$ref')):
+                # Array bodies (e.g. role mappings) are passed positionally as a list of models
+                request_model = self.load_model(item_reference)
+                request_reference = item_reference
+                request_array = True
+            else:
+                # Untyped request bodies (e.g. partialImport) are sent as given
+                request_model = None
 
         response_model = {
             'type': 'object'
@@ -216,7 +381,7 @@ class KeycloakClient:
                 'type': MODEL_DATA_TYPES[param['schema']['type']],
             }
             for param
-            in path_method_info['parameters']
+            in path_method_info.get('parameters', [])
         }
 
         if self.model['paths'][path].get('parameters'):
@@ -231,10 +396,18 @@ class KeycloakClient:
                 in self.model['paths'][path]['parameters']
             })
 
-        def _api_callable(**kwargs) -> dict | list:
+        def _api_callable(payload: Optional[list[dict]] = None, /, **kwargs) -> dict | list:
             if not kwargs:
                 kwargs = {}
 
+            timeout = kwargs.pop('timeout', self.timeouts.get(item, self.timeouts['']))
+            raw = kwargs.pop('raw', False)
+
+            fields = None
+            if 'fields' not in params and (fields := kwargs.pop('fields', None)) is not None:
+                fields = list(fields)
+                self.prepare_projection(method, params, response_model, fields, kwargs)
+
             param_groups = {
                 'query': dict(),
                 'path': dict(),
@@ -242,11 +415,11 @@ class KeycloakClient:
             for param_name, param_data in params.items():
                 param_val = kwargs.pop(param_name, None)
 
-                if param_data['required'] and not param_val:
+                if param_data['required'] and param_val is None:
                     logger.error(t'Required parameter {param_name} not found; exiting')
                     raise KeycloakClientError
 
-                if param_val:
+                if param_val is not None:
                     if not isinstance(param_val, param_data['type']):
                         logger.error(t'Parameter {param_name} expects type {param_data['type']}, not {type(param_val)}; exiting')
                         raise KeycloakClientError
@@ -260,17 +433,66 @@ class KeycloakClient:
             if query_params := param_groups['query']:
                 request_kwargs['params'] = query_params
 
-            if method in ['post', 'put']:
-                kwargs = self.validate_model(request_model, kwargs)
-                request_kwargs['data'] = kwargs
+            if request_array:
+                if payload is None:
+                    logger.error('This action requires a list of models; exiting')
+                    raise KeycloakClientError
+
+                if self.process_pool is not None:
+                    request_kwargs['json'] = self.process_pool.validate(request_reference, list(payload))
+                else:
+                    request_kwargs['json'] = [self.validate_model(request_model, item) for item in payload]
+            elif method in ['post', 'put']:
+                if request_model is not None:
+                    kwargs = self.validate_model(request_model, kwargs)
+
+                request_kwargs['json'] = kwargs
+
+            if self.update_buffer is not None:
+                self.update_buffer.before_request(item, param_groups['path'])
+
+            response = self.session.request(method.upper(), timeout=timeout, **request_kwargs)
 
-            response = self.session.request(method.upper(), **request_kwargs)
-            response_description = path_method_info['responses'][str(response.status_code)]['description']
+            # Renamed or deleted resources must not resolve to their old identifiers
+            if response.ok and method in ['delete', 'put'] and (resource_param := path.rsplit('/', 1)[-1]) in RESOLVED_PATH_PARAMETERS:
+                self.resolver.invalidate(param_groups['path'][resource_param.strip('{}')])
+
+            if response.ok and method == 'delete' and self.update_buffer is not None:
+                self.update_buffer.observe(item, param_groups['path'])
 
             match response.status_code:
                 case 200:
-                    return self.convert_model(response_model, response.json())
+                    response_data = self.session.decode(response)
+
+                    # Some servers answer with an empty 200 where a 204 is documented
+                    if response_data is None:
+                        return {'return': True}
+
+                    # Raw results keep the server's field names and skip model conversion entirely
+                    if raw:
+                        return response_data
+
+                    if fields is not None:
+                        return self.project_model(response_model, response_data, fields)
+
+                    if self.result_mode == 'view':
+                        return view_model(self, response_model, response_data)
+
+                    if self.process_pool is not None and response_model.get('item_type') == 'reference':
+                        return self.process_pool.convert(response_model['item_ref'], response_data)
+
+                    response_data = self.convert_model(response_model, response_data)
+
+                    # Reads tell the update buffer which pending changes would be no-ops
+                    if self.update_buffer is not None:
+                        self.update_buffer.observe(item, param_groups['path'], response_data)
+
+                    return response_data
                 case 201:
+                    # Creation responses carry the new resource's location rather than a body
+                    if location := response.headers.get('Location'):
+                        return {'return': True, 'id': location.rstrip('/').rsplit('/', 1)[-1]}
+
                     return {'return': True}
                 case 204:
                     return {'return': True}
@@ -290,23 +512,72 @@ class KeycloakClient:
                     logger.error('Internal Server Error; exiting')
                     raise KeycloakClientServerError
                 case _:
+                    # Status codes the specification does not document have no description
+                    response_description = path_method_info['responses'].get(str(response.status_code), {}).get('description', response.status_code)
                     logger.error(t'Unexpected response from Keycloak server: {response_description}; exiting')
                     raise KeycloakClientError
 
         return _api_callable
 
-    def load_model(self, ref: str) -> dict:
-        position = self.model
-        model_path = ref.split('/')[1:]
-        for path in model_path:
-            position = position.get(path)
+    def paginate(self, action: str, *, page_size: int = 100, **kwargs) -> Iterator[Any]:
+        api_callable = getattr(self, action)
 
-            if not position:
-                logger.error(t'Model could not be found at reference {ref}; exiting')
+        first = kwargs.pop('first', 0)
+        while True:
+            page = api_callable(first=first, max=page_size, **kwargs)
+            yield from page
+
+            if len(page) < page_size:
+                return
+
+            first += page_size
+
+    def prepare_projection(self, method: str, params: dict, response_model: dict, fields: list[str], kwargs: dict) -> None:
+        if method != 'get':
+            logger.error('Field projection is only supported on read actions; exiting')
+            raise KeycloakClientError
+
+        if not (response_ref := response_model.get('item_ref', response_model.get('ref'))):
+            logger.error('This action does not return a model that supports field projection; exiting')
+            raise KeycloakClientError
+
+        data_model = self.load_model(response_ref)
+        for field in fields:
+            if field not in data_model:
+                logger.error(t'Invalid field {field}; exiting')
                 raise KeycloakClientError
 
+        if 'brief_representation' in params and kwargs.get('brief_representation') is None:
+            if (brief_fields := BRIEF_REPRESENTATION_FIELDS.get(response_ref)) is not None:
+                kwargs['brief_representation'] = all(data_model[field]['api_name'] in brief_fields for field in fields)
+
+    def project_model(self, model: dict, data: Any, fields: list[str]) -> Any:
+        match model['type']:
+            case 'array':
+                match model['item_type']:
+                    case 'reference':
+                        return [self.project_model({'type': 'reference', 'ref': model['item_ref']}, i, fields) for i in data]
+                    case _:
+                        return data
+            case 'reference':
+                data_model = self.load_model(model['ref'])
+
+                projected_data = dict()
+                for key in fields:
+                    key_model = data_model[key]
+                    if (key_data := data.get(key_model['api_name'])) is not None:
+                        projected_data[key] = self.convert_model(key_model, key_data)
+
+                return projected_data
+            case _:
+                return data
+
+    def load_model(self, ref: str) -> dict:
+        if (model := self.models.get(ref)) is not None:
+            return model
+
         model = dict()
-        for name, metadata in position['properties'].items():
+        for name, metadata in self.find_schema(ref).get('properties', {}).items():
             program_name = convert_snake_case(name)
 
             model_data = {'api_name': name}
@@ -318,11 +589,17 @@ class KeycloakClient:
                     if item_data_type := metadata['items'].get('type'):
                         model_data['item_type'] = item_data_type
                     elif item_ref := metadata['items'].get('$ref'):
-                        model_data['item_type'] = 'reference'
-                        model_data['item_ref'] = item_ref
-            elif ref := metadata.get('$ref'):
-                model_data['type'] = 'reference'
-                model_data['ref'] = ref
+                        if opaque_type := self.opaque_type(item_ref):
+                            model_data['item_type'] = opaque_type
+                        else:
+                            model_data['item_type'] = 'reference'
+                            model_data['item_ref'] = item_ref
+            elif property_ref := metadata.get('$ref'):
+                if opaque_type := self.opaque_type(property_ref):
+                    model_data['type'] = opaque_type
+                else:
+                    model_data['type'] = 'reference'
+                    model_data['ref'] = property_ref
 
             if data_format := metadata.get('format'):
                 model_data['format'] = data_format
@@ -335,8 +612,30 @@ class KeycloakClient:
 
             model[program_name] = model_data
 
+        self.models[ref] = model
+
         return model
 
+    def find_schema(self, ref: str) -> dict:
+        position = self.model
+        model_path = ref.split('/')[1:]
+        for path in model_path:
+            position = position.get(path)
+
+            if not position:
+                logger.error(t'Model could not be found at reference {ref}; exiting')
+                raise KeycloakClientError
+
+        return position
+
+    def opaque_type(self, ref: str) -> Optional[str]:
+        # Enums and free-form maps have no properties to rename or validate, so they are treated as their plain type
+        schema = self.find_schema(ref)
+        if 'properties' in schema:
+            return None
+
+        return schema.get('type', 'object')
+
     def convert_model(self, model: dict, data: Any) -> Any:
         match model['type']:
             case 'array':
@@ -349,7 +648,7 @@ class KeycloakClient:
                 data_model = self.load_model(model['ref'])
 
                 for key, key_model in data_model.items():
-                    if key_data := data.pop(key_model['api_name'], None):
+                    if (key_data := data.pop(key_model['api_name'], None)) is not None:
                         key_data = self.convert_model(key_model, key_data)
                         data[key] = key_data
 
@@ -366,7 +665,7 @@ class KeycloakClient:
 
             key_data = model[key]
 
-            if key_data['read_only']:
+            if key_data.get('read_only'):
                 logger.error(t'Parameter {key} is read only; exiting')
                 raise KeycloakClientError
 
@@ -396,7 +695,7 @@ class KeycloakClient:
                                     logger.error(t'Parameter {key} expects array elements to be type {key_data_item_type}; exiting')
                                     raise KeycloakClientError
 
-                    if key_data['unique_items'] and len(value) > len(set(value)):
+                    if key_data.get('unique_items') and len(value) > len(set(value)):
                         logger.error(t'Parameter {key} must have unique items; exiting')
                         raise KeycloakClientError
                 case 'reference':
@@ -412,6 +711,25 @@ class KeycloakClient:
         return validated_data
 
 
+def keycloak_base_url(domain: str, port: Optional[int] = None, allow_insecure: Optional[bool] = None) -> str:
+    schema = 'http' if allow_insecure else 'https'
+
+    if port is not None:
+        if port == 0 or port > 65535:
+            logger.error('Invalid port number specified; exiting')
+            raise KeycloakClientError
+
+    return f'{schema}://{domain}{f':{port}' if port else ''}/'
+
+@functools.cache
+def load_specification() -> tuple[dict, dict, dict[str, dict]]:
+    # Parsed once per process and shared by every client, along with the resolved model cache
+    data_files = files('freecloak.plugins.keycloak.data')
+    action_map = json.loads(data_files.joinpath('action_map.json').read_text('utf-8'))
+    model = json.loads(data_files.joinpath('keycloak-openapi-1.0.json').read_text('utf-8'))
+
+    return action_map, model, dict()
+
 def convert_snake_case(string: str) -> str:
     caps_indices = sorted(
         list(filter(lambda x: x is not None, map(lambda x: x[0] if x[1].isupper() else None, enumerate(string)))))
@@ -425,7 +743,7 @@ def convert_snake_case(string: str) -> str:
         if start != end and end + 1 != len(string):
             caps_split_indices.append(end)
 
-    caps_split_indices = list(set(caps_split_indices))
+    caps_split_indices = sorted(set(caps_split_indices))
     parts = [string[i:j] for i, j in zip(caps_split_indices, caps_split_indices[1:] + [None])]
     snake_case_string = '_'.join(parts).lower().replace('-', '_')
     return snake_case_string
@@ -0,0 +1,41 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+JSON_LIBRARY = 'orjson' if orjson is not None else 'json'
+
+
+def encode_json(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+def decode_json(data: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
@@ -0,0 +1,453 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import contextlib
+import dataclasses
+import json
+import logging
+import sqlite3
+import sys
+import tempfile
+from typing import Optional
+
+import requests
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak import bulk, transfer
+from freecloak.plugins.keycloak.analytics import DormantUser, EventBucket, LoginEventAnalyzer
+from freecloak.plugins.keycloak.client import keycloak_base_url, KeycloakClient
+from freecloak.plugins.keycloak.deadline import deadline, DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, request_timeout
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError, KeycloakTokenError
+from freecloak.plugins.keycloak.follower import AdminEventFollower, ChangeRecord
+from freecloak.plugins.keycloak.journal import BulkJournal
+from freecloak.plugins.keycloak.mirror import RealmMirror
+from freecloak.plugins.keycloak.realms import MultiRealmExecutor
+from freecloak.plugins.keycloak.roles import RoleMappingReconciler, parse_role_mapping_spec
+from freecloak.plugins.keycloak.snapshot import compare_snapshots, load_snapshot, save_snapshot, take_snapshot
+from freecloak.plugins.keycloak.tokens import create_verifier
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+def bulk_import(
+    realm: str,
+    input_file: str,
+    policy: str,
+    chunk_size: int,
+    chunk_bytes: int,
+    workers: int,
+    journal: Optional[str] = None,
+    resume: bool = False,
+    **kwargs
+) -> int:
+    if resume and not journal:
+        logger.error('Resuming a bulk import requires a journal; exiting')
+        return 2
+
+    failed = 0
+
+    try:
+        with (
+            KeycloakClient(realm=realm, **kwargs) as client,
+            transfer.open_import(input_file) as f,
+            (BulkJournal(journal, resume=resume) if journal else contextlib.nullcontext()) as bulk_journal,
+        ):
+            for result in bulk.bulk_import(
+                client,
+                transfer.read_records(f),
+                policy=policy,
+                max_records=chunk_size,
+                max_bytes=chunk_bytes,
+                max_workers=workers,
+                journal=bulk_journal,
+            ):
+                if result.action == 'FAILED':
+                    failed += 1
+
+                print(json.dumps(dataclasses.asdict(result)))
+    except FileNotFoundError:
+        logger.error(t'Input file {input_file} not found; exiting')
+        return 1
+    except KeycloakClientError:
+        return 1
+
+    if failed:
+        logger.error(t'{failed} records failed to import')
+        return 1
+
+    return 0
+
+
+def mirror(
+    realm: str,
+    database: str,
+    page_size: int,
+    workers: int,
+    **kwargs
+) -> int:
+    try:
+        with KeycloakClient(realm=realm, **kwargs) as client, RealmMirror(database) as realm_mirror:
+            counts = realm_mirror.snapshot(client, page_size=page_size, max_workers=workers)
+    except KeycloakClientError:
+        return 1
+
+    for table, count in counts.items():
+        print(f'{table:<15} {count}')
+
+    return 0
+
+
+def query(
+    database: str,
+    attribute: Optional[str] = None,
+    group: Optional[str] = None,
+    direct: bool = False,
+    role: Optional[str] = None,
+    role_client: Optional[str] = None,
+    sql: Optional[str] = None,
+    **_
+) -> int:
+    attribute_value = None
+    if attribute and '=' in attribute:
+        attribute, attribute_value = attribute.split('=', 1)
+
+    try:
+        with RealmMirror(database) as realm_mirror:
+            if sql:
+                rows = realm_mirror.query(sql)
+            else:
+                rows = realm_mirror.find_users(
+                    attribute=attribute,
+                    attribute_value=attribute_value,
+                    group=group,
+                    role=role,
+                    role_client=role_client,
+                    recursive=not direct,
+                )
+    except KeycloakClientError:
+        return 1
+    except sqlite3.Error as e:
+        logger.error(t'Query failed: {e}; exiting')
+        return 1
+
+    for row in rows:
+        print(json.dumps(dict(row)))
+
+    return 0
+
+
+def follow(
+    realm: str,
+    checkpoint: str,
+    output: Optional[str] = None,
+    since: Optional[int] = None,
+    page_size: int = 100,
+    min_interval: float = 1.0,
+    max_interval: float = 60.0,
+    once: bool = False,
+    **kwargs
+) -> int:
+    try:
+        with KeycloakClient(realm=realm, **kwargs) as client, (open(output, 'a') if output else contextlib.nullcontext(sys.stdout)) as f:
+            def _write_change(record: ChangeRecord) -> None:
+                f.write(json.dumps(dataclasses.asdict(record)) + '\n')
+                f.flush()
+
+            follower = AdminEventFollower(
+                client,
+                checkpoint,
+                _write_change,
+                since=since,
+                page_size=page_size,
+                min_interval=min_interval,
+                max_interval=max_interval,
+            )
+
+            if once:
+                follower.poll()
+            else:
+                follower.follow()
+    except KeyboardInterrupt:
+        return 0
+    except KeycloakClientError:
+        return 1
+
+    return 0
+
+
+def login_stats(
+    realm: str,
+    output: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    event_types: Optional[list[str]] = None,
+    bucket: int = 3600,
+    counters: int = 10000,
+    top: int = 20,
+    spike_factor: float = 3.0,
+    dormant_days: Optional[float] = None,
+    database: Optional[str] = None,
+    page_size: int = 500,
+    **kwargs
+) -> int:
+    try:
+        with (
+            KeycloakClient(realm=realm, **kwargs) as client,
+            (open(output, 'w') if output else contextlib.nullcontext(sys.stdout)) as f,
+            tempfile.TemporaryDirectory() as temporary_directory,
+        ):
+            def _write_record(record) -> None:
+                match record:
+                    case EventBucket():
+                        record_type = 'bucket'
+                    case DormantUser():
+                        record_type = 'dormant_user'
+                    case _:
+                        record_type = 'failed_logins'
+
+                f.write(json.dumps({'record': record_type} | dataclasses.asdict(record)) + '\n')
+                f.flush()
+
+            # Last logins are kept on disk rather than in memory, in a throwaway database unless one is named
+            last_logins = sqlite3.connect(database or f'{temporary_directory}/last_logins.db')
+            try:
+                analyzer = LoginEventAnalyzer(
+                    client,
+                    _write_record,
+                    last_logins=last_logins,
+                    bucket_size=bucket,
+                    capacity=counters,
+                    page_size=page_size,
+                    spike_factor=spike_factor,
+                )
+
+                analyzed = analyzer.analyze(date_from=since, date_to=until, types=event_types)
+                logger.info(t'Analyzed {analyzed} events')
+
+                for hitter in analyzer.heavy_hitters(top):
+                    _write_record(hitter)
+
+                if dormant_days is not None:
+                    for dormant_user in analyzer.dormant_users(dormant_days):
+                        _write_record(dormant_user)
+            finally:
+                last_logins.close()
+    except OSError as e:
+        logger.error(t'Could not write login stats ({e}); exiting')
+        return 1
+    except KeycloakClientError:
+        return 1
+
+    return 0
+
+
+def reconcile_roles(
+    realm: str,
+    spec_file: str,
+    workers: int,
+    dry_run: bool = False,
+    **kwargs
+) -> int:
+    try:
+        with open(spec_file) as f:
+            desired = parse_role_mapping_spec(json.load(f))
+    except (OSError, ValueError):
+        logger.error(t'Could not read role mapping spec {spec_file}; exiting')
+        return 1
+
+    try:
+        with KeycloakClient(realm=realm, **kwargs) as client:
+            changes = RoleMappingReconciler(client, max_workers=workers).reconcile(desired, dry_run=dry_run)
+    except KeycloakClientError:
+        return 1
+
+    failed = 0
+    for change in changes:
+        if change.error:
+            failed += 1
+
+        print(json.dumps({
+            'principal_type': change.principal_type,
+            'principal_id': change.principal_id,
+            'container': change.container,
+            'added': change.added,
+            'removed': change.removed,
+            'error': change.error,
+        }))
+
+    return 1 if failed else 0
+
+
+def multi_realm(
+    realm: str,
+    action: str,
+    realms: list[str],
+    param: list[str],
+    workers: int,
+    per_realm_auth: bool = False,
+    **kwargs
+) -> int:
+    params = dict()
+    for parameter in param:
+        if '=' not in parameter:
+            logger.error(t'Invalid action parameter {parameter}; exiting')
+            return 2
+
+        name, value = parameter.split('=', 1)
+        try:
+            params[name] = json.loads(value)
+        except ValueError:
+            params[name] = value
+
+    failed = 0
+
+    try:
+        with MultiRealmExecutor(realm, max_workers=workers, per_realm_auth=per_realm_auth, **kwargs) as executor:
+            for result in executor.run_action(realms, action, **params):
+                if result.error:
+                    failed += 1
+
+                print(json.dumps(dataclasses.asdict(result), default=str))
+    except KeycloakClientError:
+        return 1
+
+    return 1 if failed else 0
+
+
+def export(
+    realm: str,
+    output_file: str,
+    types: list[str],
+    page_size: int,
+    compress: bool = False,
+    **kwargs
+) -> int:
+    try:
+        with KeycloakClient(realm=realm, **kwargs) as client, transfer.open_export(output_file, compress) as f:
+            counts = transfer.write_records(transfer.export_records(client, types, page_size=page_size), f)
+    except OSError as e:
+        logger.error(t'Could not write export {output_file} ({e}); exiting')
+        return 1
+    except KeycloakClientError:
+        return 1
+
+    for resource_type, count in counts.items():
+        logger.info(t'Exported {count} {resource_type} records')
+
+    return 0
+
+
+def import_(**kwargs) -> int:
+    return bulk_import(**kwargs)
+
+
+def verify_token(
+    domain: str,
+    realm: str,
+    token: str,
+    port: Optional[int] = None,
+    allow_insecure: bool = False,
+    audience: Optional[str] = None,
+    jwks_cache: Optional[str] = None,
+    leeway: float = 30.0,
+    token_type: Optional[str] = 'Bearer',
+    connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+    read_timeout: float = DEFAULT_READ_TIMEOUT,
+    **kwargs
+) -> int:
+    if token == '-':
+        token = sys.stdin.read()
+
+    if allow_insecure:
+        logger.warning('You are connecting to Keycloak using an insecure connection!')
+
+    with deadline(kwargs.get('deadline')):
+        try:
+            base_url = keycloak_base_url(domain, port, allow_insecure)
+            openid_configuration = requests.get(
+                f'{base_url}realms/{realm}/.well-known/openid-configuration',
+                timeout=request_timeout(connect_timeout, read_timeout),
+            ).json()
+        except KeycloakClientError:
+            return 1
+        except (requests.RequestException, ValueError) as e:
+            logger.error(t'Could not fetch the OpenID configuration for realm {realm} ({e}); exiting')
+            return 1
+
+        verifier = create_verifier(
+            openid_configuration,
+            audience=audience,
+            cache_path=jwks_cache,
+            leeway=leeway,
+            token_type=token_type,
+            timeout=(connect_timeout, read_timeout),
+        )
+
+        try:
+            claims = verifier.verify(token)
+        except KeycloakTokenError as e:
+            logger.error(t'Token is not valid: {e}')
+            return 1
+        except KeycloakClientError:
+            return 1
+
+    print(json.dumps(claims))
+    return 0
+
+
+def snapshot(
+    realm: str,
+    snapshot_file: str,
+    depth: int,
+    compare_only: bool = False,
+    export_clients: bool = True,
+    export_groups_and_roles: bool = True,
+    **kwargs
+) -> int:
+    try:
+        previous = load_snapshot(snapshot_file)
+
+        with KeycloakClient(realm=realm, **kwargs) as client:
+            current = take_snapshot(
+                client,
+                export_clients=export_clients,
+                export_groups_and_roles=export_groups_and_roles,
+                max_depth=depth,
+            )
+    except KeycloakClientError:
+        return 1
+
+    changes = compare_snapshots(previous, current) if previous else []
+    for change in changes:
+        print(json.dumps(dataclasses.asdict(change)))
+
+    if previous is None:
+        logger.info(t'No snapshot at {snapshot_file}; recording the first one')
+    else:
+        logger.info(t'{len(changes)} changed subtrees since the last snapshot')
+
+    if not compare_only:
+        try:
+            save_snapshot(snapshot_file, current)
+        except OSError as e:
+            logger.error(t'Could not write snapshot {snapshot_file} ({e}); exiting')
+            return 1
+
+    return 1 if changes else 0
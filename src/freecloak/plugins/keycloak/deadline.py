@@ -0,0 +1,81 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import concurrent.futures
+import contextlib
+import contextvars
+import logging
+import time
+from typing import Iterator, Optional
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.exceptions import KeycloakClientTimeoutError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+
+# Monotonic time by which every request in the current context must have finished
+DEADLINE: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('keycloak_deadline', default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    if seconds is None:
+        yield DEADLINE.get()
+        return
+
+    # Nested budgets can only shorten the one they run inside of
+    expires = time.monotonic() + seconds
+    if (current := DEADLINE.get()) is not None:
+        expires = min(expires, current)
+
+    token = DEADLINE.set(expires)
+    try:
+        yield expires
+    finally:
+        DEADLINE.reset(token)
+
+def remaining() -> Optional[float]:
+    if (expires := DEADLINE.get()) is None:
+        return None
+
+    return expires - time.monotonic()
+
+def request_timeout(
+    connect: float = DEFAULT_CONNECT_TIMEOUT,
+    read: float = DEFAULT_READ_TIMEOUT,
+) -> tuple[float, float]:
+    if (budget := remaining()) is None:
+        return connect, read
+
+    if budget <= 0:
+        logger.error('Deadline exceeded before the request was sent; exiting')
+        raise KeycloakClientTimeoutError
+
+    return min(connect, budget), min(read, budget)
+
+
+class DeadlineExecutor(concurrent.futures.ThreadPoolExecutor):
+    def submit(self, fn, /, *args, **kwargs) -> concurrent.futures.Future:
+        # Worker threads start with an empty context, so each task runs in a copy of the submitter's to keep its deadline
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -41,3 +41,11 @@ class KeycloakClientConflictError(KeycloakClientError):
 class KeycloakClientServerError(KeycloakClientError):
     def __init__(self, message: Optional[str] = None):
         super().__init__(message)
+
+class KeycloakTokenError(KeycloakClientError):
+    def __init__(self, message: Optional[str] = None):
+        super().__init__(message)
+
+class KeycloakClientTimeoutError(KeycloakClientError):
+    def __init__(self, message: Optional[str] = None):
+        super().__init__(message)
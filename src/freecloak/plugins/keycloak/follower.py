@@ -0,0 +1,186 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import dataclasses
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.client import KeycloakClient
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+@dataclasses.dataclass
+class ChangeRecord:
+    realm: str
+    time: int
+    operation: str
+    resource_type: str
+    resource_id: Optional[str]
+    resource_path: str
+    event_id: Optional[str] = None
+
+
+@dataclasses.dataclass
+class EventCheckpoint:
+    time: int
+    event_keys: list[str] = dataclasses.field(default_factory=list)
+
+
+def load_checkpoint(path: str) -> Optional[EventCheckpoint]:
+    try:
+        with open(path) as f:
+            return EventCheckpoint(**json.load(f))
+    except FileNotFoundError:
+        return None
+    except (TypeError, ValueError):
+        logger.error(t'Checkpoint file {path} is corrupt; exiting')
+        raise KeycloakClientError
+
+
+def save_checkpoint(path: str, checkpoint: EventCheckpoint) -> None:
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(dataclasses.asdict(checkpoint), f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temporary_path, path)
+
+
+def event_key(event: dict) -> str:
+    # Older Keycloak releases do not return event ids
+    if event_id := event.get('id'):
+        return event_id
+
+    return f'{event.get("time")}:{event.get("operation_type")}:{event.get("resource_path")}'
+
+
+def normalize_event(realm: str, event: dict) -> ChangeRecord:
+    resource_path = event.get('resource_path') or ''
+    path_parts = resource_path.split('/')
+
+    return ChangeRecord(
+        realm=realm,
+        time=event['time'],
+        operation=event.get('operation_type'),
+        resource_type=event.get('resource_type'),
+        resource_id=path_parts[1] if len(path_parts) > 1 else None,
+        resource_path=resource_path,
+        event_id=event.get('id'),
+    )
+
+
+class AdminEventFollower:
+    __slots__ = [
+        'callback',
+        'checkpoint',
+        'checkpoint_path',
+        'client',
+        'interval',
+        'max_interval',
+        'min_interval',
+        'page_size',
+    ]
+
+    def __init__(
+        self,
+        client: KeycloakClient,
+        checkpoint_path: str,
+        callback: Callable[[ChangeRecord], None],
+        *,
+        since: Optional[int] = None,
+        page_size: int = 100,
+        min_interval: float = 1.0,
+        max_interval: float = 60.0,
+    ) -> None:
+        self.client = client
+        self.checkpoint_path = checkpoint_path
+        self.callback = callback
+        self.page_size = page_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+
+        self.checkpoint = load_checkpoint(checkpoint_path)
+        if self.checkpoint is None:
+            self.checkpoint = EventCheckpoint(time=since if since is not None else int(time.time() * 1000))
+            logger.info(t'No checkpoint found; following admin events from {self.checkpoint.time}')
+
+    def poll(self) -> int:
+        date_from = str(self.checkpoint.time)
+        seen_keys = set(self.checkpoint.event_keys)
+        emitted = 0
+
+        first = 0
+        while True:
+            page = self.client.get_admin_events(
+                realm=self.client.realm,
+                date_from=date_from,
+                direction='asc',
+                first=first,
+                max=self.page_size,
+                fields=['id', 'time', 'operation_type', 'resource_type', 'resource_path'],
+            )
+
+            for event in page:
+                # Events sharing the checkpoint timestamp may already have been emitted by the previous poll
+                key = event_key(event)
+                if event['time'] < self.checkpoint.time or (event['time'] == self.checkpoint.time and key in seen_keys):
+                    continue
+
+                self.callback(normalize_event(self.client.realm, event))
+                emitted += 1
+
+                if event['time'] > self.checkpoint.time:
+                    self.checkpoint = EventCheckpoint(time=event['time'])
+                    seen_keys = set()
+
+                self.checkpoint.event_keys.append(key)
+                seen_keys.add(key)
+
+            save_checkpoint(self.checkpoint_path, self.checkpoint)
+
+            if len(page) < self.page_size:
+                break
+
+            first += self.page_size
+
+        if emitted:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+
+        return emitted
+
+    def follow(self, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+
+        while not stop.is_set():
+            emitted = self.poll()
+            logger.debug(t'Emitted {emitted} admin events; next poll in {self.interval} seconds')
+
+            stop.wait(self.interval)
@@ -0,0 +1,172 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import concurrent.futures
+import dataclasses
+import logging
+from typing import Iterator, Optional
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.client import KeycloakClient
+from freecloak.plugins.keycloak.deadline import DeadlineExecutor
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+GROUP_FIELDS = ['id', 'name', 'path', 'parent_id', 'sub_group_count']
+
+
+@dataclasses.dataclass(eq=False)
+class GroupNode:
+    id: str
+    name: str
+    path: str
+    parent: Optional[GroupNode] = None
+    children: list[GroupNode] = dataclasses.field(default_factory=list)
+    members: set[str] = dataclasses.field(default_factory=set)
+    representation: dict = dataclasses.field(default_factory=dict, repr=False)
+
+
+class GroupTree:
+    __slots__ = ['by_id', 'by_path', 'member_groups', 'roots']
+
+    def __init__(self) -> None:
+        self.by_id: dict[str, GroupNode] = dict()
+        self.by_path: dict[str, GroupNode] = dict()
+        self.member_groups: dict[str, set[str]] = dict()
+        self.roots: list[GroupNode] = list()
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __iter__(self) -> Iterator[GroupNode]:
+        for root in self.roots:
+            yield root
+            yield from self.descendants(root)
+
+    def add(self, group: dict, parent: Optional[GroupNode] = None) -> GroupNode:
+        node = GroupNode(id=group['id'], name=group['name'], path=group['path'], parent=parent, representation=group)
+
+        self.by_id[node.id] = node
+        self.by_path[node.path] = node
+
+        if parent is None:
+            self.roots.append(node)
+        else:
+            parent.children.append(node)
+
+        return node
+
+    def add_members(self, node: GroupNode, user_ids: list[str]) -> None:
+        node.members.update(user_ids)
+        for user_id in user_ids:
+            self.member_groups.setdefault(user_id, set()).add(node.id)
+
+    def get(self, group_id: str) -> Optional[GroupNode]:
+        return self.by_id.get(group_id)
+
+    def find(self, path: str) -> Optional[GroupNode]:
+        return self.by_path.get(path)
+
+    def ancestors(self, node: GroupNode) -> Iterator[GroupNode]:
+        while node.parent is not None:
+            node = node.parent
+            yield node
+
+    def descendants(self, node: GroupNode) -> Iterator[GroupNode]:
+        for child in node.children:
+            yield child
+            yield from self.descendants(child)
+
+    def effective_members(self, node: GroupNode) -> set[str]:
+        members = set(node.members)
+        for descendant in self.descendants(node):
+            members.update(descendant.members)
+
+        return members
+
+    def effective_groups(self, user_id: str) -> set[GroupNode]:
+        # Members of a subgroup inherit the memberships (and role mappings) of every ancestor
+        groups = set()
+        for group_id in self.member_groups.get(user_id, ()):
+            node = self.by_id[group_id]
+            groups.add(node)
+            groups.update(self.ancestors(node))
+
+        return groups
+
+
+def load_group_tree(
+    client: KeycloakClient,
+    *,
+    members: bool = False,
+    representations: bool = False,
+    page_size: int = 100,
+    max_workers: int = 8,
+) -> GroupTree:
+    tree = GroupTree()
+
+    # Full representations carry attributes and role mappings; otherwise only the fields the tree needs are kept
+    listing_kwargs = {'brief_representation': False} if representations else {'fields': GROUP_FIELDS}
+
+    def _children(group_id: str) -> list[dict]:
+        return list(client.paginate('action_237', page_size=page_size, realm=client.realm, group_id=group_id, **listing_kwargs))
+
+    def _members(group_id: str) -> list[str]:
+        return [m['id'] for m in client.paginate('action_241', page_size=page_size, realm=client.realm, group_id=group_id, fields=['id'])]
+
+    with DeadlineExecutor(max_workers=max_workers) as executor:
+        pending = dict()
+
+        def _visit(group: dict, parent: Optional[GroupNode]) -> None:
+            node = tree.add(group, parent)
+
+            # Children are requested as soon as their parent is known rather than level by level
+            if group.get('sub_group_count'):
+                pending[executor.submit(_children, node.id)] = ('children', node)
+
+            if members:
+                pending[executor.submit(_members, node.id)] = ('members', node)
+
+        for group in client.paginate('action_231', page_size=page_size, realm=client.realm, **listing_kwargs):
+            _visit(group, None)
+
+        while pending:
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+                kind, node = pending.pop(future)
+
+                try:
+                    result = future.result()
+                except KeycloakClientError:
+                    logger.error(t'Failed to load {kind} of group {node.path}; exiting')
+                    raise
+
+                if kind == 'children':
+                    for child in result:
+                        _visit(child, node)
+                else:
+                    tree.add_members(node, result)
+
+    logger.debug(t'Loaded {len(tree)} groups')
+
+    return tree
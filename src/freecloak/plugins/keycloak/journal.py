@@ -0,0 +1,111 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Iterable, Optional, Self
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS operations (
+    key TEXT PRIMARY KEY,
+    operation TEXT NOT NULL,
+    status TEXT NOT NULL,
+    outcome TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS operations_status ON operations (status);
+"""
+
+
+class BulkJournal:
+    __slots__ = ['connection', 'path']
+
+    def __init__(self, path: str, *, resume: bool = False) -> None:
+        self.path = path
+
+        try:
+            self.connection = sqlite3.connect(path)
+            self.connection.executescript(JOURNAL_SCHEMA)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+        except sqlite3.Error:
+            logger.error(t'Could not open bulk journal {path}; exiting')
+            raise KeycloakClientError
+
+        if not resume:
+            with self.connection:
+                self.connection.execute('DELETE FROM operations')
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def status(self, key: str) -> Optional[str]:
+        row = self.connection.execute('SELECT status FROM operations WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def is_completed(self, key: str) -> bool:
+        return self.status(key) == 'completed'
+
+    def keys(self, status: str) -> set[str]:
+        return {row[0] for row in self.connection.execute('SELECT key FROM operations WHERE status = ?', (status,))}
+
+    def begin(self, operation: str, keys: Iterable[str]) -> None:
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                """
+                INSERT INTO operations (key, operation, status, updated) VALUES (?, ?, 'pending', ?)
+                ON CONFLICT (key) DO UPDATE SET status = 'pending', updated = excluded.updated
+                WHERE status != 'completed'
+                """,
+                ((key, operation, now) for key in keys),
+            )
+
+    def complete(self, outcomes: Iterable[tuple[str, Any]]) -> None:
+        self.finish('completed', outcomes)
+
+    def fail(self, outcomes: Iterable[tuple[str, Any]]) -> None:
+        self.finish('failed', outcomes)
+
+    def finish(self, status: str, outcomes: Iterable[tuple[str, Any]]) -> None:
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                'UPDATE operations SET status = ?, outcome = ?, updated = ? WHERE key = ?',
+                ((status, json.dumps(outcome, default=str), now, key) for key, outcome in outcomes),
+            )
+
+
+def journal_key(operation: str, resource_type: str, resource_name: str) -> str:
+    return f'{operation}:{resource_type}:{resource_name}'
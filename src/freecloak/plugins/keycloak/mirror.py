@@ -0,0 +1,276 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import concurrent.futures
+import json
+import logging
+import sqlite3
+import time
+from typing import Any, Iterable, Iterator, Optional, Self
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.client import KeycloakClient
+from freecloak.plugins.keycloak.deadline import DeadlineExecutor
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+from freecloak.plugins.keycloak.groups import load_group_tree
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+MIRROR_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mirror_info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    email TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    enabled INTEGER,
+    created_timestamp INTEGER
+);
+CREATE INDEX IF NOT EXISTS users_username ON users (username);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE TABLE IF NOT EXISTS user_attributes (
+    user_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS user_attributes_name_value ON user_attributes (name, value);
+CREATE INDEX IF NOT EXISTS user_attributes_user ON user_attributes (user_id);
+CREATE TABLE IF NOT EXISTS groups (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    parent_id TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS groups_path ON groups (path);
+CREATE TABLE IF NOT EXISTS group_members (
+    group_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (group_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS group_members_user ON group_members (user_id);
+CREATE TABLE IF NOT EXISTS role_mappings (
+    principal_type TEXT NOT NULL,
+    principal_id TEXT NOT NULL,
+    client_id TEXT NOT NULL,
+    role_name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS role_mappings_role ON role_mappings (role_name, client_id, principal_type);
+CREATE INDEX IF NOT EXISTS role_mappings_principal ON role_mappings (principal_type, principal_id);
+"""
+
+MIRROR_TABLES = ['user_attributes', 'users', 'group_members', 'groups', 'role_mappings']
+
+# Realm roles are stored with an empty client id so the role index stays usable for both kinds of role
+REALM_ROLE_CLIENT_ID = ''
+
+USER_FIELDS = ['id', 'username', 'email', 'first_name', 'last_name', 'enabled', 'created_timestamp', 'attributes']
+
+
+class RealmMirror:
+    __slots__ = ['connection', 'path']
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        try:
+            self.connection = sqlite3.connect(path)
+            self.connection.row_factory = sqlite3.Row
+            self.connection.executescript(MIRROR_SCHEMA)
+        except sqlite3.Error:
+            logger.error(t'Could not open realm mirror {path}; exiting')
+            raise KeycloakClientError
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def snapshot(self, client: KeycloakClient, *, page_size: int = 500, max_workers: int = 8) -> dict[str, int]:
+        logger.info(t'Mirroring realm {client.realm} into {self.path}')
+
+        with DeadlineExecutor(max_workers=max_workers) as executor, self.connection:
+            for table in MIRROR_TABLES:
+                self.connection.execute(f'DELETE FROM {table}')
+
+            for user in client.paginate('action_327', page_size=page_size, realm=client.realm, fields=USER_FIELDS):
+                self.insert_user(user)
+
+            group_tree = load_group_tree(client, members=True, page_size=page_size, max_workers=max_workers)
+            self.connection.executemany(
+                'INSERT INTO groups (id, name, path, parent_id) VALUES (?, ?, ?, ?)',
+                ((g.id, g.name, g.path, g.parent.id if g.parent else None) for g in group_tree),
+            )
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO group_members (group_id, user_id) VALUES (?, ?)',
+                ((g.id, user_id) for g in group_tree for user_id in g.members),
+            )
+
+            for mapping in load_role_mappings(client, executor, page_size):
+                self.connection.execute(
+                    'INSERT INTO role_mappings (principal_type, principal_id, client_id, role_name) VALUES (?, ?, ?, ?)',
+                    mapping,
+                )
+
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO mirror_info (key, value) VALUES (?, ?)',
+                [('realm', client.realm), ('snapshot_time', str(time.time()))],
+            )
+
+        counts = {table: self.connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in MIRROR_TABLES}
+        logger.info(t'Mirrored {counts["users"]} users and {counts["groups"]} groups')
+
+        return counts
+
+    def insert_user(self, user: dict) -> None:
+        self.connection.execute(
+            'INSERT INTO users (id, username, email, first_name, last_name, enabled, created_timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (
+                user['id'],
+                user['username'],
+                user.get('email'),
+                user.get('first_name'),
+                user.get('last_name'),
+                user.get('enabled'),
+                user.get('created_timestamp'),
+            ),
+        )
+
+        self.connection.executemany(
+            'INSERT INTO user_attributes (user_id, name, value) VALUES (?, ?, ?)',
+            (
+                (user['id'], name, value)
+                for name, values
+                in (user.get('attributes') or {}).items()
+                for value
+                in values
+            ),
+        )
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> list[sqlite3.Row]:
+        return self.connection.execute(sql, tuple(params)).fetchall()
+
+    def find_users(
+        self,
+        *,
+        attribute: Optional[str] = None,
+        attribute_value: Optional[str] = None,
+        group: Optional[str] = None,
+        role: Optional[str] = None,
+        role_client: Optional[str] = None,
+        recursive: bool = True,
+    ) -> list[sqlite3.Row]:
+        conditions = []
+        params = []
+
+        if attribute is not None:
+            if attribute_value is None:
+                conditions.append('id IN (SELECT user_id FROM user_attributes WHERE name = ?)')
+                params.append(attribute)
+            else:
+                conditions.append('id IN (SELECT user_id FROM user_attributes WHERE name = ? AND value = ?)')
+                params.extend([attribute, attribute_value])
+
+        if group is not None:
+            if recursive:
+                conditions.append(
+                    'id IN (SELECT m.user_id FROM group_members m JOIN groups g ON g.id = m.group_id WHERE g.path = ? OR substr(g.path, 1, ?) = ?)'
+                )
+                params.extend([group, len(group) + 1, group + '/'])
+            else:
+                conditions.append('id IN (SELECT m.user_id FROM group_members m JOIN groups g ON g.id = m.group_id WHERE g.path = ?)')
+                params.append(group)
+
+        if role is not None:
+            role_client_id = role_client if role_client is not None else REALM_ROLE_CLIENT_ID
+
+            # Group role mappings are inherited by members of the group and of all of its subgroups
+            conditions.append(
+                """
+                id IN (
+                    SELECT principal_id FROM role_mappings
+                    WHERE principal_type = 'user' AND role_name = ? AND client_id = ?
+                    UNION
+                    SELECT m.user_id FROM role_mappings r
+                    JOIN groups mapped ON mapped.id = r.principal_id
+                    JOIN groups g ON g.path = mapped.path OR substr(g.path, 1, length(mapped.path) + 1) = mapped.path || '/'
+                    JOIN group_members m ON m.group_id = g.id
+                    WHERE r.principal_type = 'group' AND r.role_name = ? AND r.client_id = ?
+                )
+                """
+            )
+            params.extend([role, role_client_id, role, role_client_id])
+
+        sql = 'SELECT * FROM users'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+
+        return self.query(sql + ' ORDER BY username', params)
+
+    def user_attributes(self, user_id: str) -> dict[str, list[str]]:
+        attributes = dict()
+        for row in self.query('SELECT name, value FROM user_attributes WHERE user_id = ?', [user_id]):
+            attributes.setdefault(row['name'], []).append(row['value'])
+
+        return attributes
+
+
+def load_role_mappings(client: KeycloakClient, executor: concurrent.futures.Executor, page_size: int) -> Iterator[tuple[str, str, str, str]]:
+    role_containers = [(REALM_ROLE_CLIENT_ID, None)]
+    role_containers.extend(
+        (c['client_id'], c['id'])
+        for c
+        in client.paginate('action_104', page_size=page_size, realm=client.realm, fields=['id', 'client_id'])
+    )
+
+    def _container_roles(client_id: str, client_uuid: Optional[str]) -> list[tuple[str, Optional[str], str]]:
+        if client_uuid is None:
+            roles = client.paginate('action_301', page_size=page_size, realm=client.realm, fields=['name'])
+        else:
+            roles = client.paginate('action_181', page_size=page_size, realm=client.realm, client_uuid=client_uuid, fields=['name'])
+
+        return [(client_id, client_uuid, role['name']) for role in roles]
+
+    def _role_principals(client_id: str, client_uuid: Optional[str], role_name: str) -> list[tuple[str, str, str, str]]:
+        if client_uuid is None:
+            users = client.paginate('action_324', page_size=page_size, realm=client.realm, role_name=role_name, fields=['id'])
+            groups = client.paginate('action_321', page_size=page_size, realm=client.realm, role_name=role_name, fields=['id'])
+        else:
+            users = client.paginate('action_194', page_size=page_size, realm=client.realm, client_uuid=client_uuid, role_name=role_name, fields=['id'])
+            groups = client.paginate('action_191', page_size=page_size, realm=client.realm, client_uuid=client_uuid, role_name=role_name, fields=['id'])
+
+        mappings = [('user', u['id'], client_id, role_name) for u in users]
+        mappings.extend(('group', g['id'], client_id, role_name) for g in groups)
+
+        return mappings
+
+    role_futures = [executor.submit(_container_roles, *container) for container in role_containers]
+    roles = [role for future in role_futures for role in future.result()]
+
+    for future in [executor.submit(_role_principals, *role) for role in roles]:
+        yield from future.result()
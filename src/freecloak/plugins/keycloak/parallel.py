@@ -0,0 +1,136 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import concurrent.futures
+import itertools
+import logging
+from typing import Any, Iterable, Optional, Self
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.client import KeycloakClient
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+class ModelWorker:
+    __slots__ = ['model', 'models']
+
+    # Workers only ever see pre-resolved models, so the client's conversion code runs unchanged
+    load_model = KeycloakClient.load_model
+    convert_model = KeycloakClient.convert_model
+    validate_model = KeycloakClient.validate_model
+
+    def __init__(self, models: dict[str, dict]) -> None:
+        self.model = dict()
+        self.models = models
+
+worker: Optional[ModelWorker] = None
+
+
+def initialize_worker(models: dict[str, dict]) -> None:
+    global worker
+    worker = ModelWorker(models)
+
+def convert_chunk(ref: str, chunk: list) -> list:
+    return [worker.convert_model({'type': 'reference', 'ref': ref}, item) for item in chunk]
+
+def validate_chunk(ref: str, chunk: list) -> list:
+    model = worker.load_model(ref)
+    return [worker.validate_model(model, item) for item in chunk]
+
+def collect_models(client: KeycloakClient, refs: Iterable[str]) -> dict[str, dict]:
+    models = dict()
+
+    pending = list(refs)
+    while pending:
+        ref = pending.pop()
+        if ref in models:
+            continue
+
+        # Enum-like schemas carry no properties and are passed through untouched
+        if 'properties' not in client.model['components']['schemas'].get(ref.rsplit('/', 1)[-1], dict()):
+            continue
+
+        models[ref] = client.load_model(ref)
+        for key_model in models[ref].values():
+            if key_model.get('item_type') == 'reference':
+                pending.append(key_model['item_ref'])
+            elif key_model['type'] == 'reference':
+                pending.append(key_model['ref'])
+
+    return models
+
+def chunk_items(items: list, chunk_size: int) -> Iterable[list]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
+class ModelProcessPool:
+    __slots__ = ['chunk_size', 'client', 'executor', 'models']
+
+    def __init__(self, client: KeycloakClient, refs: Iterable[str], *, max_workers: Optional[int] = None, chunk_size: int = 1000) -> None:
+        self.chunk_size = chunk_size
+        self.client = client
+
+        # The schemas are shipped to each worker once when it starts instead of with every chunk
+        self.models = collect_models(client, refs)
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=initialize_worker,
+            initargs=(self.models,),
+        )
+
+    def __enter__(self) -> Self:
+        self.client.process_pool = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.client.process_pool = None
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+
+    def handles(self, ref: str, items: list) -> bool:
+        return ref in self.models and len(items) > self.chunk_size
+
+    def map_chunks(self, func, ref: str, items: list) -> list:
+        chunks = list(chunk_items(items, self.chunk_size))
+        logger.debug(t'Processing {len(items)} {ref} items in {len(chunks)} chunks')
+
+        results = list()
+        for chunk_result in self.executor.map(func, itertools.repeat(ref), chunks):
+            results.extend(chunk_result)
+
+        return results
+
+    def convert(self, ref: str, items: list) -> list:
+        if not self.handles(ref, items):
+            return self.client.convert_model({'type': 'array', 'item_type': 'reference', 'item_ref': ref}, items)
+
+        return self.map_chunks(convert_chunk, ref, items)
+
+    def validate(self, ref: str, items: list) -> list:
+        if not self.handles(ref, items):
+            model = self.client.load_model(ref)
+            return [self.client.validate_model(model, item) for item in items]
+
+        return self.map_chunks(validate_chunk, ref, items)
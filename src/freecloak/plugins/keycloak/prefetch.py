@@ -0,0 +1,65 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import logging
+import os
+import threading
+from typing import Optional
+
+import requests
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.client import KeycloakSession
+from freecloak.plugins.keycloak.deadline import deadline
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+def prefetch_session(args: dict) -> Optional[threading.Thread]:
+    # Without usable credentials the command reports the problem itself when it connects
+    if not args.get('domain') or not args.get('client_id') or not args.get('realm'):
+        return None
+
+    if not args.get('client_secret') and not os.access(args.get('client_secret_file') or '', os.R_OK):
+        return None
+
+    # Commands authenticating against several realms would not use this session
+    if args.get('per_realm_auth'):
+        return None
+
+    def _prefetch() -> None:
+        # The thread starts with an empty context, so it takes on the command's budget itself
+        try:
+            with deadline(args.get('deadline')):
+                keycloak_session = KeycloakSession(**args)
+                keycloak_session.acquire()
+        except (KeycloakClientError, requests.RequestException, KeyError, ValueError) as e:
+            logger.debug(t'Background Keycloak connection failed ({e.__class__.__name__}); the command will connect itself')
+            return
+
+        # The registry keeps the idle session for the command, which blocks on it only while it is still being created
+        keycloak_session.release()
+        logger.debug('Background Keycloak connection ready')
+
+    thread = threading.Thread(target=_prefetch, name='keycloak-prefetch', daemon=True)
+    thread.start()
+
+    return thread
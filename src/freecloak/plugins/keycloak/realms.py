@@ -0,0 +1,122 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import contextlib
+import dataclasses
+import fnmatch
+import logging
+import threading
+from typing import Any, Callable, Iterable, Iterator, Optional, Self
+
+import requests
+import requests_toolbelt.sessions
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.client import KeycloakClient, KeycloakSession
+from freecloak.plugins.keycloak.deadline import deadline, DeadlineExecutor
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+@dataclasses.dataclass
+class RealmResult:
+    realm: str
+    result: Any = None
+    error: Optional[str] = None
+
+
+class MultiRealmExecutor:
+    __slots__ = ['clients', 'connection', 'deadline', 'exit_stack', 'lock', 'max_workers', 'per_realm_auth', 'realm', 'sessions']
+
+    def __init__(self, realm: str, *, max_workers: int = 8, per_realm_auth: bool = False, deadline: Optional[float] = None, **kwargs) -> None:
+        self.clients: dict[str, KeycloakClient] = dict()
+        self.connection = kwargs
+        self.deadline = deadline
+        self.exit_stack = contextlib.ExitStack()
+        self.lock = threading.Lock()
+        self.max_workers = max_workers
+        self.per_realm_auth = per_realm_auth
+        self.realm = realm
+        self.sessions: dict[str, KeycloakSession] = dict()
+
+    def __enter__(self) -> Self:
+        self.exit_stack.enter_context(deadline(self.deadline))
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.exit_stack.close()
+        self.close()
+
+    def close(self) -> None:
+        for keycloak_session in self.sessions.values():
+            keycloak_session.release()
+
+        self.clients.clear()
+        self.sessions.clear()
+
+    def session(self, auth_realm: str) -> requests_toolbelt.sessions.BaseUrlSession:
+        # One authenticated session, and so one token, per realm the client logs into, borrowed from the registry
+        with self.lock:
+            if auth_realm not in self.sessions:
+                self.sessions[auth_realm] = KeycloakSession(realm=auth_realm, **self.connection)
+
+            keycloak_session = self.sessions[auth_realm]
+
+        keycloak_session.acquire()
+        return keycloak_session.session
+
+    def client(self, realm: str) -> KeycloakClient:
+        if realm not in self.clients:
+            session = self.session(realm if self.per_realm_auth else self.realm)
+            self.clients[realm] = KeycloakClient(realm=realm, **(self.connection | {'session': session}))
+
+        return self.clients[realm]
+
+    def resolve_realms(self, patterns: Iterable[str]) -> list[str]:
+        patterns = list(patterns)
+        if not any(set(pattern) & set('*?[') for pattern in patterns):
+            return list(dict.fromkeys(patterns))
+
+        realm_names = [realm['realm'] for realm in self.client(self.realm).get_realms(brief_representation=True)]
+
+        realms = list()
+        for pattern in patterns:
+            realms.extend(realm_name for realm_name in fnmatch.filter(realm_names, pattern) if realm_name not in realms)
+
+        return realms
+
+    def run(self, realms: Iterable[str], func: Callable[[KeycloakClient], Any]) -> Iterator[RealmResult]:
+        realms = self.resolve_realms(realms)
+        logger.debug(t'Running across {len(realms)} realms with at most {self.max_workers} in flight')
+
+        def _run_realm(realm: str) -> RealmResult:
+            try:
+                return RealmResult(realm=realm, result=func(self.client(realm)))
+            except (KeycloakClientError, requests.RequestException) as e:
+                logger.warning(t'Realm {realm} failed')
+                return RealmResult(realm=realm, error=e.__class__.__name__)
+
+        with DeadlineExecutor(max_workers=self.max_workers) as executor:
+            yield from executor.map(_run_realm, realms)
+
+    def run_action(self, realms: Iterable[str], action: str, **kwargs) -> Iterator[RealmResult]:
+        return self.run(realms, lambda client: getattr(client, action)(realm=client.realm, **kwargs))
@@ -0,0 +1,120 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import dataclasses
+import hashlib
+import logging
+import threading
+import time
+from typing import Optional, TYPE_CHECKING
+
+import requests_toolbelt.sessions
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.deadline import remaining
+from freecloak.plugins.keycloak.exceptions import KeycloakClientTimeoutError
+
+if TYPE_CHECKING:
+    from freecloak.plugins.keycloak.client import KeycloakSession
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+@dataclasses.dataclass(eq=False)
+class RegistryEntry:
+    lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+    session: Optional[requests_toolbelt.sessions.BaseUrlSession] = None
+    openid_configuration: Optional[dict] = None
+    references: int = 0
+    released: float = 0.0
+
+
+class SessionRegistry:
+    __slots__ = ['entries', 'idle_timeout', 'lock']
+
+    def __init__(self, *, idle_timeout: float = 300.0) -> None:
+        self.entries: dict[tuple[str, str, str, str], RegistryEntry] = dict()
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def session_key(keycloak_session: KeycloakSession) -> tuple[str, str, str, str]:
+        # The secret is part of the key so a session is only ever shared with callers holding the same credentials
+        secret_hash = hashlib.sha256(keycloak_session.client_secret.encode('utf-8')).hexdigest()
+        return keycloak_session.base_url, keycloak_session.realm, keycloak_session.client_id, secret_hash
+
+    def acquire(self, keycloak_session: KeycloakSession) -> RegistryEntry:
+        key = self.session_key(keycloak_session)
+
+        with self.lock:
+            self.evict_idle()
+            entry = self.entries.setdefault(key, RegistryEntry())
+            entry.references += 1
+
+        # Only callers of the same key wait on each other while the first one connects and authenticates
+        try:
+            budget = remaining()
+            if not entry.lock.acquire(timeout=-1 if budget is None else max(budget, 0)):
+                logger.error('Deadline exceeded while waiting for the Keycloak session; exiting')
+                raise KeycloakClientTimeoutError
+
+            try:
+                if entry.session is None:
+                    keycloak_session.create_session()
+                    entry.session = keycloak_session.session
+                    entry.openid_configuration = keycloak_session.openid_configuration
+                else:
+                    logger.debug('Borrowing pooled Keycloak session')
+            finally:
+                entry.lock.release()
+        except BaseException:
+            self.release(key)
+            raise
+
+        return entry
+
+    def release(self, key: tuple[str, str, str, str]) -> None:
+        with self.lock:
+            if (entry := self.entries.get(key)) is None:
+                return
+
+            entry.references -= 1
+            entry.released = time.monotonic()
+            self.evict_idle()
+
+    def evict_idle(self) -> None:
+        now = time.monotonic()
+        for key, entry in list(self.entries.items()):
+            if entry.references <= 0 and now - entry.released >= self.idle_timeout:
+                logger.debug('Closing idle Keycloak session')
+                self.discard(key)
+
+    def discard(self, key: tuple[str, str, str, str]) -> None:
+        entry = self.entries.pop(key)
+        if entry.session is not None:
+            entry.session.close()
+
+    def close(self) -> None:
+        with self.lock:
+            for key in list(self.entries):
+                self.discard(key)
+
+
+SESSION_REGISTRY = SessionRegistry()
@@ -0,0 +1,190 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import collections
+import logging
+import threading
+import time
+from typing import Optional, TYPE_CHECKING
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError, KeycloakClientNotFoundError
+
+if TYPE_CHECKING:
+    from freecloak.plugins.keycloak.client import KeycloakClient
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+# Per identifier kind: the listing action, its exact-match search parameter and the field holding the identifier
+RESOLVER_KINDS = {
+    'client': {
+        'action': 'action_104',
+        'field': 'client_id',
+        'search': {'client_id': None},
+    },
+    'email': {
+        'action': 'action_327',
+        'field': 'email',
+        'search': {'email': None, 'exact': True},
+    },
+    'user': {
+        'action': 'action_327',
+        'field': 'username',
+        'search': {'username': None, 'exact': True},
+    },
+}
+
+# Path parameters naming the resource a write applies to
+RESOLVED_PATH_PARAMETERS = ['{client-uuid}', '{group-id}', '{id}', '{user-id}']
+
+
+class KeycloakResolver:
+    __slots__ = ['client', 'entries', 'ids', 'lock', 'max_entries', 'ttl']
+
+    def __init__(self, client: KeycloakClient, *, max_entries: int = 10000, ttl: float = 300.0) -> None:
+        self.client = client
+        self.entries: collections.OrderedDict[tuple[str, str], tuple[str, float]] = collections.OrderedDict()
+        self.ids: dict[str, set[tuple[str, str]]] = dict()
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    @staticmethod
+    def cache_key(kind: str, identifier: str) -> tuple[str, str]:
+        # Keycloak stores usernames and emails lowercased
+        if kind in ['email', 'user']:
+            identifier = identifier.lower()
+
+        return kind, identifier
+
+    def remember(self, kind: str, identifier: str, resource_id: str) -> None:
+        key = self.cache_key(kind, identifier)
+
+        with self.lock:
+            if key in self.entries:
+                self.forget(key)
+
+            self.entries[key] = (resource_id, time.monotonic() + self.ttl)
+            self.ids.setdefault(resource_id, set()).add(key)
+
+            while len(self.entries) > self.max_entries:
+                self.forget(next(iter(self.entries)))
+
+    def forget(self, key: tuple[str, str]) -> None:
+        resource_id, _ = self.entries.pop(key)
+        if keys := self.ids.get(resource_id):
+            keys.discard(key)
+            if not keys:
+                del self.ids[resource_id]
+
+    def cached(self, kind: str, identifier: str) -> Optional[str]:
+        key = self.cache_key(kind, identifier)
+
+        with self.lock:
+            if (entry := self.entries.get(key)) is None:
+                return None
+
+            resource_id, expires = entry
+            if expires < time.monotonic():
+                self.forget(key)
+                return None
+
+            self.entries.move_to_end(key)
+            return resource_id
+
+    def invalidate(self, resource_id: str) -> None:
+        with self.lock:
+            for key in list(self.ids.get(resource_id, ())):
+                self.forget(key)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.ids.clear()
+
+    def fetch(self, kind: str, identifier: str) -> Optional[str]:
+        if kind == 'group':
+            try:
+                group = self.client.action_230(realm=self.client.realm, path=identifier.lstrip('/'), fields=['id'])
+            except KeycloakClientNotFoundError:
+                return None
+
+            return group.get('id')
+
+        resolver_kind = RESOLVER_KINDS[kind]
+        search = {name: identifier if value is None else value for name, value in resolver_kind['search'].items()}
+
+        matches = getattr(self.client, resolver_kind['action'])(
+            realm=self.client.realm,
+            fields=['id', resolver_kind['field']],
+            **search,
+        )
+
+        # Searches can still match loosely (e.g. clientId), so only an exact identifier counts
+        for match in matches:
+            if self.cache_key(kind, match.get(resolver_kind['field']) or '') == self.cache_key(kind, identifier):
+                return match['id']
+
+        return None
+
+    def lookup(self, kind: str, identifier: str) -> Optional[str]:
+        if kind != 'group' and kind not in RESOLVER_KINDS:
+            logger.error(t'Unknown identifier kind {kind}; exiting')
+            raise KeycloakClientError
+
+        if (resource_id := self.cached(kind, identifier)) is not None:
+            return resource_id
+
+        if (resource_id := self.fetch(kind, identifier)) is not None:
+            self.remember(kind, identifier, resource_id)
+
+        return resource_id
+
+    def resolve(self, kind: str, identifier: str) -> str:
+        if (resource_id := self.lookup(kind, identifier)) is None:
+            logger.error(t'No {kind} {identifier} found; exiting')
+            raise KeycloakClientNotFoundError
+
+        return resource_id
+
+    def prewarm(self, kind: str, *, page_size: int = 500) -> int:
+        if kind == 'group':
+            from freecloak.plugins.keycloak.groups import load_group_tree
+
+            entries = ((node.path, node.id) for node in load_group_tree(self.client, page_size=page_size))
+        else:
+            resolver_kind = RESOLVER_KINDS[kind]
+            entries = (
+                (match[resolver_kind['field']], match['id'])
+                for match
+                in self.client.paginate(resolver_kind['action'], page_size=page_size, realm=self.client.realm, fields=['id', resolver_kind['field']])
+                if match.get(resolver_kind['field'])
+            )
+
+        count = 0
+        for identifier, resource_id in entries:
+            self.remember(kind, identifier, resource_id)
+            count += 1
+
+        if count > self.max_entries:
+            logger.warning(t'Prewarmed {count} {kind} entries into a cache of {self.max_entries}; the oldest were evicted')
+
+        return count
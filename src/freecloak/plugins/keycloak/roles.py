@@ -0,0 +1,194 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import dataclasses
+import logging
+import threading
+from typing import Optional
+
+import requests
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.client import KeycloakClient
+from freecloak.plugins.keycloak.deadline import DeadlineExecutor
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+# Keyed by principal type: mapping read, realm add/remove and client add/remove actions
+ROLE_MAPPING_ACTIONS = {
+    'group': {
+        'get': ('action_242', 'group_id'),
+        'realm': ('action_249', 'action_250'),
+        'client': ('action_244', 'action_245'),
+    },
+    'user': {
+        'get': ('action_360', 'user_id'),
+        'realm': ('action_367', 'action_368'),
+        'client': ('action_362', 'action_363'),
+    },
+}
+
+# Container name used for realm roles; anything else is a client id
+REALM_CONTAINER = 'realm'
+
+
+@dataclasses.dataclass
+class RoleMappingChange:
+    principal_type: str
+    principal_id: str
+    container: str
+    added: list[str] = dataclasses.field(default_factory=list)
+    removed: list[str] = dataclasses.field(default_factory=list)
+    add_roles: list[dict] = dataclasses.field(default_factory=list, repr=False)
+    remove_roles: list[dict] = dataclasses.field(default_factory=list, repr=False)
+    client_uuid: Optional[str] = None
+    error: Optional[str] = None
+
+
+def parse_role_mapping_spec(data: dict) -> dict[tuple[str, str], dict[str, set[str]]]:
+    desired = dict()
+
+    for principal_key, principal_type in [('users', 'user'), ('groups', 'group')]:
+        for principal_id, containers in data.get(principal_key, {}).items():
+            principal_roles = dict()
+
+            if (realm_roles := containers.get('realm')) is not None:
+                principal_roles[REALM_CONTAINER] = set(realm_roles)
+
+            for client_id, client_roles in containers.get('clients', {}).items():
+                principal_roles[client_id] = set(client_roles)
+
+            desired[(principal_type, principal_id)] = principal_roles
+
+    return desired
+
+
+class RoleMappingReconciler:
+    __slots__ = ['client', 'lock', 'max_workers', 'roles']
+
+    def __init__(self, client: KeycloakClient, *, max_workers: int = 8) -> None:
+        self.client = client
+        self.max_workers = max_workers
+        self.roles: dict[str, dict[str, dict]] = dict()
+        self.lock = threading.Lock()
+
+    def client_uuid(self, client_id: str) -> str:
+        return self.client.resolver.resolve('client', client_id)
+
+    def container_roles(self, container: str) -> dict[str, dict]:
+        with self.lock:
+            if (roles := self.roles.get(container)) is not None:
+                return roles
+
+        if container == REALM_CONTAINER:
+            role_list = self.client.paginate('action_301', realm=self.client.realm, fields=['id', 'name'])
+        else:
+            role_list = self.client.paginate('action_181', realm=self.client.realm, client_uuid=self.client_uuid(container), fields=['id', 'name'])
+
+        roles = {role['name']: role for role in role_list}
+        with self.lock:
+            self.roles[container] = roles
+
+        return roles
+
+    def current_mappings(self, principal_type: str, principal_id: str) -> dict[str, dict[str, dict]]:
+        action, id_param = ROLE_MAPPING_ACTIONS[principal_type]['get']
+        mappings = getattr(self.client, action)(realm=self.client.realm, **{id_param: principal_id})
+
+        current = {REALM_CONTAINER: {role['name']: role for role in mappings.get('realm_mappings', [])}}
+        for client_id, client_mappings in (mappings.get('client_mappings') or {}).items():
+            current[client_id] = {role['name']: role for role in client_mappings.get('mappings', [])}
+            self.client.resolver.remember('client', client_id, client_mappings['id'])
+
+        return current
+
+    def plan_principal(self, principal: tuple[str, str], desired_roles: dict[str, set[str]]) -> list[RoleMappingChange]:
+        principal_type, principal_id = principal
+        current = self.current_mappings(principal_type, principal_id)
+
+        changes = []
+        # Only containers named in the spec are authoritative; other mappings are left alone
+        for container, desired_names in desired_roles.items():
+            current_roles = current.get(container, {})
+
+            added = sorted(desired_names - current_roles.keys())
+            removed = sorted(current_roles.keys() - desired_names)
+            if not added and not removed:
+                continue
+
+            available_roles = self.container_roles(container) if added else {}
+            missing = [name for name in added if name not in available_roles]
+            if missing:
+                logger.error(t'Roles {", ".join(missing)} do not exist in {container}; exiting')
+                raise KeycloakClientError
+
+            changes.append(RoleMappingChange(
+                principal_type=principal_type,
+                principal_id=principal_id,
+                container=container,
+                added=added,
+                removed=removed,
+                add_roles=[{'id': available_roles[name]['id'], 'name': name} for name in added],
+                remove_roles=[{'id': current_roles[name]['id'], 'name': name} for name in removed],
+                client_uuid=None if container == REALM_CONTAINER else self.client_uuid(container),
+            ))
+
+        return changes
+
+    def plan(self, desired: dict[tuple[str, str], dict[str, set[str]]]) -> list[RoleMappingChange]:
+        with DeadlineExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.plan_principal, principal, roles) for principal, roles in desired.items()]
+            return [change for future in futures for change in future.result()]
+
+    def apply_change(self, change: RoleMappingChange) -> RoleMappingChange:
+        container_kind = 'realm' if change.container == REALM_CONTAINER else 'client'
+        add_action, remove_action = ROLE_MAPPING_ACTIONS[change.principal_type][container_kind]
+        id_param = ROLE_MAPPING_ACTIONS[change.principal_type]['get'][1]
+
+        request_kwargs = {'realm': self.client.realm, id_param: change.principal_id}
+        if change.client_uuid:
+            request_kwargs['client_id'] = change.client_uuid
+
+        # Connection errors are recorded too, so one unreachable request does not abort the whole apply
+        try:
+            if change.add_roles:
+                getattr(self.client, add_action)(change.add_roles, **request_kwargs)
+
+            if change.remove_roles:
+                getattr(self.client, remove_action)(change.remove_roles, **request_kwargs)
+        except (KeycloakClientError, requests.RequestException) as e:
+            change.error = type(e).__name__
+
+        return change
+
+    def apply(self, changes: list[RoleMappingChange]) -> list[RoleMappingChange]:
+        with DeadlineExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.apply_change, changes))
+
+    def reconcile(self, desired: dict[tuple[str, str], dict[str, set[str]]], *, dry_run: bool = False) -> list[RoleMappingChange]:
+        changes = self.plan(desired)
+        logger.info(t'{len(changes)} role mapping changes planned')
+
+        if dry_run:
+            return changes
+
+        return self.apply(changes)
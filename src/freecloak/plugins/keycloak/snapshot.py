@@ -0,0 +1,193 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import collections
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import time
+import urllib.parse
+from typing import Any, Iterator, Optional
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.client import KeycloakClient
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+# Fields that identify an item of an exported list, in order of preference
+ITEM_IDENTITY_FIELDS = ['clientId', 'path', 'alias', 'name', 'id']
+
+ROOT_PATH = ''
+
+
+@dataclasses.dataclass
+class RealmSnapshot:
+    realm: str
+    created: float
+    hashes: dict[str, str]
+
+
+@dataclasses.dataclass
+class SnapshotChange:
+    path: str
+    change: str
+
+
+def canonical_json(data: Any) -> bytes:
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str).encode('utf-8')
+
+def leaf_hash(data: Any) -> str:
+    return hashlib.sha256(canonical_json(canonicalize(data))).hexdigest()
+
+def canonicalize(data: Any) -> Any:
+    # Export list order is not stable between requests, so lists compare as multisets
+    if isinstance(data, dict):
+        return {key: canonicalize(value) for key, value in data.items()}
+
+    if isinstance(data, list):
+        return sorted((canonicalize(item) for item in data), key=canonical_json)
+
+    return data
+
+def item_segment(item: Any) -> str:
+    if isinstance(item, dict):
+        for field in ITEM_IDENTITY_FIELDS:
+            if isinstance(identity := item.get(field), str) and identity:
+                return identity
+
+    return leaf_hash(item)[:16]
+
+def item_segments(items: list[dict]) -> list[tuple[str, dict]]:
+    segments = [(item_segment(item), leaf_hash(item), item) for item in items]
+    counts = collections.Counter(segment for segment, _, _ in segments)
+
+    # Items sharing an identity (e.g. mappers named alike on different providers) are told apart by content,
+    # so every item keeps its own path and the order no longer depends on the server's list order
+    children = list()
+    repeats = collections.Counter()
+    for segment, content_hash, item in sorted(segments, key=lambda segment_item: segment_item[:2]):
+        if counts[segment] > 1:
+            segment = f'{segment}~{content_hash[:16]}'
+
+            # Identical copies of an item only differ by their position among themselves
+            repeats[segment] += 1
+            if repeats[segment] > 1:
+                segment = f'{segment}~{repeats[segment]}'
+
+        children.append((segment, item))
+
+    return children
+
+def child_path(path: str, segment: str) -> str:
+    return f'{path}/{urllib.parse.quote(str(segment), safe="")}'
+
+def hash_tree(data: Any, *, max_depth: int = 3, path: str = ROOT_PATH, depth: int = 0) -> Iterator[tuple[str, str]]:
+    children = None
+    if depth < max_depth:
+        if isinstance(data, dict):
+            children = list(data.items())
+        elif isinstance(data, list) and data and all(isinstance(item, dict) for item in data):
+            children = item_segments(data)
+
+    if not children:
+        yield path, leaf_hash(data)
+        return
+
+    # An inner node hashes its children's hashes, so one changed leaf changes every hash up to the root
+    node = hashlib.sha256()
+    for segment, child in sorted(children, key=lambda segment_child: segment_child[0]):
+        child_hashes = list(hash_tree(child, max_depth=max_depth, path=child_path(path, segment), depth=depth + 1))
+        yield from child_hashes
+
+        node.update(f'{segment}:{child_hashes[-1][1]}\n'.encode('utf-8'))
+
+    yield path, node.hexdigest()
+
+def take_snapshot(
+    client: KeycloakClient,
+    *,
+    export_clients: bool = True,
+    export_groups_and_roles: bool = True,
+    max_depth: int = 3,
+) -> RealmSnapshot:
+    # The export is only hashed, so it is kept exactly as the server sent it
+    document = client.action_298(
+        realm=client.realm,
+        export_clients=export_clients,
+        export_groups_and_roles=export_groups_and_roles,
+        raw=True,
+    )
+
+    return RealmSnapshot(realm=client.realm, created=time.time(), hashes=dict(hash_tree(document, max_depth=max_depth)))
+
+def load_snapshot(path: str) -> Optional[RealmSnapshot]:
+    try:
+        with open(path) as f:
+            return RealmSnapshot(**json.load(f))
+    except FileNotFoundError:
+        return None
+    except (TypeError, ValueError):
+        logger.error(t'Snapshot file {path} is corrupt; exiting')
+        raise KeycloakClientError
+
+def save_snapshot(path: str, snapshot: RealmSnapshot) -> None:
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(dataclasses.asdict(snapshot), f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(temporary_path, path)
+
+def compare_snapshots(old: RealmSnapshot, new: RealmSnapshot) -> list[SnapshotChange]:
+    def _children(hashes: dict[str, str]) -> dict[str, list[str]]:
+        children = dict()
+        for path in hashes:
+            if path != ROOT_PATH:
+                children.setdefault(path.rsplit('/', 1)[0], []).append(path)
+
+        return children
+
+    old_children = _children(old.hashes)
+    new_children = _children(new.hashes)
+
+    # Only subtrees whose hashes differ are descended into
+    changes = list()
+    pending = [ROOT_PATH]
+    while pending:
+        path = pending.pop()
+        if old.hashes.get(path) == new.hashes.get(path):
+            continue
+
+        old_paths = set(old_children.get(path, []))
+        new_paths = set(new_children.get(path, []))
+        if not old_paths and not new_paths:
+            changes.append(SnapshotChange(path=path, change='changed'))
+            continue
+
+        changes.extend(SnapshotChange(path=child, change='removed') for child in old_paths - new_paths)
+        changes.extend(SnapshotChange(path=child, change='added') for child in new_paths - old_paths)
+        pending.extend(old_paths & new_paths)
+
+    return sorted(changes, key=lambda change: change.path)
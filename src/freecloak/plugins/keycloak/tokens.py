@@ -0,0 +1,262 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import requests
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.deadline import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, request_timeout
+from freecloak.plugins.keycloak.exceptions import KeycloakTokenError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+# RSASSA-PKCS1-v1_5 signature algorithms with the DER DigestInfo prefix of their hash
+TOKEN_ALGORITHMS = {
+    'RS256': ('sha256', bytes.fromhex('3031300d060960864801650304020105000420')),
+    'RS384': ('sha384', bytes.fromhex('3041300d060960864801650304020205000430')),
+    'RS512': ('sha512', bytes.fromhex('3051300d060960864801650304020305000440')),
+}
+
+
+def base64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+def rsa_verify(jwk: dict, algorithm: str, message: bytes, signature: bytes) -> bool:
+    hash_name, digest_prefix = TOKEN_ALGORITHMS[algorithm]
+
+    modulus = int.from_bytes(base64url_decode(jwk['n']))
+    exponent = int.from_bytes(base64url_decode(jwk['e']))
+    key_length = (modulus.bit_length() + 7) // 8
+
+    # A representative at or above the modulus is rejected by the standard (RFC 8017 5.2.2), never reduced
+    signature_value = int.from_bytes(signature)
+    if len(signature) != key_length or signature_value >= modulus:
+        return False
+
+    digest_info = digest_prefix + hashlib.new(hash_name, message).digest()
+    if key_length < len(digest_info) + 11:
+        return False
+
+    encoded_message = pow(signature_value, exponent, modulus).to_bytes(key_length)
+    expected_message = b'\x00\x01' + b'\xff' * (key_length - len(digest_info) - 3) + b'\x00' + digest_info
+
+    return hmac.compare_digest(encoded_message, expected_message)
+
+def default_jwks_cache_path(jwks_uri: str) -> str:
+    cache_directory = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_directory, 'freecloak', f'jwks-{hashlib.sha256(jwks_uri.encode()).hexdigest()[:16]}.json')
+
+
+class JWKSCache:
+    __slots__ = ['cache_path', 'fetched', 'fetched_at', 'jwks_uri', 'keys', 'lock', 'max_age', 'min_refresh_interval', 'timeout']
+
+    def __init__(
+        self,
+        jwks_uri: str,
+        *,
+        cache_path: Optional[str] = None,
+        min_refresh_interval: float = 60.0,
+        max_age: float = 3600.0,
+        timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+    ) -> None:
+        self.cache_path = cache_path
+        self.fetched: Optional[float] = None
+        self.fetched_at: Optional[float] = None
+        self.jwks_uri = jwks_uri
+        self.keys: dict[str, dict] = dict()
+        self.lock = threading.Lock()
+        self.max_age = max_age
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+
+        if cache_path:
+            self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logger.warning(t'JWKS cache {self.cache_path} is corrupt; ignoring it')
+            return
+
+        if cached.get('jwks_uri') == self.jwks_uri:
+            self.keys = {key['kid']: key for key in cached.get('keys', []) if key.get('kid')}
+            self.fetched_at = cached.get('fetched_at')
+
+    def save(self, jwks: dict) -> None:
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+
+        temporary_path = f'{self.cache_path}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump({'jwks_uri': self.jwks_uri, 'fetched_at': self.fetched_at, 'keys': jwks.get('keys', [])}, f)
+
+        os.replace(temporary_path, self.cache_path)
+
+    def refresh(self) -> bool:
+        # An unknown kid in every request must not turn into a request to Keycloak for each of them
+        if self.fetched is not None and time.monotonic() - self.fetched < self.min_refresh_interval:
+            return False
+
+        logger.debug(t'Fetching JWKS from {self.jwks_uri}')
+        self.fetched = time.monotonic()
+
+        try:
+            jwks = requests.get(self.jwks_uri, timeout=request_timeout(*self.timeout)).json()
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(t'Could not fetch JWKS from {self.jwks_uri} ({e})')
+            return False
+
+        # The new set replaces the old one, so keys Keycloak has rotated out stop verifying tokens
+        self.keys = {key['kid']: key for key in jwks.get('keys', []) if key.get('kid')}
+        self.fetched_at = time.time()
+
+        if self.cache_path:
+            try:
+                self.save(jwks)
+            except OSError as e:
+                logger.warning(t'Could not write JWKS cache {self.cache_path} ({e})')
+
+        return True
+
+    def expired(self) -> bool:
+        # Caches written before the fetch time was recorded are treated as expired
+        return self.fetched_at is None or time.time() - self.fetched_at >= self.max_age
+
+    def key(self, kid: str) -> dict:
+        if (key := self.keys.get(kid)) is not None and not self.expired():
+            return key
+
+        # If Keycloak cannot be reached the expired set stays in use until a refresh succeeds
+        with self.lock:
+            if kid not in self.keys or self.expired():
+                self.refresh()
+
+        if (key := self.keys.get(kid)) is None:
+            raise KeycloakTokenError(f'unknown signing key {kid}')
+
+        return key
+
+
+class TokenVerifier:
+    __slots__ = ['audience', 'issuer', 'jwks', 'leeway', 'token_type']
+
+    def __init__(
+        self,
+        jwks: JWKSCache,
+        *,
+        issuer: str,
+        audience: Optional[str] = None,
+        leeway: float = 30.0,
+        token_type: Optional[str] = 'Bearer',
+    ) -> None:
+        self.audience = audience
+        self.issuer = issuer
+        self.jwks = jwks
+        self.leeway = leeway
+        self.token_type = token_type
+
+    def verify(self, token: str) -> dict:
+        try:
+            encoded_header, encoded_claims, encoded_signature = token.strip().split('.')
+            header = json.loads(base64url_decode(encoded_header))
+            claims = json.loads(base64url_decode(encoded_claims))
+            signature = base64url_decode(encoded_signature)
+        except (ValueError, TypeError):
+            raise KeycloakTokenError('malformed token')
+
+        if not isinstance(header, dict) or not isinstance(claims, dict):
+            raise KeycloakTokenError('malformed token')
+
+        if (algorithm := header.get('alg')) not in TOKEN_ALGORITHMS:
+            raise KeycloakTokenError(f'unsupported algorithm {algorithm}')
+
+        key = self.jwks.key(header.get('kid'))
+        if key.get('kty') != 'RSA' or key.get('use', 'sig') != 'sig':
+            raise KeycloakTokenError(f'key {header.get("kid")} cannot verify signatures')
+
+        if key.get('alg', algorithm) != algorithm:
+            raise KeycloakTokenError(f'key {header.get("kid")} is not used with {algorithm}')
+
+        if not rsa_verify(key, algorithm, f'{encoded_header}.{encoded_claims}'.encode('ascii'), signature):
+            raise KeycloakTokenError('invalid signature')
+
+        self.verify_claims(claims)
+        return claims
+
+    def verify_claims(self, claims: dict) -> None:
+        now = time.time()
+
+        # Keycloak signs ID and refresh tokens with the same keys, so only the type tells them apart
+        if self.token_type is not None and claims.get('typ') != self.token_type:
+            raise KeycloakTokenError(f'unexpected token type {claims.get("typ")}')
+
+        if not isinstance(expires := claims.get('exp'), (int, float)) or expires + self.leeway < now:
+            raise KeycloakTokenError('token expired')
+
+        if isinstance(not_before := claims.get('nbf'), (int, float)) and not_before - self.leeway > now:
+            raise KeycloakTokenError('token not yet valid')
+
+        if claims.get('iss') != self.issuer:
+            raise KeycloakTokenError(f'unexpected issuer {claims.get("iss")}')
+
+        if self.audience is not None:
+            audience = claims.get('aud', [])
+            if isinstance(audience, str):
+                audience = [audience]
+
+            # Keycloak access tokens name the requesting client in azp rather than always in aud
+            if self.audience not in audience and claims.get('azp') != self.audience:
+                raise KeycloakTokenError(f'token not issued for {self.audience}')
+
+
+def create_verifier(
+    openid_configuration: dict,
+    *,
+    audience: Optional[str] = None,
+    cache_path: Optional[str] = None,
+    leeway: float = 30.0,
+    min_refresh_interval: float = 60.0,
+    max_age: float = 3600.0,
+    token_type: Optional[str] = 'Bearer',
+    timeout: tuple[float, float] = (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT),
+) -> TokenVerifier:
+    jwks_uri = openid_configuration['jwks_uri']
+    jwks = JWKSCache(
+        jwks_uri,
+        cache_path=cache_path or default_jwks_cache_path(jwks_uri),
+        min_refresh_interval=min_refresh_interval,
+        max_age=max_age,
+        timeout=timeout,
+    )
+
+    return TokenVerifier(jwks, issuer=openid_configuration['issuer'], audience=audience, leeway=leeway, token_type=token_type)
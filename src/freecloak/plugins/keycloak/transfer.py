@@ -0,0 +1,128 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import gzip
+import logging
+import sys
+from typing import IO, Iterable, Iterator
+
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.keycloak.bulk import BulkImportRecord, IMPORT_RESOURCES
+from freecloak.plugins.keycloak.client import KeycloakClient
+from freecloak.plugins.keycloak.codec import decode_json, encode_json
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+# Listing action and extra arguments per exported resource, in the order an import needs them
+EXPORT_RESOURCES = {
+    'role': ('action_301', {'brief_representation': False}),
+    'client': ('action_104', dict()),
+    'group': ('action_231', {'brief_representation': False}),
+    'user': ('action_327', {'brief_representation': False}),
+}
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+def exportable(client: KeycloakClient, resource_type: str, data: dict) -> dict:
+    # Read-only fields are rejected on import, so they never make it into the export
+    model = client.load_model(IMPORT_RESOURCES[resource_type]['ref'])
+    return {key: value for key, value in data.items() if not model.get(key, dict()).get('read_only')}
+
+def load_subgroups(client: KeycloakClient, group: dict, *, page_size: int = 100) -> dict:
+    if group.get('sub_group_count') == 0:
+        return group
+
+    group['sub_groups'] = [
+        load_subgroups(client, subgroup, page_size=page_size)
+        for subgroup
+        in client.paginate('action_237', page_size=page_size, realm=client.realm, group_id=group['id'], brief_representation=False)
+    ]
+
+    return group
+
+def export_records(client: KeycloakClient, resource_types: Iterable[str], *, page_size: int = 100) -> Iterator[dict]:
+    for resource_type in EXPORT_RESOURCES:
+        if resource_type not in resource_types:
+            continue
+
+        action, action_kwargs = EXPORT_RESOURCES[resource_type]
+        logger.info(t'Exporting {resource_type} records')
+
+        if resource_type == 'user':
+            logger.warning('User group memberships, role mappings and credentials are not exported; imported users will have none')
+
+        # Records are yielded page by page, only a single top-level group subtree is ever held at once
+        for data in client.paginate(action, page_size=page_size, realm=client.realm, **action_kwargs):
+            if resource_type == 'group':
+                data = load_subgroups(client, data, page_size=page_size)
+
+            yield {'type': resource_type, 'data': exportable(client, resource_type, data)}
+
+def write_records(records: Iterable[dict], f: IO[bytes]) -> dict[str, int]:
+    counts = dict()
+    for record in records:
+        f.write(encode_json(record) + b'\n')
+        counts[record['type']] = counts.get(record['type'], 0) + 1
+
+    return counts
+
+def read_records(f: IO[bytes]) -> Iterator[BulkImportRecord]:
+    for line_number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+
+        try:
+            record = decode_json(line)
+            yield BulkImportRecord(resource_type=record['type'], data=record['data'])
+        except (ValueError, KeyError, TypeError):
+            logger.error(t'Invalid record on line {line_number}; exiting')
+            raise KeycloakClientError
+
+def open_export(path: str, compress: bool = False) -> IO[bytes]:
+    if path == '-':
+        # Standard output may have been swapped for a text-only stream, and closing the export must not close it
+        if (stdout := getattr(sys.stdout, 'buffer', None)) is None:
+            logger.error('Standard output cannot take binary data; exiting')
+            raise KeycloakClientError
+
+        stdout.flush()
+        stream = open(stdout.fileno(), 'wb', closefd=False)
+        return gzip.GzipFile(fileobj=stream, mode='wb') if compress else stream
+
+    if compress or path.endswith('.gz'):
+        return gzip.open(path, 'wb')
+
+    return open(path, 'wb')
+
+def open_import(path: str) -> IO[bytes]:
+    stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+
+    # Compressed exports are recognized by content rather than by name
+    if stream.peek(len(GZIP_MAGIC))[:len(GZIP_MAGIC)] != GZIP_MAGIC:
+        return stream
+
+    if path == '-':
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+
+    stream.close()
+    return gzip.open(path, 'rb')
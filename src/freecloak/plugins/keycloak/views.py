@@ -0,0 +1,117 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import copy
+from collections.abc import Mapping, Sequence
+from typing import Any, Iterator, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from freecloak.plugins.keycloak.client import KeycloakClient
+
+
+class KeycloakModelView(Mapping):
+    __slots__ = ['_client', '_data', '_ref']
+
+    def __init__(self, client: KeycloakClient, ref: str, data: dict) -> None:
+        self._client = client
+        self._data = data
+        self._ref = ref
+
+    @property
+    def raw(self) -> dict:
+        return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        model = self._client.load_model(self._ref)
+
+        if key_model := model.get(key):
+            return view_model(self._client, key_model, self._data[key_model['api_name']])
+
+        # Properties missing from the schema keep their API name, matching convert_model
+        return self._data[key]
+
+    def __getattr__(self, item: str) -> Any:
+        if item.startswith('_'):
+            raise AttributeError(item)
+
+        try:
+            return self[item]
+        except KeyError:
+            raise AttributeError(item) from None
+
+    def __iter__(self) -> Iterator[str]:
+        model = self._client.load_model(self._ref)
+        program_names = {key_model['api_name']: key for key, key_model in model.items()}
+
+        return (program_names.get(key, key) for key in self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self._data!r})'
+
+    def convert(self) -> dict:
+        return self._client.convert_model({'type': 'reference', 'ref': self._ref}, copy.deepcopy(self._data))
+
+
+class KeycloakListView(Sequence):
+    __slots__ = ['_client', '_data', '_ref']
+
+    def __init__(self, client: KeycloakClient, ref: str, data: list) -> None:
+        self._client = client
+        self._data = data
+        self._ref = ref
+
+    @property
+    def raw(self) -> list:
+        return self._data
+
+    def __getitem__(self, index: int | slice) -> Any:
+        if isinstance(index, slice):
+            return KeycloakListView(self._client, self._ref, self._data[index])
+
+        return KeycloakModelView(self._client, self._ref, self._data[index])
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self._data!r})'
+
+    def convert(self) -> list:
+        return self._client.convert_model(
+            {'type': 'array', 'item_type': 'reference', 'item_ref': self._ref},
+            copy.deepcopy(self._data),
+        )
+
+
+def view_model(client: KeycloakClient, model: dict, data: Any) -> Any:
+    match model['type']:
+        case 'array':
+            if model.get('item_type') == 'reference' and isinstance(data, list):
+                return KeycloakListView(client, model['item_ref'], data)
+
+            return data
+        case 'reference':
+            if isinstance(data, dict):
+                return KeycloakModelView(client, model['ref'], data)
+
+            return data
+        case _:
+            return data
@@ -0,0 +1,55 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import argparse
+import logging
+
+from freecloak.plugins.freeipa.client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from freecloak.plugins.keycloak.cli import add_connection_arguments
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.sync.sources import USER_SOURCES
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+def add_source_arguments(parser: argparse.ArgumentParser) -> None:
+    source_group = parser.add_argument_group('freeipa source')
+    source_group.add_argument('--source', help='where to read FreeIPA users from', choices=sorted(USER_SOURCES), default='json')
+    source_group.add_argument('--source-path', help='path of a FreeIPA JSON or LDIF dump', metavar='FILE')
+    source_group.add_argument('--freeipa-server', help='freeipa server')
+    source_group.add_argument('--freeipa-port', help='freeipa port', type=int)
+    source_group.add_argument('--freeipa-user', help='freeipa user')
+    source_group.add_argument('--freeipa-password-file', help='freeipa password file path')
+    source_group.add_argument('--freeipa-ca-cert', help='CA certificate used to verify the freeipa server', metavar='FILE')
+    source_group.add_argument('--freeipa-insecure', help='use HTTP to connect to freeipa', action='store_true')
+    source_group.add_argument('--freeipa-api-version', help='freeipa API version to send, by default the server uses its own')
+    source_group.add_argument('--freeipa-connect-timeout', help='seconds to wait for a freeipa connection', type=float, default=DEFAULT_CONNECT_TIMEOUT)
+    source_group.add_argument('--freeipa-read-timeout', help='seconds to wait for a freeipa response', type=float, default=DEFAULT_READ_TIMEOUT)
+
+def add_plugin_parser(subparsers: argparse._SubParsersAction) -> None:
+    users_parser = subparsers.add_parser('users', description='sync FreeIPA users into Keycloak')
+    add_connection_arguments(users_parser)
+    add_source_arguments(users_parser)
+
+    users_group = users_parser.add_argument_group('sync options')
+    users_group.add_argument('--state', help='sync state file holding per-user content hashes', metavar='FILE', required=True)
+    users_group.add_argument('--workers', help='concurrent requests', type=int, default=8)
+    users_group.add_argument('--dry-run', help='report changes without writing to Keycloak', action='store_true')
+    users_group.add_argument('--no-disable', help='do not disable users missing from FreeIPA', action='store_true')
@@ -0,0 +1,58 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import logging
+
+from freecloak.plugins.freeipa.exceptions import FreeIPAClientError
+from freecloak.plugins.keycloak import KeycloakClient
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.sync.engine import SyncEngine
+from freecloak.plugins.sync.exceptions import SyncError
+from freecloak.plugins.sync.sources import USER_SOURCES
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+def users(
+    realm: str,
+    source: str,
+    state: str,
+    workers: int,
+    dry_run: bool = False,
+    no_disable: bool = False,
+    **kwargs
+) -> int:
+    try:
+        user_source = USER_SOURCES[source](path=kwargs.pop('source_path', None), **kwargs)
+
+        with KeycloakClient(realm=realm, **kwargs) as client:
+            engine = SyncEngine(client, state, max_workers=workers, dry_run=dry_run)
+            result = engine.run(user_source, disable_missing=not no_disable)
+    except (FreeIPAClientError, KeycloakClientError, SyncError):
+        return 1
+
+    print(f'{'Created':<15} {result.created}')
+    print(f'{'Updated':<15} {result.updated}')
+    print(f'{'Disabled':<15} {result.disabled}')
+    print(f'{'Unchanged':<15} {result.unchanged}')
+    print(f'{'Failed':<15} {result.failed}')
+
+    return 1 if result.failed else 0
@@ -0,0 +1,226 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import concurrent.futures
+import contextlib
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Iterable, Optional
+
+from freecloak.plugins.keycloak import KeycloakClient
+from freecloak.plugins.keycloak.deadline import DeadlineExecutor
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.sync.exceptions import SyncError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+# FreeIPA attributes copied verbatim into Keycloak user attributes
+ATTRIBUTE_MAP = {
+    'uidnumber': 'uidNumber',
+    'gidnumber': 'gidNumber',
+    'homedirectory': 'homeDirectory',
+    'loginshell': 'loginShell',
+    'krbprincipalname': 'krbPrincipalName',
+}
+
+
+@dataclasses.dataclass
+class SyncResult:
+    created: int = 0
+    updated: int = 0
+    disabled: int = 0
+    unchanged: int = 0
+    failed: int = 0
+
+
+def first_value(entry: dict[str, list], name: str) -> Optional[Any]:
+    values = entry.get(name)
+    return values[0] if values else None
+
+
+def map_user(entry: dict[str, list]) -> dict:
+    user = {
+        'username': first_value(entry, 'uid'),
+        'enabled': str(first_value(entry, 'nsaccountlock')).upper() not in ('TRUE', '1'),
+    }
+
+    for field, name in [('email', 'mail'), ('first_name', 'givenname'), ('last_name', 'sn')]:
+        if (value := first_value(entry, name)) is not None:
+            user[field] = value
+
+    attributes = {
+        keycloak_name: sorted(str(v) for v in entry[freeipa_name])
+        for freeipa_name, keycloak_name
+        in ATTRIBUTE_MAP.items()
+        if entry.get(freeipa_name)
+    }
+    if attributes:
+        user['attributes'] = attributes
+
+    return user
+
+
+def user_hash(user: dict) -> str:
+    return hashlib.sha256(json.dumps(user, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def load_state(path: str) -> dict[str, dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)['users']
+    except FileNotFoundError:
+        return dict()
+    except (KeyError, ValueError):
+        logger.error(t'Sync state file {path} is corrupt; exiting')
+        raise SyncError
+
+
+def save_state(path: str, users: dict[str, dict]) -> None:
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump({'users': users}, f, separators=(',', ':'))
+
+    os.replace(temporary_path, path)
+
+
+class SyncEngine:
+    __slots__ = ['client', 'dry_run', 'max_workers', 'state', 'state_path']
+
+    def __init__(self, client: KeycloakClient, state_path: str, *, max_workers: int = 8, dry_run: bool = False) -> None:
+        self.client = client
+        self.state_path = state_path
+        self.max_workers = max_workers
+        self.dry_run = dry_run
+        self.state = load_state(state_path)
+
+    def run(self, source: Iterable[dict[str, list]], *, disable_missing: bool = True) -> SyncResult:
+        result = SyncResult()
+        seen = set()
+        written = dict()
+
+        try:
+            # Without previous state every user needs an id lookup, so fetch them in one paged listing instead
+            # unless the realm holds more users than the resolver keeps, which would evict most of them before use
+            if not self.state:
+                user_count = self.client.action_331(realm=self.client.realm)
+                if user_count <= self.client.resolver.max_entries:
+                    self.client.resolver.prewarm('user')
+                else:
+                    logger.info(t'Realm has {user_count} users, more than the resolver keeps; looking them up one by one')
+
+            # Updates are buffered so repeated changes to a user become one write, flushed once the workers are done
+            with (
+                contextlib.nullcontext() if self.dry_run else self.client.buffered(max_workers=self.max_workers)
+            ) as buffer, DeadlineExecutor(max_workers=self.max_workers) as executor:
+                futures = dict()
+
+                for entry in source:
+                    user = map_user(entry)
+                    if not (username := user['username']):
+                        logger.warning('Skipping FreeIPA entry without a uid')
+                        continue
+
+                    seen.add(username)
+                    content_hash = user_hash(user)
+
+                    state = self.state.get(username)
+                    if state and state['hash'] == content_hash and not state.get('disabled'):
+                        result.unchanged += 1
+                        continue
+
+                    futures[executor.submit(self.apply_user, user, state)] = (username, content_hash)
+
+                if disable_missing:
+                    for username, state in self.state.items():
+                        if username not in seen and not state.get('disabled'):
+                            futures[executor.submit(self.disable_user, state)] = (username, None)
+
+                for future in concurrent.futures.as_completed(futures):
+                    username, content_hash = futures[future]
+
+                    try:
+                        action, user_id = future.result()
+                    except KeycloakClientError:
+                        logger.error(t'Failed to sync user {username}')
+                        result.failed += 1
+                        continue
+
+                    setattr(result, action, getattr(result, action) + 1)
+                    if action != 'created':
+                        written[user_id] = (username, action)
+
+                    if content_hash is None:
+                        self.state[username]['disabled'] = True
+                    else:
+                        self.state[username] = {'id': user_id, 'hash': content_hash}
+
+            # Buffered writes fail after their user was counted, so undo the count and leave the user to the next run
+            for failure in buffer.failures if buffer else []:
+                username, action = written[failure.resource_id]
+                logger.error(t'Failed to sync user {username}')
+
+                setattr(result, action, getattr(result, action) - 1)
+                result.failed += 1
+                self.forget_write(username, action)
+        except BaseException:
+            # Buffered writes may not have been sent, so none of them can be trusted in the saved state
+            for username, action in written.values():
+                self.forget_write(username, action)
+
+            raise
+        finally:
+            if not self.dry_run:
+                save_state(self.state_path, self.state)
+
+        return result
+
+    def forget_write(self, username: str, action: str) -> None:
+        if action == 'disabled':
+            self.state[username].pop('disabled', None)
+        else:
+            self.state[username]['hash'] = None
+
+    def apply_user(self, user: dict, state: Optional[dict]) -> tuple[str, Optional[str]]:
+        user_id = state['id'] if state else None
+
+        if user_id is None:
+            user_id = self.client.resolver.lookup('user', user['username'])
+
+        if self.dry_run:
+            logger.info(t'Would {"update" if user_id else "create"} user {user["username"]}')
+            return ('updated' if user_id else 'created'), user_id
+
+        if user_id is None:
+            response = self.client.action_328(realm=self.client.realm, **user)
+            return 'created', response.get('id')
+
+        self.client.action_336(realm=self.client.realm, user_id=user_id, **user)
+        return 'updated', user_id
+
+    def disable_user(self, state: dict) -> tuple[str, Optional[str]]:
+        if not self.dry_run:
+            self.client.action_336(realm=self.client.realm, user_id=state['id'], enabled=False)
+
+        return 'disabled', state['id']
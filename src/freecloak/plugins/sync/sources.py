@@ -0,0 +1,191 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import base64
+import binascii
+import json
+import logging
+from typing import Iterator, Optional, Union
+
+from freecloak.plugins.freeipa import FreeIPAClient
+from freecloak.plugins.freeipa.client import DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT
+from freecloak.plugins.logging import TemplateStringAdapter
+
+from freecloak.plugins.sync.exceptions import SyncSourceError
+
+
+logger = TemplateStringAdapter(logging.getLogger(__name__))
+
+
+def normalize_entry(entry: dict) -> dict[str, list]:
+    # FreeIPA returns most attributes as lists, but dumps and LDIF are not consistent about it
+    return {
+        name.lower(): list(value) if isinstance(value, (list, tuple)) else [value]
+        for name, value
+        in entry.items()
+    }
+
+
+class JSONUserSource:
+    __slots__ = ['path']
+
+    def __init__(self, path: str, **_) -> None:
+        if not path:
+            logger.error('A FreeIPA JSON dump path is required; exiting')
+            raise SyncSourceError
+
+        self.path = path
+
+    def __iter__(self) -> Iterator[dict[str, list]]:
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            logger.error(t'Could not read FreeIPA JSON dump {self.path}; exiting')
+            raise SyncSourceError
+
+        # Accept raw user_find output as well as a plain list of users
+        while isinstance(data, dict) and 'result' in data:
+            data = data['result']
+
+        if not isinstance(data, list):
+            logger.error(t'FreeIPA JSON dump {self.path} does not contain a list of users; exiting')
+            raise SyncSourceError
+
+        for entry in data:
+            yield normalize_entry(entry)
+
+
+class LDIFUserSource:
+    __slots__ = ['path']
+
+    def __init__(self, path: str, **_) -> None:
+        if not path:
+            logger.error('A FreeIPA LDIF dump path is required; exiting')
+            raise SyncSourceError
+
+        self.path = path
+
+    def __iter__(self) -> Iterator[dict[str, list]]:
+        try:
+            with open(self.path) as f:
+                for entry in parse_ldif(f):
+                    if 'uid' in entry:
+                        yield entry
+        except OSError:
+            logger.error(t'Could not read FreeIPA LDIF dump {self.path}; exiting')
+            raise SyncSourceError
+
+
+def decode_ldif_value(name: str, value: str) -> Union[str, bytes]:
+    try:
+        raw = base64.b64decode(value.strip(), validate=True)
+    except binascii.Error:
+        logger.error(t'Invalid base64 value for LDIF attribute {name}; exiting')
+        raise SyncSourceError
+
+    # Binary attributes such as krbPrincipalKey or jpegPhoto are kept as raw bytes
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw
+
+
+def parse_ldif(lines) -> Iterator[dict[str, list]]:
+    entry = dict()
+    logical_line = None
+
+    def _add_line(line: str) -> None:
+        if line.startswith('#') or ':' not in line:
+            return
+
+        name, value = line.split(':', 1)
+        if value.startswith(':'):
+            value = decode_ldif_value(name, value[1:])
+        else:
+            value = value.strip()
+
+        entry.setdefault(name.lower(), []).append(value)
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+
+        # Lines starting with a single space continue the previous line
+        if line.startswith(' ') and logical_line is not None:
+            logical_line += line[1:]
+            continue
+
+        if logical_line is not None:
+            _add_line(logical_line)
+
+        logical_line = line or None
+        if not line and entry:
+            yield entry
+            entry = dict()
+
+    if logical_line is not None:
+        _add_line(logical_line)
+
+    if entry:
+        yield entry
+
+
+class FreeIPAUserSource:
+    __slots__ = ['client']
+
+    def __init__(
+        self,
+        *,
+        freeipa_server: Optional[str] = None,
+        freeipa_port: Optional[int] = None,
+        freeipa_user: Optional[str] = None,
+        freeipa_password_file: Optional[str] = None,
+        freeipa_ca_cert: Optional[str] = None,
+        freeipa_insecure: Optional[bool] = None,
+        freeipa_api_version: Optional[str] = None,
+        freeipa_connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        freeipa_read_timeout: float = DEFAULT_READ_TIMEOUT,
+        **_,
+    ) -> None:
+        if not freeipa_server or not freeipa_user:
+            logger.error('A FreeIPA server and user are required; exiting')
+            raise SyncSourceError
+
+        self.client = FreeIPAClient(
+            server=freeipa_server,
+            port=freeipa_port,
+            username=freeipa_user,
+            password_file=freeipa_password_file,
+            ca_cert=freeipa_ca_cert,
+            allow_insecure=freeipa_insecure,
+            api_version=freeipa_api_version,
+            connect_timeout=freeipa_connect_timeout,
+            read_timeout=freeipa_read_timeout,
+        )
+
+    def __iter__(self) -> Iterator[dict[str, list]]:
+        with self.client:
+            for entry in self.client.find_users():
+                yield normalize_entry(entry)
+
+
+USER_SOURCES = {
+    'freeipa': FreeIPAUserSource,
+    'json': JSONUserSource,
+    'ldif': LDIFUserSource,
+}
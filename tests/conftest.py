@@ -0,0 +1,75 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import json
+import re
+from typing import Any, Callable, Optional
+
+import pytest
+
+from freecloak.plugins.keycloak import KeycloakClient
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: Any = None, headers: Optional[dict] = None) -> None:
+        self.status_code = status_code
+        self.content = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.headers = headers or dict()
+        self.ok = 200 <= status_code < 300
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class FakeSession:
+    # Routes map (method, URL regex) to a handler taking the request kwargs and the regex groups
+    def __init__(self, routes: dict[tuple[str, str], Callable]) -> None:
+        self.routes = routes
+        self.calls: list[tuple[str, str, dict]] = list()
+
+    def request(self, method: str, url: str, **kwargs) -> FakeResponse:
+        if isinstance(kwargs.get('data'), bytes):
+            kwargs['json'] = json.loads(kwargs['data'])
+
+        self.calls.append((method, url, kwargs))
+
+        for (route_method, pattern), handler in self.routes.items():
+            if route_method == method and (match := re.fullmatch(pattern, url)):
+                response = handler(kwargs, *match.groups())
+                if isinstance(response, FakeResponse):
+                    return response
+
+                return FakeResponse(204) if response is None else FakeResponse(200, response)
+
+        raise AssertionError(f'Unexpected request {method} {url}')
+
+    def writes(self) -> list[tuple[str, str]]:
+        return [(method, url) for method, url, _ in self.calls if method != 'GET']
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def make_client() -> Callable[..., KeycloakClient]:
+    def _make_client(routes: Optional[dict] = None, **kwargs) -> KeycloakClient:
+        client = KeycloakClient(realm='test', domain='keycloak.invalid', client_id='test', client_secret='secret', **kwargs)
+        client.session.session = FakeSession(routes or dict())
+        return client
+
+    return _make_client
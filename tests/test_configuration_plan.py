@@ -0,0 +1,179 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import copy
+import itertools
+import json
+
+import pytest
+
+from freecloak.plugins.configuration.plan import diff_fields, load_config, MAPPING_STAGE, RealmConfigurator
+from freecloak.plugins.keycloak.exceptions import KeycloakClientError
+
+from conftest import FakeResponse
+
+
+class FakeRealm:
+    def __init__(self) -> None:
+        self.ids = itertools.count(100)
+        self.realm = {'realm': 'test', 'displayName': 'Test', 'loginWithEmailAllowed': False}
+        self.roles = [{'id': 'r1', 'name': 'admin', 'composite': False}]
+        self.clients = [{'id': 'c1', 'clientId': 'app', 'enabled': True, 'secret': '**********', 'redirectUris': ['b', 'a']}]
+        self.client_roles = {'c1': [{'id': 'cr1', 'name': 'reader'}]}
+        self.groups = {'g1': {'id': 'g1', 'name': 'staff', 'path': '/staff', 'subGroupCount': 0, 'realmRoles': ['admin'], 'clientRoles': {}}}
+
+    @staticmethod
+    def page(kwargs: dict, items: list) -> list:
+        first = kwargs['params'].get('first', 0)
+        return copy.deepcopy(items[first:first + kwargs['params'].get('max', 100)])
+
+    def create_role(self, kwargs: dict) -> FakeResponse:
+        self.roles.append(kwargs['json'] | {'id': f'r{next(self.ids)}'})
+        return FakeResponse(201, headers={'Location': f'roles/{self.roles[-1]["id"]}'})
+
+    def create_group(self, kwargs: dict, parent_id: str) -> FakeResponse:
+        group_id = f'g{next(self.ids)}'
+        path = f'{self.groups[parent_id]["path"]}/{kwargs["json"]["name"]}'
+        self.groups[group_id] = kwargs['json'] | {'id': group_id, 'path': path, 'subGroupCount': 0, 'realmRoles': [], 'clientRoles': {}}
+        self.groups[parent_id]['subGroupCount'] += 1
+        return FakeResponse(201, headers={'Location': f'groups/{group_id}'})
+
+    def children(self, kwargs: dict, parent_id: str) -> list:
+        parent_path = self.groups[parent_id]['path']
+        return self.page(kwargs, [group for group in self.groups.values() if group['path'].rsplit('/', 1)[0] == parent_path])
+
+    def group_mappings(self, kwargs: dict, group_id: str) -> dict:
+        group = self.groups[group_id]
+        client_mappings = {
+            client_id: {'id': 'c1', 'client': client_id, 'mappings': [{'id': 'cr1', 'name': name} for name in names]}
+            for client_id, names
+            in group['clientRoles'].items()
+        }
+
+        return {'realmMappings': [{'id': 'r1', 'name': name} for name in group['realmRoles']], 'clientMappings': client_mappings}
+
+    def add_realm_mappings(self, kwargs: dict, group_id: str) -> None:
+        self.groups[group_id]['realmRoles'] += [role['name'] for role in kwargs['json']]
+
+    def add_client_mappings(self, kwargs: dict, group_id: str, client_uuid: str) -> None:
+        client_id = next(client['clientId'] for client in self.clients if client['id'] == client_uuid)
+        self.groups[group_id]['clientRoles'].setdefault(client_id, []).extend(role['name'] for role in kwargs['json'])
+
+    def update(self, items: list, item_id: str, kwargs: dict) -> None:
+        next(item for item in items if item['id'] == item_id).update(kwargs['json'])
+
+    def routes(self) -> dict:
+        return {
+            ('GET', r'/admin/realms/test'): lambda kwargs: copy.deepcopy(self.realm),
+            ('PUT', r'/admin/realms/test'): lambda kwargs: self.realm.update(kwargs['json']),
+            ('GET', r'/admin/realms/test/roles'): lambda kwargs: self.page(kwargs, self.roles),
+            ('POST', r'/admin/realms/test/roles'): self.create_role,
+            ('GET', r'/admin/realms/test/clients'): lambda kwargs: self.page(kwargs, [
+                client for client in self.clients if kwargs['params'].get('clientId', client['clientId']) == client['clientId']
+            ]),
+            ('PUT', r'/admin/realms/test/clients/([^/]+)'): lambda kwargs, client_id: self.update(self.clients, client_id, kwargs),
+            ('GET', r'/admin/realms/test/clients/([^/]+)/roles'): lambda kwargs, client_id: self.page(kwargs, self.client_roles[client_id]),
+            ('GET', r'/admin/realms/test/groups'): lambda kwargs: self.page(kwargs, [
+                group for group in self.groups.values() if group['path'].count('/') == 1
+            ]),
+            ('GET', r'/admin/realms/test/groups/([^/]+)/children'): self.children,
+            ('POST', r'/admin/realms/test/groups/([^/]+)/children'): self.create_group,
+            ('PUT', r'/admin/realms/test/groups/([^/]+)'): lambda kwargs, group_id: self.groups[group_id].update(kwargs['json']),
+            ('GET', r'/admin/realms/test/groups/([^/]+)/role-mappings'): self.group_mappings,
+            ('POST', r'/admin/realms/test/groups/([^/]+)/role-mappings/realm'): self.add_realm_mappings,
+            ('POST', r'/admin/realms/test/groups/([^/]+)/role-mappings/clients/([^/]+)'): self.add_client_mappings,
+        }
+
+
+DESIRED = {
+    'realm': {'display_name': 'Test', 'login_with_email_allowed': True},
+    'roles': [{'name': 'admin'}, {'name': 'viewer', 'description': 'Read only'}],
+    'clients': [{'client_id': 'app', 'redirect_uris': ['a', 'b', 'c'], 'secret': 'plaintext'}],
+    'groups': [{
+        'name': 'staff',
+        'realm_roles': ['admin', 'viewer'],
+        'client_roles': {'app': ['reader']},
+        'sub_groups': [{'name': 'ops', 'realm_roles': ['viewer']}],
+    }],
+}
+
+
+def test_diff_fields_compares_declared_keys_only():
+    desired = {'enabled': True, 'redirect_uris': ['a', 'b'], 'attributes': {'k': 'v'}, 'secret': 'plaintext'}
+    current = {'enabled': True, 'redirect_uris': ['b', 'a'], 'attributes': {'k': 'w', 'other': 'x'}, 'secret': '**********', 'id': 'c1'}
+
+    assert diff_fields(desired, current) == {'attributes.k': {'current': 'w', 'desired': 'v'}}
+
+
+def test_plan_is_ordered_and_reapplying_makes_no_writes(make_client):
+    fake_realm = FakeRealm()
+    client = make_client(fake_realm.routes())
+    configurator = RealmConfigurator(client, max_workers=4)
+
+    changes = configurator.plan(copy.deepcopy(DESIRED))
+    stages = [change.stage for change in changes]
+
+    assert stages == sorted(stages)
+    assert {(change.resource_type, change.name) for change in changes} == {
+        ('realm', 'test'),
+        ('role', 'viewer'),
+        ('client', 'app'),
+        ('group', '/staff/ops'),
+        ('group_roles', '/staff'),
+        ('group_roles', '/staff/ops'),
+    }
+    assert all(change.stage == MAPPING_STAGE for change in changes if change.resource_type == 'group_roles')
+    assert 'plaintext' not in json.dumps([change.fields for change in changes])
+
+    assert [change.error for change in configurator.apply(changes)] == [None] * len(changes)
+    assert fake_realm.clients[0]['secret'] == 'plaintext'
+    assert fake_realm.groups['g1']['clientRoles'] == {'app': ['reader']}
+
+    writes = len(client.session.session.writes())
+    assert configurator.plan(copy.deepcopy(DESIRED)) == []
+    assert len(client.session.session.writes()) == writes
+
+
+def test_masked_secrets_are_not_written_back(make_client):
+    fake_realm = FakeRealm()
+    client = make_client(fake_realm.routes())
+
+    [change] = RealmConfigurator(client).plan({'realm': {}, 'roles': [], 'clients': [{'client_id': 'app', 'enabled': False}], 'groups': []})
+
+    assert 'secret' not in change.payload
+
+
+@pytest.mark.parametrize('desired', [
+    {'clients': [{'client_id': 'app', 'redirectUris': ['a']}]},
+    {'clients': [{'redirect_uris': ['a']}]},
+    {'roles': [{'name': 'viewer', 'composite': 'yes'}]},
+    {'groups': [{'name': 'staff', 'sub_groups': [{'description': 'no name'}]}]},
+])
+def test_plan_rejects_invalid_configuration(make_client, desired):
+    configurator = RealmConfigurator(make_client())
+
+    with pytest.raises(KeycloakClientError):
+        configurator.plan({'realm': dict(), 'roles': [], 'clients': [], 'groups': []} | desired)
+
+
+def test_load_config_rejects_non_object_files(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text('[]')
+
+    with pytest.raises(KeycloakClientError):
+        load_config(str(path))
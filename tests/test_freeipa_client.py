@@ -0,0 +1,167 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+from freecloak.plugins.freeipa import FreeIPAClient
+from freecloak.plugins.freeipa.exceptions import FreeIPAClientNotFoundError, FreeIPAClientTimeoutError
+
+
+SESSION_COOKIE = 'ipa_session=valid'
+
+
+class StandInFreeIPA(http.server.ThreadingHTTPServer):
+    def __init__(self, users: list[str]) -> None:
+        super().__init__(('127.0.0.1', 0), StandInHandler)
+        self.users = users
+        self.calls: list[dict] = list()
+        self.logins = 0
+        self.delay = 0.0
+
+    @property
+    def server_url(self) -> str:
+        return f'127.0.0.1:{self.server_address[1]}'
+
+    def execute(self, method: str, args: list, options: dict) -> dict:
+        match method:
+            case 'user_find':
+                return {'result': [{'uid': [uid]} for uid in self.users], 'count': len(self.users)}
+            case 'user_show' if args[0] in self.users:
+                return {'result': {'uid': [args[0]], 'mail': [f'{args[0]}@example.test']}}
+            case 'user_show':
+                return {'error': f'{args[0]}: user not found', 'error_code': 4001}
+            case 'batch':
+                return {'results': [self.execute(call['method'], *call['params']) for call in args], 'count': len(args)}
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    server: StandInFreeIPA
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def reply(self, status: int, body: bytes = b'', headers: dict = {}) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        # Clients that timed out have already hung up
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers['Content-Length']))
+
+        if self.path == '/ipa/session/login_password':
+            credentials = urllib.parse.parse_qs(body.decode())
+            if credentials != {'user': ['admin'], 'password': ['secret']}:
+                return self.reply(401)
+
+            self.server.logins += 1
+            return self.reply(200, headers={'Set-Cookie': f'{SESSION_COOKIE}; Path=/ipa'})
+
+        if self.headers.get('Cookie') != SESSION_COOKIE:
+            return self.reply(401)
+
+        time.sleep(self.server.delay)
+
+        request = json.loads(body)
+        self.server.calls.append(request)
+
+        args, options = request['params']
+        result = self.server.execute(request['method'], args, options)
+
+        # Failed batch members are reported inline, a failed single call as the response error
+        response = {'result': result, 'error': None, 'id': request['id']}
+        if error_code := result.get('error_code'):
+            response = {'result': None, 'error': {'code': error_code, 'message': result['error']}, 'id': request['id']}
+
+        self.reply(200, json.dumps(response).encode())
+
+
+@pytest.fixture
+def freeipa():
+    server = StandInFreeIPA([f'user{i}' for i in range(25)])
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server: StandInFreeIPA, **kwargs) -> FreeIPAClient:
+    host, port = server.server_url.split(':')
+    return FreeIPAClient(server=host, port=int(port), username='admin', password='secret', allow_insecure=True, **kwargs)
+
+
+def test_logs_in_once_when_the_session_is_rejected(freeipa):
+    with make_client(freeipa) as client:
+        client.call('user_find', pkey_only=True)
+        client.call('user_find', pkey_only=True)
+
+    assert freeipa.logins == 1
+    assert len(freeipa.calls) == 2
+
+
+def test_find_users_batches_in_bounded_chunks(freeipa):
+    with make_client(freeipa, batch_size=10) as client:
+        users = list(client.find_users(page_size=10))
+
+    assert [user['uid'][0] for user in users] == [f'user{i}' for i in range(25)]
+    assert [call['method'] for call in freeipa.calls] == ['user_find', 'batch', 'batch', 'batch']
+    assert [len(call['params'][0]) for call in freeipa.calls[1:]] == [10, 10, 5]
+
+
+def test_version_is_only_sent_when_configured(freeipa):
+    with make_client(freeipa) as client:
+        client.call('user_find')
+
+    with make_client(freeipa, api_version='2.245') as client:
+        client.call('user_find')
+
+    assert 'version' not in freeipa.calls[0]['params'][1]
+    assert freeipa.calls[1]['params'][1]['version'] == '2.245'
+
+
+def test_show_many_skips_missing_entries(freeipa):
+    with make_client(freeipa) as client:
+        users = list(client.user_show_many(['user1', 'nobody', 'user2']))
+
+    assert [user['uid'][0] for user in users] == ['user1', 'user2']
+
+    with make_client(freeipa) as client, pytest.raises(FreeIPAClientNotFoundError):
+        client.call('user_show', 'nobody')
+
+
+def test_calls_time_out(freeipa):
+    freeipa.delay = 0.5
+
+    with make_client(freeipa, read_timeout=0.1) as client, pytest.raises(FreeIPAClientTimeoutError):
+        client.call('user_find')
@@ -0,0 +1,79 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import random
+import sqlite3
+
+from freecloak.plugins.keycloak.analytics import LoginEventAnalyzer, SpaceSaving
+
+
+HOUR = 3600 * 1000
+
+
+def test_space_saving_counts_stay_within_their_error():
+    random.seed(1)
+    counter = SpaceSaving(20)
+    truth = dict()
+    for _ in range(20000):
+        key = f'user{int(random.paretovariate(1.2))}'
+        truth[key] = truth.get(key, 0) + 1
+        counter.add(key)
+
+    top = counter.top(5)
+    assert [key for key, _, _ in top] == sorted(truth, key=truth.get, reverse=True)[:5]
+
+    for key, count, error in counter.top(20):
+        assert count - error <= truth.get(key, 0) <= count
+
+    # No key the counter dropped can have been seen more often than its smallest count
+    assert max(count for key, count in truth.items() if key not in counter.counts) <= min(counter.counts.values())
+    assert len(counter.heap) <= 4 * counter.capacity + 1
+
+def test_events_are_paged_by_time(make_client):
+    events = [{'time': HOUR + index // 3 * 1000, 'type': 'LOGIN', 'userId': f'u{index % 4}'} for index in range(50)]
+    # More events share one timestamp than fit on a page
+    events += [{'time': 2 * HOUR, 'type': 'LOGIN_ERROR', 'userId': 'u9', 'ipAddress': '192.0.2.1'} for _ in range(25)]
+    queries = list()
+
+    def _events(kwargs: dict) -> list:
+        params = kwargs['params']
+        queries.append(params)
+
+        date_from = int(params['dateFrom']) if params['dateFrom'].isdigit() else 0
+        window = [event for event in events if event['time'] >= date_from]
+        return window[params['first']:params['first'] + params['max']]
+
+    client = make_client({('GET', r'/admin/realms/test/events'): _events})
+    buckets = list()
+    analyzer = LoginEventAnalyzer(client, buckets.append, last_logins=sqlite3.connect(':memory:'), page_size=10)
+
+    assert analyzer.analyze(date_from='1970-01-01') == len(events)
+    assert [(bucket.logins, bucket.failed_logins) for bucket in buckets] == [(50, 0), (0, 25)]
+    assert analyzer.failed_users.top(1) == [('u9', 25, 0)]
+
+    # Each page starts at the last timestamp seen, skipping only the events already read at that timestamp
+    assert [(query['dateFrom'], query['first']) for query in queries] == [
+        ('1970-01-01', 0),
+        ('3603000', 1),
+        ('3606000', 2),
+        ('3609000', 3),
+        ('3613000', 1),
+        ('3616000', 2),
+        ('7200000', 10),
+        ('7200000', 20),
+    ]
@@ -0,0 +1,109 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import copy
+
+import pytest
+
+from freecloak.plugins.keycloak.buffer import UpdateBuffer
+
+
+@pytest.fixture
+def users() -> dict:
+    return {
+        'u1': {'id': 'u1', 'username': 'alice', 'email': 'alice@example.com', 'enabled': True, 'attributes': {'team': ['red']}},
+        'u2': {'id': 'u2', 'username': 'bob', 'enabled': True},
+    }
+
+@pytest.fixture
+def client(make_client, users):
+    def _update(kwargs: dict, user_id: str) -> None:
+        users[user_id].update(kwargs['json'])
+
+    return make_client({
+        ('GET', r'/admin/realms/test/users/([^/]+)'): lambda kwargs, user_id: copy.deepcopy(users[user_id]),
+        ('PUT', r'/admin/realms/test/users/([^/]+)'): _update,
+        ('DELETE', r'/admin/realms/test/users/([^/]+)'): lambda kwargs, user_id: None,
+    })
+
+def puts(client) -> list[tuple[str, dict]]:
+    return [(url.rsplit('/', 1)[-1], kwargs['json']) for method, url, kwargs in client.session.session.calls if method == 'PUT']
+
+
+def test_updates_to_one_resource_are_merged(client):
+    with UpdateBuffer(client) as buffer:
+        client.action_336(realm='test', user_id='u2', enabled=False)
+        client.action_336(realm='test', user_id='u2', email='bob@example.com')
+
+        assert puts(client) == []
+
+    assert puts(client) == [('u2', {'enabled': False, 'email': 'bob@example.com'})]
+    assert (buffer.merged, buffer.written) == (1, 1)
+
+def test_changes_matching_the_last_read_are_skipped(client):
+    with UpdateBuffer(client) as buffer:
+        client.action_335(realm='test', user_id='u1')
+        client.action_336(realm='test', user_id='u1', email='alice@example.com', enabled=True)
+        client.action_336(realm='test', user_id='u1', enabled=False)
+
+    # Only the fields that differ from what the server returned are sent
+    assert puts(client) == [('u1', {'enabled': False})]
+
+    with UpdateBuffer(client) as buffer:
+        client.action_335(realm='test', user_id='u1')
+        client.action_336(realm='test', user_id='u1', enabled=False)
+
+    assert len(puts(client)) == 1
+    assert buffer.skipped == 1
+
+def test_reads_see_pending_changes(client):
+    with UpdateBuffer(client):
+        client.action_336(realm='test', user_id='u1', enabled=False)
+
+        assert client.action_335(realm='test', user_id='u1')['enabled'] is False
+        assert client.action_335(realm='test', user_id='u2')['enabled'] is True
+
+    assert puts(client) == [('u1', {'enabled': False})]
+
+def test_old_changes_are_written_by_any_request(client):
+    with UpdateBuffer(client, max_age=60) as buffer:
+        client.action_336(realm='test', user_id='u1', enabled=False)
+        next(iter(buffer.pending.values())).created -= 60
+
+        client.action_335(realm='test', user_id='u2')
+
+        assert puts(client) == [('u1', {'enabled': False})]
+
+def test_deleted_resources_drop_their_changes(client):
+    with UpdateBuffer(client):
+        client.action_336(realm='test', user_id='u2', enabled=False)
+        client.action_337(realm='test', user_id='u2')
+
+    assert puts(client) == []
+
+def test_caller_objects_are_copied(client):
+    with UpdateBuffer(client):
+        user = client.action_335(realm='test', user_id='u1')
+        user['attributes']['team'] = ['blue']
+
+        attributes = {'team': ['blue']}
+        client.action_336(realm='test', user_id='u1', attributes=attributes)
+        attributes['team'].append('green')
+
+    # The read is no baseline for the caller's edits, and later edits to the update are not sent
+    assert puts(client) == [('u1', {'attributes': {'team': ['blue']}})]
@@ -0,0 +1,108 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import threading
+import time
+
+from freecloak.plugins.keycloak.bulk import bulk_import, BulkImportRecord, chunk_records
+from freecloak.plugins.keycloak.journal import BulkJournal
+
+
+def users(*usernames: str) -> list[BulkImportRecord]:
+    return [BulkImportRecord('user', {'username': username}) for username in usernames]
+
+def partial_import(requests: list[dict], hook=None):
+    def _partial_import(kwargs: dict) -> dict:
+        requests.append(kwargs['json'])
+        if hook is not None:
+            hook(kwargs['json'])
+
+        return {'results': [
+            {'resourceType': 'USER', 'resourceName': user['username'], 'action': 'ADDED', 'id': user['username']}
+            for user in kwargs['json']['users']
+        ]}
+
+    return {('POST', r'/admin/realms/test/partialImport'): _partial_import}
+
+def usernames(request: dict) -> list[str]:
+    return [user['username'] for user in request['users']]
+
+
+def test_chunks_are_bounded_by_records_and_bytes(make_client):
+    client = make_client()
+
+    chunks = chunk_records(client, users(*'abcde'), max_records=2)
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+    # Every payload is {"username": "x"}, so two fit under 40 bytes but three do not
+    chunks = chunk_records(client, users(*'abcde'), max_bytes=40)
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+    # A record larger than the limit still goes out, alone
+    chunks = chunk_records(client, users('a' * 100, 'b'), max_bytes=40)
+    assert [len(chunk) for chunk in chunks] == [1, 1]
+
+def test_interrupted_imports_resume(make_client, tmp_path):
+    requests = list()
+    release = threading.Event()
+    client = make_client(partial_import(requests, lambda request: 'a' in usernames(request) or release.wait(5)))
+
+    with BulkJournal(str(tmp_path / 'journal.db')) as journal:
+        # The run stops after the first chunk's results, with the second chunk still in flight
+        for _ in bulk_import(client, users(*'abcdef'), max_records=2, max_workers=1, journal=journal):
+            release.set()
+            break
+
+    requests.clear()
+    client = make_client(partial_import(requests))
+    with BulkJournal(str(tmp_path / 'journal.db'), resume=True) as journal:
+        results = list(bulk_import(client, users(*'abcdef'), max_records=2, max_workers=1, journal=journal))
+
+        assert all(journal.is_completed(f'import:user:{username}') for username in 'abcdef')
+
+    # Completed records are not sent again and records that may already exist are skipped rather than failed
+    assert [(usernames(request), request['ifResourceExists']) for request in requests] == [(['e', 'f'], 'FAIL'), (['c', 'd'], 'SKIP')]
+    assert sorted(result.resource_name for result in results) == ['c', 'd', 'e', 'f']
+
+def test_chunks_in_flight_are_bounded(make_client):
+    requests = list()
+    release = threading.Event()
+    client = make_client(partial_import(requests, lambda request: release.wait(5)))
+
+    pulled = 0
+    def _records():
+        nonlocal pulled
+        for record in users(*(f'user{index}' for index in range(100))):
+            pulled += 1
+            yield record
+
+    results = list()
+    worker = threading.Thread(target=lambda: results.extend(bulk_import(client, _records(), max_records=1, max_workers=2)))
+    worker.start()
+
+    while len(requests) < 2:
+        time.sleep(0.01)
+    time.sleep(0.1)
+
+    # Four chunks are queued for two workers, one more is waiting and chunking has read one record ahead
+    assert pulled == 2 * 2 + 2
+
+    release.set()
+    worker.join()
+
+    assert len(results) == 100
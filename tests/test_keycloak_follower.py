@@ -0,0 +1,63 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+from freecloak.plugins.keycloak.follower import AdminEventFollower, load_checkpoint
+
+
+def event(event_id: str, event_time: int, resource_path: str = 'users/u1') -> dict:
+    return {'id': event_id, 'time': event_time, 'operationType': 'UPDATE', 'resourceType': 'USER', 'resourcePath': resource_path}
+
+
+def test_events_at_the_checkpoint_time_are_emitted_once(make_client, tmp_path):
+    events = [event('e1', 1000), event('e2', 2000), event('e3', 2000)]
+
+    def _admin_events(kwargs: dict) -> list:
+        params = kwargs['params']
+        window = [item for item in events if item['time'] >= int(params['dateFrom'])]
+        return window[params['first']:params['first'] + params['max']]
+
+    client = make_client({('GET', r'/admin/realms/test/admin-events'): _admin_events})
+    checkpoint_path = str(tmp_path / 'checkpoint.json')
+
+    emitted = list()
+    follower = AdminEventFollower(client, checkpoint_path, emitted.append, since=0, page_size=2)
+    assert follower.poll() == 3
+
+    checkpoint = load_checkpoint(checkpoint_path)
+    assert (checkpoint.time, checkpoint.event_keys) == (2000, ['e2', 'e3'])
+
+    # A later event at the checkpoint time is new, the ones before it were already emitted
+    events[2:2] = [event('e4', 2000)]
+    events.append(event('e5', 3000, 'users/u2'))
+
+    follower = AdminEventFollower(client, checkpoint_path, emitted.append)
+    assert follower.poll() == 2
+    assert follower.poll() == 0
+
+    assert [record.event_id for record in emitted] == ['e1', 'e2', 'e3', 'e4', 'e5']
+    assert (emitted[-1].operation, emitted[-1].resource_type, emitted[-1].resource_id) == ('UPDATE', 'USER', 'u2')
+
+def test_events_without_ids_are_told_apart_by_content(make_client, tmp_path):
+    events = [event(None, 1000, 'users/u1'), event(None, 1000, 'users/u2')]
+    client = make_client({('GET', r'/admin/realms/test/admin-events'): lambda kwargs: events[kwargs['params']['first']:]})
+
+    emitted = list()
+    follower = AdminEventFollower(client, str(tmp_path / 'checkpoint.json'), emitted.append, since=0)
+    assert follower.poll() == 2
+    assert follower.poll() == 0
+    assert [record.resource_id for record in emitted] == ['u1', 'u2']
@@ -0,0 +1,56 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+from freecloak.plugins.keycloak import KeycloakClient
+
+
+REALM_REFERENCE = '#/components/schemas/RealmRepresentation'
+
+
+def make_client() -> KeycloakClient:
+    return KeycloakClient(realm='test', domain='keycloak.invalid', client_id='test', client_secret='secret')
+
+
+def test_convert_realm_with_opaque_schemas():
+    client = make_client()
+
+    realm = client.convert_model({'type': 'reference', 'ref': REALM_REFERENCE}, {
+        'realm': 'test',
+        'bruteForceStrategy': 'MULTIPLE',
+        'components': {
+            'org.keycloak.keys.KeyProvider': [
+                {'id': 'k1', 'name': 'rsa-generated', 'providerId': 'rsa-generated', 'config': {'priority': ['100']}},
+            ],
+        },
+    })
+
+    assert realm['brute_force_strategy'] == 'MULTIPLE'
+    assert realm['components'] == {
+        'org.keycloak.keys.KeyProvider': [
+            {'id': 'k1', 'name': 'rsa-generated', 'providerId': 'rsa-generated', 'config': {'priority': ['100']}},
+        ],
+    }
+
+
+def test_opaque_schemas_are_plain_types():
+    client = make_client()
+    model = client.load_model(REALM_REFERENCE)
+
+    assert model['brute_force_strategy']['type'] == 'string'
+    assert model['components']['type'] == 'object'
+    assert client.validate_model(model, {'brute_force_strategy': 'LINEAR'}) == {'bruteForceStrategy': 'LINEAR'}
@@ -0,0 +1,94 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import types
+
+import pytest
+
+from freecloak.plugins.keycloak import resolver
+from freecloak.plugins.keycloak.resolver import KeycloakResolver
+
+
+@pytest.fixture
+def clock(monkeypatch) -> types.SimpleNamespace:
+    clock = types.SimpleNamespace(now=0.0)
+    monkeypatch.setattr(resolver, 'time', types.SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+@pytest.fixture
+def client(make_client):
+    users = [{'id': 'u1', 'username': 'alice', 'email': 'alice@example.com'}, {'id': 'u2', 'username': 'alice2'}]
+
+    def _search(kwargs: dict) -> list:
+        search = kwargs['params'].get('username', '').lower()
+        return [user for user in users if search in user['username']]
+
+    return make_client({
+        ('GET', r'/admin/realms/test/users'): _search,
+        ('PUT', r'/admin/realms/test/users/([^/]+)'): lambda kwargs, user_id: None,
+        ('DELETE', r'/admin/realms/test/users/([^/]+)'): lambda kwargs, user_id: None,
+    })
+
+def searches(client) -> int:
+    return sum(1 for method, url, _ in client.session.session.calls if method == 'GET')
+
+
+def test_least_recently_used_entries_are_evicted(make_client):
+    cache = KeycloakResolver(make_client(), max_entries=2)
+    cache.remember('user', 'alice', 'u1')
+    cache.remember('user', 'bob', 'u2')
+
+    assert cache.cached('user', 'alice') == 'u1'
+
+    cache.remember('user', 'carol', 'u3')
+
+    assert cache.cached('user', 'bob') is None
+    assert cache.cached('user', 'alice') == 'u1'
+    assert cache.cached('user', 'carol') == 'u3'
+    assert cache.ids == {'u1': {('user', 'alice')}, 'u3': {('user', 'carol')}}
+
+def test_entries_expire(make_client, clock):
+    cache = KeycloakResolver(make_client(), ttl=10)
+    cache.remember('user', 'Alice', 'u1')
+
+    clock.now = 10
+    assert cache.cached('user', 'alice') == 'u1'
+
+    clock.now = 10.5
+    assert cache.cached('user', 'alice') is None
+    assert not cache.entries and not cache.ids
+
+def test_lookups_are_cached_until_the_resource_changes(client):
+    assert client.resolver.resolve('user', 'ALICE') == 'u1'
+    assert client.resolver.resolve('user', 'alice') == 'u1'
+    assert searches(client) == 1
+
+    client.resolver.remember('email', 'alice@example.com', 'u1')
+    client.action_336(realm='test', user_id='u1', enabled=False)
+
+    # A write to the user drops every identifier pointing at it
+    assert client.resolver.cached('email', 'alice@example.com') is None
+    assert client.resolver.resolve('user', 'alice') == 'u1'
+    assert searches(client) == 2
+
+    client.action_337(realm='test', user_id='u1')
+    assert client.resolver.cached('user', 'alice') is None
+
+def test_loose_matches_are_not_resolved(client):
+    assert client.resolver.lookup('user', 'alic') is None
+    assert not client.resolver.entries
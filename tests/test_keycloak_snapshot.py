@@ -0,0 +1,71 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import copy
+
+from freecloak.plugins.keycloak.snapshot import compare_snapshots, hash_tree, RealmSnapshot
+
+
+EXPORT = {
+    'realm': 'test',
+    'identityProviderMappers': [
+        {'name': 'email', 'identityProviderAlias': 'google', 'config': {'claim': 'email'}},
+        {'name': 'email', 'identityProviderAlias': 'github', 'config': {'claim': 'email'}},
+        {'name': 'username', 'identityProviderAlias': 'github', 'config': {'claim': 'login'}},
+    ],
+}
+
+
+def snapshot(document: dict) -> RealmSnapshot:
+    return RealmSnapshot(realm='test', created=0.0, hashes=dict(hash_tree(document)))
+
+
+def test_duplicate_identities_get_unique_paths():
+    hashes = snapshot(EXPORT).hashes
+    mapper_paths = [path for path in hashes if path.startswith('/identityProviderMappers/') and path.count('/') == 2]
+
+    assert len(mapper_paths) == 3
+    assert '/identityProviderMappers/username' in mapper_paths
+
+
+def test_duplicate_order_does_not_change_hashes():
+    reordered = copy.deepcopy(EXPORT)
+    reordered['identityProviderMappers'].reverse()
+
+    assert snapshot(reordered).hashes == snapshot(EXPORT).hashes
+    assert compare_snapshots(snapshot(EXPORT), snapshot(reordered)) == []
+
+
+def test_drift_in_any_duplicate_is_reported():
+    for index in [0, 1]:
+        drifted = copy.deepcopy(EXPORT)
+        drifted['identityProviderMappers'][index]['config']['claim'] = 'mail'
+
+        changes = compare_snapshots(snapshot(EXPORT), snapshot(drifted))
+
+        assert {change.change for change in changes} == {'added', 'removed'}
+        assert all(change.path.startswith('/identityProviderMappers/email~') for change in changes)
+
+
+def test_identical_duplicates_are_all_kept():
+    document = {'roles': [{'name': 'admin'}, {'name': 'admin'}]}
+
+    role_paths = [path for path in snapshot(document).hashes if path.startswith('/roles/') and path.count('/') == 2]
+
+    assert len(role_paths) == 2
+    assert compare_snapshots(snapshot(document), snapshot({'roles': [{'name': 'admin'}]}))
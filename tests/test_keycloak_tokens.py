@@ -0,0 +1,170 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import base64
+import hashlib
+import json
+import time
+from typing import Self
+
+import pytest
+
+from freecloak.plugins.keycloak import tokens
+from freecloak.plugins.keycloak.exceptions import KeycloakTokenError
+from freecloak.plugins.keycloak.tokens import JWKSCache, rsa_verify, TOKEN_ALGORITHMS, TokenVerifier
+
+
+ISSUER = 'https://keycloak.invalid/realms/test'
+
+# Throwaway 1024-bit test keys as (modulus, private exponent); the public exponent is 65537
+SIGNING_KEY = (
+    0xe9cfd9c1255afa1c5a6839d4eaf9c31ed86b30a53be79281bb1ed9d0e88dbb40313980556a700660be9c2231f0bbaa7ffbb7853725bbc481b4f6c7b4966e42a4a94065ae04e411ab798718ab689aa8aa42d85950afa507f1fc9a6817b763d1c857f8d485d21a23d1639691b29b32c8ce458cf699ec7ede20b17a12c6c8812af7,
+    0x844e3e9d62230a16d33dd943d7b77fa74bb5d4301c26dd2b96144e133e153d99848152528349630289b9d64bc63a9baf9263f5f90fdc21c577fe91616a22788899e3f1b50775383d125333ab5edc94e87bb9538e903989452650c284abaeb57e2030f81d6b3c3e7c14781c2cde4bb33f7ab16db92eaea5fbae92d0c83c6b7e39,
+)
+OTHER_KEY = (
+    0xaa207967c02494baf20415958ad245ec57b691c9a2525acad380a5083f8d7fbaf3617df48f12dfbc32e46847d4378b982706c40f313051e60d375239697515d60f657fd27467d1ea1ed91bcf8600857d7376c12b48e480d350a9ae883595b51f62fb66a7ec3302a608ade11bc3c4c8114287984ee5d83bf47dca7bf888def341,
+    0xa3fa290a9768aaf285d2e9faf99333525a38decc3a68a69a58c1e64fccf1d5eb9c2a9bfcdcea943c11d195b1a61ae3b203ebc18de31b6fd50d680518d14cc97db6da9a2ab5fbb1a46a6fd8b235dd3a4cf2ca6e163a878e086fc7f61feb32eb4681dc25668630bf7e25a1d52ea3f016de75128eb2ff5e1c89d89855918090401,
+)
+KEY_LENGTH = 128
+
+
+def base64url_encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def jwk(kid: str, key: tuple[int, int], **fields) -> dict:
+    return {'kid': kid, 'kty': 'RSA', 'n': base64url_encode(key[0].to_bytes(KEY_LENGTH)), 'e': 'AQAB'} | fields
+
+
+def sign(key: tuple[int, int], algorithm: str, message: bytes) -> int:
+    hash_name, digest_prefix = TOKEN_ALGORITHMS[algorithm]
+    digest_info = digest_prefix + hashlib.new(hash_name, message).digest()
+    encoded_message = b'\x00\x01' + b'\xff' * (KEY_LENGTH - len(digest_info) - 3) + b'\x00' + digest_info
+
+    modulus, private_exponent = key
+    return pow(int.from_bytes(encoded_message), private_exponent, modulus)
+
+
+def make_token(claims: dict, *, kid: str = 'k1', key: tuple[int, int] = SIGNING_KEY, algorithm: str = 'RS256', header: object = None) -> str:
+    header = {'alg': algorithm, 'kid': kid, 'typ': 'JWT'} if header is None else header
+    signing_input = f'{base64url_encode(json.dumps(header).encode())}.{base64url_encode(json.dumps(claims).encode())}'
+    signature = sign(key, algorithm, signing_input.encode('ascii')).to_bytes(KEY_LENGTH)
+
+    return f'{signing_input}.{base64url_encode(signature)}'
+
+
+def access_claims(**overrides) -> dict:
+    return {'iss': ISSUER, 'aud': 'account', 'azp': 'app', 'typ': 'Bearer', 'exp': time.time() + 300} | overrides
+
+
+class FakeJWKS:
+    def __init__(self, keys: list[dict]) -> None:
+        self.keys = keys
+        self.fetches = 0
+
+    def get(self, url: str, timeout: tuple[float, float]) -> Self:
+        self.fetches += 1
+        return self
+
+    def json(self) -> dict:
+        return {'keys': self.keys}
+
+
+@pytest.fixture
+def jwks(monkeypatch) -> FakeJWKS:
+    fake_jwks = FakeJWKS([jwk('k1', SIGNING_KEY, alg='RS256'), jwk('k2', OTHER_KEY), jwk('k3', SIGNING_KEY)])
+    monkeypatch.setattr(tokens.requests, 'get', fake_jwks.get)
+    return fake_jwks
+
+
+def make_verifier(**kwargs) -> TokenVerifier:
+    return TokenVerifier(JWKSCache('https://keycloak.invalid/certs'), issuer=ISSUER, **kwargs)
+
+
+def test_valid_token_verifies(jwks):
+    verifier = make_verifier(audience='app')
+
+    assert verifier.verify(make_token(access_claims()))['azp'] == 'app'
+    assert verifier.verify(make_token(access_claims(), kid='k3', algorithm='RS512'))['iss'] == ISSUER
+    assert jwks.fetches == 1
+
+
+def test_signature_from_another_key_is_rejected(jwks):
+    with pytest.raises(KeycloakTokenError, match='invalid signature'):
+        make_verifier().verify(make_token(access_claims(), kid='k2'))
+
+
+def test_signature_at_or_above_the_modulus_is_rejected():
+    modulus = SIGNING_KEY[0]
+
+    # Adding the modulus yields the same value modulo n, so only the range check catches it
+    for index in range(200):
+        message = f'message {index}'.encode()
+        signature = sign(SIGNING_KEY, 'RS256', message)
+        if signature + modulus < 2 ** (KEY_LENGTH * 8):
+            break
+
+    assert rsa_verify(jwk('k1', SIGNING_KEY), 'RS256', message, signature.to_bytes(KEY_LENGTH))
+    assert not rsa_verify(jwk('k1', SIGNING_KEY), 'RS256', message, (signature + modulus).to_bytes(KEY_LENGTH))
+
+
+def test_unknown_kid_refetches_at_most_once_per_interval(jwks):
+    verifier = make_verifier()
+    verifier.verify(make_token(access_claims()))
+    verifier.jwks.fetched -= verifier.jwks.min_refresh_interval
+
+    for _ in range(3):
+        with pytest.raises(KeycloakTokenError, match='unknown signing key'):
+            verifier.verify(make_token(access_claims(), kid='rotated'))
+
+    assert jwks.fetches == 2
+
+
+def test_key_algorithm_must_match(jwks):
+    with pytest.raises(KeycloakTokenError, match='not used with RS512'):
+        make_verifier().verify(make_token(access_claims(), algorithm='RS512'))
+
+
+@pytest.mark.parametrize('token', [
+    'W10.W10.AAAA',
+    'not-a-token',
+    f'{base64url_encode(b"{}")}.{base64url_encode(b"[]")}.AAAA',
+])
+def test_malformed_tokens_are_rejected(jwks, token):
+    with pytest.raises(KeycloakTokenError):
+        make_verifier().verify(token)
+
+
+@pytest.mark.parametrize(('claims', 'error'), [
+    (access_claims(exp=time.time() - 120), 'token expired'),
+    (access_claims(exp=None), 'token expired'),
+    (access_claims(nbf=time.time() + 120), 'token not yet valid'),
+    (access_claims(iss='https://elsewhere.invalid/realms/test'), 'unexpected issuer'),
+    (access_claims(aud='other', azp='other'), 'token not issued for app'),
+    (access_claims(typ='ID'), 'unexpected token type ID'),
+    (access_claims(typ='Refresh'), 'unexpected token type Refresh'),
+])
+def test_invalid_claims_are_rejected(jwks, claims, error):
+    with pytest.raises(KeycloakTokenError, match=error):
+        make_verifier(audience='app').verify(make_token(claims))
+
+
+def test_claims_within_leeway_are_accepted(jwks):
+    claims = access_claims(exp=time.time() - 10, nbf=time.time() + 10, aud=['app', 'account'], azp='other')
+
+    assert make_verifier(audience='app').verify(make_token(claims))['azp'] == 'other'
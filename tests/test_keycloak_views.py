@@ -0,0 +1,77 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import copy
+
+import pytest
+
+from freecloak.plugins.keycloak import KeycloakClient
+from freecloak.plugins.keycloak.views import KeycloakListView, KeycloakModelView
+
+
+USERS = [
+    {
+        'id': 'u1',
+        'username': 'alice',
+        'firstName': 'Alice',
+        'emailVerified': True,
+        'attributes': {'team': ['red']},
+        'federatedIdentities': [{'identityProvider': 'github', 'userId': '42', 'userName': 'alice'}],
+        'unknownField': 1,
+    },
+    {'id': 'u2', 'username': 'bob', 'requiredActions': ['UPDATE_PASSWORD']},
+]
+
+
+@pytest.fixture
+def routes() -> dict:
+    return {('GET', r'/admin/realms/test/users'): lambda kwargs: copy.deepcopy(USERS)}
+
+
+def test_views_translate_keys_without_converting(make_client, routes, monkeypatch):
+    client = make_client(routes, result_mode='view')
+    monkeypatch.setattr(KeycloakClient, 'convert_model', lambda *args: pytest.fail('views must not convert eagerly'))
+
+    users = client.action_327(realm='test')
+    assert isinstance(users, KeycloakListView)
+    assert users.raw == USERS
+
+    alice = users[0]
+    assert isinstance(alice, KeycloakModelView)
+    assert (alice['first_name'], alice.email_verified, alice.unknownField) == ('Alice', True, 1)
+    assert list(alice) == ['id', 'username', 'first_name', 'email_verified', 'attributes', 'federated_identities', 'unknownField']
+
+    identity = alice.federated_identities[0]
+    assert isinstance(identity, KeycloakModelView)
+    assert identity.identity_provider == 'github'
+
+    assert 'email' not in alice
+    with pytest.raises(AttributeError):
+        alice.email
+
+    assert isinstance(users[1:], KeycloakListView) and len(users[1:]) == 1
+
+def test_converted_views_match_convert_mode(make_client, routes):
+    views = make_client(routes, result_mode='view').action_327(realm='test')
+    converted = make_client(routes).action_327(realm='test')
+
+    assert views.convert() == converted
+    assert views[0].convert() == converted[0]
+
+    # Converting leaves the server's data as it was
+    assert views.raw == USERS
@@ -0,0 +1,73 @@
+##############################################################################
+##  Copyright (C) 2025  Gabriele Ron                                        ##
+##                                                                          ##
+##  This program is free software: you can redistribute it and/or modify    ##
+##  it under the terms of the GNU General Public License as published by    ##
+##  the Free Software Foundation, either version 3 of the License, or       ##
+##  (at your option) any later version.                                     ##
+##                                                                          ##
+##  This program is distributed in the hope that it will be useful,         ##
+##  but WITHOUT ANY WARRANTY; without even the implied warranty of          ##
+##  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the           ##
+##  GNU General Public License for more details.                            ##
+##                                                                          ##
+##  You should have received a copy of the GNU General Public License       ##
+##  along with this program.  If not, see <https://www.gnu.org/licenses/>.  ##
+##############################################################################
+
+
+import base64
+import io
+
+import pytest
+
+from freecloak.plugins.sync.engine import map_user
+from freecloak.plugins.sync.exceptions import SyncSourceError
+from freecloak.plugins.sync.sources import parse_ldif
+
+
+KEY = bytes([0x30, 0x82, 0xff, 0x00, 0xfe])
+
+
+def ldif(text: str) -> io.StringIO:
+    return io.StringIO(text)
+
+
+def test_parse_ldif_keeps_binary_values():
+    encoded_key = base64.b64encode(KEY).decode()
+    entries = list(parse_ldif(ldif(
+        'dn: uid=alice,cn=users,cn=accounts,dc=example,dc=test\n'
+        'uid: alice\n'
+        f'krbPrincipalKey:: {encoded_key}\n'
+        f'cn:: {base64.b64encode("Alicé".encode()).decode()}\n'
+        '\n'
+        'dn: uid=bob,cn=users,cn=accounts,dc=example,dc=test\n'
+        'uid: bob\n'
+    )))
+
+    assert [entry['uid'] for entry in entries] == [['alice'], ['bob']]
+    assert entries[0]['krbprincipalkey'] == [KEY]
+    assert entries[0]['cn'] == ['Alicé']
+    assert map_user(entries[0])['username'] == 'alice'
+
+
+def test_parse_ldif_joins_folded_lines():
+    encoded_key = base64.b64encode(KEY).decode()
+    entries = list(parse_ldif(ldif(
+        'dn: uid=alice,cn=users,cn=accounts,dc=exam\n'
+        ' ple,dc=test\n'
+        'uid: alice\n'
+        'mail: alice@exa\n'
+        ' mple.test\n'
+        f'userPassword:: {encoded_key[:4]}\n'
+        f' {encoded_key[4:]}\n'
+    )))
+
+    assert entries[0]['dn'] == ['uid=alice,cn=users,cn=accounts,dc=example,dc=test']
+    assert entries[0]['mail'] == ['alice@example.test']
+    assert entries[0]['userpassword'] == [KEY]
+
+
+def test_parse_ldif_rejects_invalid_base64():
+    with pytest.raises(SyncSourceError):
+        list(parse_ldif(ldif('uid: alice\njpegPhoto:: not*base64\n')))